@@ -1,21 +1,39 @@
+import importlib
 import os
 
 import click
 
 from switchbladecli.cli.config import find_config_file, get_switchblade_config
-from switchbladecli.cli.lint import lint
-from switchbladecli.cli.test import test
-from switchbladecli.cli.update import update
+from switchbladecli.timings import timings
 
 ALIASES = {}
+# The subcommands, which are only imported when they are invoked so e.g. 'swb --help'
+# doesn't have to import the dependencies of every command
+LAZY_COMMANDS = {
+    "update": "switchbladecli.cli.update:update",
+    "lint": "switchbladecli.cli.lint:lint",
+    "test": "switchbladecli.cli.test:test",
+    "serve": "switchbladecli.cli.serve:serve",
+    "fleet": "switchbladecli.cli.fleet:fleet",
+    "stats": "switchbladecli.cli.stats:stats",
+}
+# Subcommands which don't run in a single project, so don't need a config file
+PROJECTLESS_COMMANDS = ["fleet"]
 
 
 class AliasedGroup(click.Group):
+    def list_commands(self, ctx):
+        return sorted([*super().list_commands(ctx), *LAZY_COMMANDS])
+
+
     def get_command(self, ctx, cmd_name):
         try:
             cmd_name = ALIASES[cmd_name].name
         except KeyError:
             pass
+        if cmd_name in LAZY_COMMANDS:
+            module_name, command_name = LAZY_COMMANDS[cmd_name].split(":")
+            return getattr(importlib.import_module(module_name), command_name)
         return super().get_command(ctx, cmd_name)
 
 
@@ -24,14 +42,26 @@ class AliasedGroup(click.Group):
 @click.group(cls=AliasedGroup)
 @click.option("--config", "config_file", help="Path to Switchblade configuration file.")
 @click.option("--verbose", is_flag=True, default=False, help="Show verbose output")
+@click.option("--timings", "show_timings", is_flag=True, default=False, help="Show how long each phase of the command took.")
+@click.option("--profile", "profile_file", metavar="FILE", default=None, help="Profile Switchblade itself, and write the stats (pstats) to FILE.")
 @click.pass_context
 def switchbladecli(
-    ctx, config_file, verbose
+    ctx, config_file, verbose, show_timings, profile_file
 ): 
     """Sentient Switchblade
 
     A part of the Beth Developer Toolbelt
     """
+    timings.reset()
+    if profile_file is not None:
+        start_profiling(ctx, profile_file)
+
+    if ctx.invoked_subcommand in PROJECTLESS_COMMANDS:
+        ctx.obj = {"verbose": verbose}
+        if show_timings:
+            ctx.call_on_close(lambda: click.echo(timings.format_breakdown()))
+        return
+
     config_file = find_config_file(verbose, config_file)
 
     project_dir = os.path.abspath(os.path.dirname(config_file))
@@ -44,10 +74,36 @@ def switchbladecli(
         "project_dir": project_dir,
         "verbose": verbose,
     }
+    ctx.call_on_close(lambda: finish_timings(project_dir, ctx.invoked_subcommand, show_timings))
+
 
+def start_profiling(ctx, profile_file: str):
+    """Profile the command (the Python overhead of Switchblade, not the tools it runs) until it finishes."""
+    import cProfile  # pylint: disable=import-outside-toplevel
+    profiler = cProfile.Profile()
 
-for command in [update, lint, test]:
-    switchbladecli.add_command(command)
+    def write_profile():
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+        click.echo(f"⚔️ Switchblade profile written to {profile_file} (view it with 'python -m pstats {profile_file}')")
+
+    ctx.call_on_close(write_profile)
+    profiler.enable()
+
+
+def finish_timings(project_dir: str, command: str, show_timings: bool):
+    """Record the timings of the command in the event log of the project, and show them if asked.
+
+    This is also when the events logged during the command are written to the event log.
+    """
+    # pylint: disable=import-outside-toplevel
+    from switchbladecli.cli.bundle_cache import CACHE_FOLDERNAME
+    from switchbladecli.events import flush_event_logs, get_event_log
+    if timings.get_phases():
+        get_event_log(os.path.join(project_dir, CACHE_FOLDERNAME)).log("TIMINGS", **timings.get_event_fields(command))
+    flush_event_logs()
+    if show_timings:
+        click.echo(timings.format_breakdown())
 
 
 if __name__ == "__main__":
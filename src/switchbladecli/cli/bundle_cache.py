@@ -2,28 +2,52 @@ import click
 import os
 import shutil
 
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from github import Github
 from mergedeep import merge
 from pathlib import Path
-from tomlkit import dumps, loads
 
-from switchbladecli.utils import hash_dir
+from switchbladecli.cli.bundle_store import BundleStore
+from switchbladecli.cli.github_bundle import download_archive, download_contents
+from switchbladecli.cli.resolved_bundle import ResolvedBundle
+from switchbladecli.events import get_event_log
+from switchbladecli.exceptions import InvalidConfigValue
+from switchbladecli.locking import FileLock
+from switchbladecli.timings import timings
+from switchbladecli.toml_files import read_toml, write_toml
+from switchbladecli.utils import fingerprint_dir, parse_duration
 
 BUNDLE_CONFIG_FILES = ["bundle.toml"]
 CACHE_FOLDERNAME = ".switchblade-cache"
 LATEST_CONFIG_FILENAME = "latest.toml"
-UPDATE_LOG_FILENAME = "update.log"
+FINGERPRINT_INDEX_FILENAME = "fingerprints.toml"
+ENV_CONFIG_FILENAME = "env.toml"
+TOOL_DURATIONS_FILENAME = "durations.toml"
+MATERIALIZED_FILENAME = "materialized.toml"
+# Private copies of bundle files which are symlinked into the project
+LINKED_FOLDERNAME = "linked"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Overrides [switchblade].check_interval, e.g. for all the repos of a 'swb fleet' run
+CHECK_INTERVAL_ENV_VAR = "SWITCHBLADE_CHECK_INTERVAL"
+# Locks in the cache folder: fetching a bundle, updating latest.toml or the tool durations, using (shared) or
+# removing (exclusive) cached bundles, and setting up and tearing down the project for a run
+FETCH_LOCK = "fetch"
+LATEST_LOCK = "latest"
+DURATIONS_LOCK = "durations"
+BUNDLES_LOCK = "bundles"
+PROJECT_LOCK = "project"
 
 
 class Bundle:
     """A bundle of dev tools and configs.
     """
 
-    def __init__(self, switchblade_config: dict, version: str = None):
+    def __init__(self, switchblade_config: dict, version: str = None, force_check: bool = False):
         """Initialize a Bundle object.
 
         If version is None, the latest bundle will be used (conditionally fetched and cached).
+        Unless force_check is set, a remote bundle which was checked for updates within
+        the configured [switchblade].check_interval is used without checking again.
 
         If a version is passed:
             1. Tries to fetch a bundle with that version from the cache.
@@ -32,22 +56,47 @@ class Bundle:
         Args:
             switchblade_config (dict): The switchblade config.
             version (str, optional): The version of the bundle to fetch. Defaults to None.
+            force_check (bool, optional): Always check the remote for updates. Defaults to False.
         """
         self._switchblade_config = switchblade_config
         if version is None:
             click.echo("⚔️ Switchblade initializing bundle...")
             cache = BundleCache(self._switchblade_config)
-            bundle = self._fetch_latest(cache)
+            # Only one process fetches at a time, the others then find the bundle in the cache
+            with timings.phase("fetch bundle"), cache.lock(FETCH_LOCK):
+                bundle = self._fetch_latest(cache, force_check)
             self.version = bundle.version
             self.bundle_folder = bundle.bundle_folder
-            self.bundle_config = bundle.bundle_config
+            self._bundle_config = bundle._bundle_config  # pylint: disable=protected-access
+            self._resolved_bundle = bundle._resolved_bundle  # pylint: disable=protected-access
 
         else:
             click.echo(f"⚔️ Switchblade initializing bundle with version {version}...")
             self.version = version
             self.bundle_folder = self._bundle_folder_from_version(version)
-            self.bundle_config = self._load_bundle_config()
-    
+            if not any((self.bundle_folder / name).exists() for name in BUNDLE_CONFIG_FILES):
+                raise FileNotFoundError(f"No bundle config file found in bundle {self.version}")
+            # The bundle config and resolved bundle are loaded when they are first used,
+            # since a run only needs the resolved bundle, which is usually cached
+            self._bundle_config = None
+            self._resolved_bundle = None
+
+
+    @property
+    def bundle_config(self) -> dict:
+        """The bundle config from bundle.toml."""
+        if self._bundle_config is None:
+            self._bundle_config = self._load_bundle_config()
+        return self._bundle_config
+
+
+    def resolve(self) -> ResolvedBundle:
+        """Get the bundle as configured for the project (see ResolvedBundle)."""
+        if self._resolved_bundle is None:
+            with timings.phase("resolve bundle"):
+                self._resolved_bundle = ResolvedBundle.load(self, self._switchblade_config)
+        return self._resolved_bundle
+
 
     def _load_bundle_config(self) -> dict:
         """Get the bundle config from the config file."""
@@ -58,7 +107,7 @@ class Bundle:
                 break
         if bundle_config_file is None or not bundle_config_file.exists():
             raise FileNotFoundError(f"No bundle config file found in bundle {self.version}")
-        return loads(bundle_config_file.read_text(encoding="utf-8"))
+        return read_toml(bundle_config_file)
     
     
     def _bundle_folder_from_version(self, version) -> Path:
@@ -69,86 +118,236 @@ class Bundle:
     def get_files(self) -> list:
         """Get the list of files (excluding the config) in the bundle.
         
-        Returns a list of file paths relative to the bundle folder.
+        Returns a list of file paths relative to the bundle folder, including files in subfolders.
+        """
+        return [
+            str(file.relative_to(self.bundle_folder)) for file in self.bundle_folder.rglob("*")
+            if file.is_file() and file.name not in BUNDLE_CONFIG_FILES
+        ]
+
+
+    def _get_check_interval(self) -> int:
+        """Get the [switchblade].check_interval setting in seconds (defaults to 0, i.e. always check).
+
+        The setting can be overridden with $SWITCHBLADE_CHECK_INTERVAL.
+        """
+        if os.environ.get(CHECK_INTERVAL_ENV_VAR):
+            check_interval = os.environ[CHECK_INTERVAL_ENV_VAR]
+            setting_name = f"${CHECK_INTERVAL_ENV_VAR}"
+        else:
+            check_interval = self._switchblade_config["switchblade"].get("check_interval", 0)
+            setting_name = "[switchblade].check_interval"
+        try:
+            return parse_duration(check_interval)
+        except ValueError as exc:
+            raise InvalidConfigValue(f"Invalid {setting_name}: {exc}")
+
+
+    def _get_store(self) -> BundleStore:
+        """Get the user-level bundle store, unless disabled with [switchblade].shared_store = false."""
+        if not self._switchblade_config["switchblade"].get("shared_store", True):
+            return None
+        return BundleStore()
+
+
+    def _get_recently_checked_version(self, cache: "BundleCache", store: BundleStore) -> str:
+        """Get the latest version if it was checked for updates within the check interval.
+
+        Checks made by this project are used first, then checks made by any project
+        using the same bundle source (recorded in the bundle store).
         """
-        return [str(file.relative_to(self.bundle_folder)) for file in self.bundle_folder.rglob("*") if file.name not in BUNDLE_CONFIG_FILES]
+        check_interval = self._get_check_interval()
+        if not check_interval:
+            return None
+        bundle_source_uri = self._switchblade_config["switchblade"]["bundle"]
+        checks = [cache.get_latest_config(), store.get_source_check(bundle_source_uri) if store else None]
+        for check in checks:
+            if check is None or not check.get("checked_on"):
+                continue
+            checked_on = datetime.strptime(check["checked_on"], TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+            if (datetime.now(tz=timezone.utc) - checked_on).total_seconds() >= check_interval:
+                continue
+            if cache.has_bundle(check["commit_sha"]) or self._restore_from_store(cache, store, check["commit_sha"]):
+                return check["commit_sha"]
+        return None
+
+
+    @timings.phase("restore from bundle store")
+    def _restore_from_store(self, cache: "BundleCache", store: BundleStore, version: str) -> bool:
+        """Materialise a bundle version in the project cache from the bundle store, if it's there."""
+        if store is None:
+            return False
+        bundle_source_uri = self._switchblade_config["switchblade"]["bundle"]
+        with cache.add_bundle(version) as bundle_folder:
+            if not store.materialize_bundle(bundle_source_uri, version, bundle_folder):
+                return False
+        click.echo(f"⚔️ Switchblade restored version {version} from the shared bundle store")
+        cache.log("UPDATING", version=version, status="RESTORED_FROM_STORE")
+        return True
 
 
-    def _fetch_latest(self, cache: "BundleCache") -> "Bundle":
+    def _set_checked(self, cache: "BundleCache", store: BundleStore, version: str, etag: str):
+        """Record a successful update check in the project cache and the bundle store."""
+        cache.set_checked(etag)
+        bundle_source_uri = self._switchblade_config["switchblade"]["bundle"]
+        if store is not None and bundle_source_uri.startswith("gh:"):
+            store.set_source_check(bundle_source_uri, version, cache.get_latest_config()["checked_on"])
+
+
+    def _check_remote_version(self, pygithub: "Github", repo_full_name: str, cache: "BundleCache") -> tuple:
+        """Get the commit SHA of the default branch of a Github repo, and the ETag of the response.
+
+        If the ETag from the previous check is still valid, Github answers with a cheap
+        304 Not Modified (which doesn't count against the rate limit), and the latest
+        cached version is returned.
+        """
+        latest_config = cache.get_latest_config()
+        previous_etag = None
+        if latest_config is not None and cache.has_bundle(latest_config["commit_sha"]):
+            previous_etag = latest_config.get("etag")
+
+        repo = pygithub.get_repo(repo_full_name, lazy=True)
+        # PyGithub has no conditional request API, so we use its requester directly
+        # to get the authentication, base URL and error handling of the client
+        headers, data = repo._requester.requestJsonAndCheck(  # pylint: disable=protected-access
+            "GET", f"{repo.url}/commits/HEAD", headers={"If-None-Match": previous_etag} if previous_etag else None
+        )
+        if data is None:
+            # 304 Not Modified
+            return latest_config["commit_sha"], previous_etag
+        return data["sha"], headers.get("etag")
+
+
+    @timings.phase("download bundle")
+    def _download_bundle(self, cache: "BundleCache", pygithub: "Github", version: str, bundle_folder: Path):
+        """Download a bundle version from the bundle source into the bundle folder."""
+        bundle_source_uri = self._switchblade_config["switchblade"]["bundle"]
+        if bundle_source_uri.startswith("gh:"):
+            # Create the bundle folder
+            bundle_folder.mkdir(parents=True)
+            org_name, repo_name, *folder = bundle_source_uri[3:].split("/")
+            repo = pygithub.get_repo(f"{org_name}/{repo_name}", lazy=True)
+            try:
+                # Download the repo archive for the commit in one go
+                download_archive(repo, "/".join(folder), version, bundle_folder)
+            except Exception as exc:
+                # Fall back to downloading the files one by one
+                click.echo(f"⚔️ Switchblade failed to download the bundle archive ({exc}), downloading files individually...")
+                cache.log("UPDATING", version=version, status="ARCHIVE_FAILED")
+                shutil.rmtree(bundle_folder)
+                bundle_folder.mkdir(parents=True)
+                download_contents(repo, "/".join(folder), version, bundle_folder)
+
+        else:
+            # If the source is a local folder, copy it to the cache
+            shutil.copytree(str(bundle_source_uri), str(bundle_folder), dirs_exist_ok=True)
+
+
+    def _fetch_latest(self, cache: "BundleCache", force_check: bool = False) -> "Bundle":
         """Conditionally fetch and return the latest bundle.
         """
         bundle_source_uri = self._switchblade_config["switchblade"]["bundle"]
+        store = self._get_store()
+
+        # Trust a recent check of a remote bundle instead of going to the network
+        if bundle_source_uri.startswith("gh:") and not force_check:
+            recently_checked_version = self._get_recently_checked_version(cache, store)
+            if recently_checked_version is not None:
+                click.echo(f"⚔️ Switchblade bundle version {recently_checked_version} was checked recently, skipping update check.")
+                cache.log("UPDATING", version=recently_checked_version, status="SKIPPED_RECENTLY_CHECKED")
+                recent_bundle = Bundle(self._switchblade_config, recently_checked_version)
+                if cache.get_latest_version() != recently_checked_version:
+                    cache.set_latest_config(recent_bundle)
+                return recent_bundle
+
         click.echo("⚔️ Switchblade checking for updates...")
 
         # Check the remote version to see if we need to update
         remote_version = None
+        remote_etag = None
         pygithub = None
         if bundle_source_uri.startswith("gh:"):
             try:
-                # Init the Github API
-                pygithub = Github(os.environ.get("GITHUB_TOKEN"))
-                # Get the org name, repo name and folder(s)
-                org_name, repo_name, *folder = bundle_source_uri[3:].split("/")
-                # Get the commit SHA from the repo (default branch)
-                repo = pygithub.get_repo(f"{org_name}/{repo_name}")
-                remote_version = repo.get_branch(repo.default_branch).commit.sha
+                with timings.phase("check for updates"):
+                    # Init the Github API (PyGithub is slow to import, so only when we need it)
+                    from github import Github  # pylint: disable=import-outside-toplevel
+                    pygithub = Github(os.environ.get("GITHUB_TOKEN"))
+                    # Get the org name, repo name and folder(s)
+                    org_name, repo_name, *folder = bundle_source_uri[3:].split("/")
+                    if force_check:
+                        # Get the commit SHA from the repo (default branch)
+                        repo = pygithub.get_repo(f"{org_name}/{repo_name}")
+                        remote_version = repo.get_branch(repo.default_branch).commit.sha
+                    else:
+                        remote_version, remote_etag = self._check_remote_version(pygithub, f"{org_name}/{repo_name}", cache)
             except Exception as exc:
                 # If something went wrong fetching from Github,
                 # we use the latest cached bundle if it exists
                 latest_cached_version = cache.get_latest_version()
                 if latest_cached_version is not None:
                     click.echo(f"⚔️ Switchblade failed to fetch remote bundle, using cached version {latest_cached_version} instead.")
-                    cache.log(f"FETCH FAILED_WITH_FALLBACK")
+                    cache.log("FETCH", status="FAILED_WITH_FALLBACK", error=str(exc))
                     return Bundle(self._switchblade_config, latest_cached_version)
                 else:
                     # If there is no cached bundle, raise the exception
-                    cache.log(f"FETCH FAILED")
+                    cache.log("FETCH", status="FAILED", error=str(exc))
                     raise click.ClickException(f"Remote bundle repo '{bundle_source_uri}' could not be fetched: {exc}")
         else:
             # If the folder doesn't exist, raise an exception
             bundle_source_folder = Path(bundle_source_uri)
             if not bundle_source_folder.exists():
                 raise FileNotFoundError(f"Bundle folder {bundle_source_uri} does not exist.")
-            remote_version = hash_dir(bundle_source_uri)
-
-        cache.log(f"UPDATING {remote_version}")
+            # Only the files whose stat data changed since the last run are hashed again
+            with timings.phase("fingerprint bundle source"):
+                fingerprint_index = cache.get_fingerprint_index(bundle_source_uri)
+                remote_version, new_fingerprint_index = fingerprint_dir(bundle_source_uri, fingerprint_index)
+                if new_fingerprint_index != fingerprint_index:
+                    cache.set_fingerprint_index(bundle_source_uri, new_fingerprint_index)
+
+        cache.log("UPDATING", version=remote_version)
         
         # Check if the latest version from the remote is already cached
         # (does not necessarily have to be the most recently fetched bundle from 'latest.toml')
         if cache.has_bundle(remote_version):
             # If the latest cached bundle is up to date, just return it
             click.echo(f"⚔️ Switchblade cache already contains version {remote_version}")
-            cache.log(f"UPDATING {remote_version} SKIPPED_ALREADY_CACHED")
-            return Bundle(self._switchblade_config, remote_version)
-
-        # If the cache is stale, update it
-        click.echo(f"⚔️ Switchblade updating tool bundle to version {remote_version}...")
-        bundle_folder = self._bundle_folder_from_version(remote_version)
-        if bundle_source_uri.startswith("gh:"):
-            # Create the bundle folder
-            bundle_folder.mkdir(parents=True)
-            # Get the contents of the repo
-            org_name, repo_name, *folder = bundle_source_uri[3:].split("/")
-            repo = pygithub.get_repo(f"{org_name}/{repo_name}")
-            repo_contents = repo.get_contents("/".join(folder), ref=remote_version)
-            # Download all the files
-            for repo_asset in repo_contents:
-                with open(bundle_folder / repo_asset.name, "wb") as file:
-                    file.write(repo_asset.decoded_content)
-
-        else:
-            # If the source is a local folder, copy it to the cache
-            shutil.copytree(str(bundle_source_uri), str(bundle_folder), dirs_exist_ok=True)
-
-        cache.log(f"UPDATING {remote_version} SUCCEEDED")
+            cache.log("UPDATING", version=remote_version, status="SKIPPED_ALREADY_CACHED")
+            cached_bundle = Bundle(self._switchblade_config, remote_version)
+            if cache.get_latest_version() != remote_version:
+                cache.set_latest_config(cached_bundle)
+            self._set_checked(cache, store, remote_version, remote_etag)
+            return cached_bundle
+
+        # If the cache is stale, update it (from the bundle store if another project already has the version)
+        if not self._restore_from_store(cache, store, remote_version):
+            click.echo(f"⚔️ Switchblade updating tool bundle to version {remote_version}...")
+            with cache.add_bundle(remote_version) as bundle_folder:
+                self._download_bundle(cache, pygithub, remote_version, bundle_folder)
+                if store is not None:
+                    with timings.phase("add to bundle store"):
+                        store.add_bundle(bundle_source_uri, remote_version, bundle_folder)
+
+        cache.log("UPDATING", version=remote_version, status="SUCCEEDED")
 
         new_bundle = Bundle(self._switchblade_config, remote_version)
         cache.set_latest_config(new_bundle)
+        # Compile the resolved bundle now, rather than on the next run
+        new_bundle.resolve()
+        self._set_checked(cache, store, remote_version, remote_etag)
 
         # Finally, return the fetched bundle
         return new_bundle
 
 
+def _average_durations(previous_durations: dict, durations: dict) -> dict:
+    """Average new durations into the previous ones, so a single slow run doesn't throw off the estimate."""
+    averaged_durations = dict(previous_durations)
+    for name, duration in durations.items():
+        previous_duration = averaged_durations.get(name)
+        averaged_durations[name] = round(duration if previous_duration is None else (previous_duration + duration) / 2, 6)
+    return averaged_durations
+
+
 class BundleCache:
 
     def __init__(self, switchblade_config: dict):
@@ -163,7 +362,6 @@ class BundleCache:
         Creates:
             - The cache folder
             - A .gitignore file in the cache folder with an asterisk in it
-            - An update.log file in the cache folder
         """
         cache_folder = project_folder / CACHE_FOLDERNAME
         if not cache_folder.exists():
@@ -174,14 +372,15 @@ class BundleCache:
             with open(cache_folder / ".gitignore", "w") as gitignore:
                 gitignore.write("*")
 
-        # Make sure the update.log file exists
-        update_log = cache_folder / UPDATE_LOG_FILENAME
-        if not update_log.exists():
-            update_log.touch()
-        
         return cache_folder
 
 
+    @property
+    def cache_folder(self) -> Path:
+        """The cache folder of the project."""
+        return self._cache_folder
+
+
     def get_bundle(self, version: str) -> Bundle:
         """Get a bundle from the cache."""
         return Bundle(self._switchblade_config, version)
@@ -191,8 +390,10 @@ class BundleCache:
         """Get all bundles in the cache."""
         bundles = []
         for bundle_folder in os.listdir(self._cache_folder):
-            # Skip non-folders
-            if not (self._cache_folder / bundle_folder).is_dir():
+            # Skip non-folders, bundles which are still being fetched and folders which are not bundles (e.g. cached results)
+            if bundle_folder.startswith(".") or not (self._cache_folder / bundle_folder).is_dir():
+                continue
+            if not any((self._cache_folder / bundle_folder / name).exists() for name in BUNDLE_CONFIG_FILES):
                 continue
             bundles.append(Bundle(self._switchblade_config, bundle_folder))
         return bundles
@@ -212,41 +413,49 @@ class BundleCache:
         # If the latest.toml file doesn't exist, return None
         if latest_config_file is None:
             return None
-        latest = loads(latest_config_file.read_text(encoding="utf-8"))
+        latest = read_toml(latest_config_file)
         return latest["latest"]
 
 
     def set_latest_config(self, bundle: Bundle):
         """Set the latest config."""
-        latest_config_file = self._get_latest_config_file(False)
-        with open(latest_config_file, "w") as latest_toml:
-            latest_toml.write(
-                dumps(
-                    {
-                        "latest": {
-                            "commit_sha": bundle.version,
-                            "fetched_on": datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
-                            "files": bundle.get_files(),
-                            "last_installed_on": ""
-                        }
+        # Keep the digest of the installed dependencies, since a new bundle version may have the same ones
+        with self.lock(LATEST_LOCK):
+            previous_config = self.get_latest_config() or {}
+            latest_config_file = self._get_latest_config_file(False)
+            write_toml(
+                latest_config_file,
+                {
+                    "latest": {
+                        "commit_sha": bundle.version,
+                        "fetched_on": datetime.now(tz=timezone.utc).strftime(TIMESTAMP_FORMAT),
+                        "files": bundle.get_files(),
+                        "last_installed_on": "",
+                        "installed_digest": previous_config.get("installed_digest", ""),
                     }
-                )
+                }
             )
 
 
     def update_latest_config(self, updated_latest: dict):
         """Update the latest config, merging with updated dict."""
         latest_config_file = self._get_latest_config_file(False)
-        latest_config = self.get_latest_config()
-        merge(latest_config, updated_latest)
-        with open(latest_config_file, "w") as latest_toml:
-            latest_toml.write(
-                dumps(
-                    {
-                        "latest": latest_config
-                    }
-                )
-            )
+        # Don't let concurrent updates of other fields undo each other
+        with self.lock(LATEST_LOCK):
+            latest_config = self.get_latest_config()
+            merge(latest_config, updated_latest)
+            write_toml(latest_config_file, {"latest": latest_config})
+
+
+    def set_checked(self, etag: str = None):
+        """Record that the latest version was just checked against the bundle source.
+
+        The ETag of the check (if any) is stored so the next check can be a conditional request.
+        """
+        self.update_latest_config({
+            "checked_on": datetime.now(tz=timezone.utc).strftime(TIMESTAMP_FORMAT),
+            "etag": etag or "",
+        })
 
 
     def get_latest_version(self) -> str:
@@ -265,22 +474,140 @@ class BundleCache:
         return self.get_bundle(latest_config["commit_sha"])
 
 
-    def log(self, message):
-        current_time = datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-        with open(self._cache_folder / UPDATE_LOG_FILENAME, "a") as update_log:
-            update_log.write(f"[{current_time}] {message}\n")
+    def get_fingerprint_index(self, bundle_source: str) -> dict:
+        """Get the fingerprint index of a local bundle source (see utils.fingerprint_dir)."""
+        fingerprint_index_file = self._cache_folder / FINGERPRINT_INDEX_FILENAME
+        if not fingerprint_index_file.exists():
+            return {}
+        fingerprint_index = read_toml(fingerprint_index_file)
+        if fingerprint_index["source"] != str(bundle_source):
+            return {}
+        return fingerprint_index["files"]
+
+
+    def set_fingerprint_index(self, bundle_source: str, files: dict):
+        """Store the fingerprint index of a local bundle source."""
+        write_toml(self._cache_folder / FINGERPRINT_INDEX_FILENAME, {"source": str(bundle_source), "files": files})
+
+
+    def get_env_config(self) -> dict:
+        """Get the cached info about the project virtualenv (lock_hash and path), or None."""
+        env_config_file = self._cache_folder / ENV_CONFIG_FILENAME
+        if not env_config_file.exists():
+            return None
+        return read_toml(env_config_file)["env"]
+
+
+    def set_env_config(self, env_config: dict):
+        """Cache info about the project virtualenv."""
+        write_toml(self._cache_folder / ENV_CONFIG_FILENAME, {"env": env_config})
+
+
+    def get_materialized(self) -> dict:
+        """Get the bundle files which are kept in the project between runs (version, files and folders), or None."""
+        materialized_file = self._cache_folder / MATERIALIZED_FILENAME
+        if not materialized_file.exists():
+            return None
+        return read_toml(materialized_file)["materialized"]
+
+
+    def set_materialized(self, materialized: dict):
+        """Record the bundle files which are kept in the project between runs, or None if there are none."""
+        materialized_file = self._cache_folder / MATERIALIZED_FILENAME
+        if materialized is None:
+            materialized_file.unlink(missing_ok=True)
+            return
+        write_toml(materialized_file, {"materialized": materialized})
+
+
+    def _get_durations(self) -> dict:
+        durations_file = self._cache_folder / TOOL_DURATIONS_FILENAME
+        if not durations_file.exists():
+            return {}
+        return read_toml(durations_file)
+
+
+    def get_tool_durations(self) -> dict:
+        """Get how long each tool took in its recent full runs (in seconds), to schedule the longest tools first."""
+        return self._get_durations().get("tools", {})
+
+
+    def get_file_durations(self, tool_name: str) -> dict:
+        """Get how long a tool took on each of its files in recent sharded runs (in seconds), to balance the shards."""
+        return self._get_durations().get("files", {}).get(tool_name, {})
+
+
+    def update_tool_durations(self, durations: dict):
+        """Record how long tools took, as a moving average."""
+        with self.lock(DURATIONS_LOCK):
+            all_durations = self._get_durations()
+            all_durations["tools"] = _average_durations(all_durations.get("tools", {}), durations)
+            write_toml(self._cache_folder / TOOL_DURATIONS_FILENAME, all_durations)
+
+
+    def update_file_durations(self, tool_name: str, durations: dict):
+        """Record how long a tool took on each of the given files, as a moving average."""
+        with self.lock(DURATIONS_LOCK):
+            all_durations = self._get_durations()
+            file_durations = all_durations.setdefault("files", {})
+            file_durations[tool_name] = _average_durations(file_durations.get(tool_name, {}), durations)
+            write_toml(self._cache_folder / TOOL_DURATIONS_FILENAME, all_durations)
+
+
+    def log(self, event: str, **fields):
+        """Log an event to the event log of the cache (see EventLog), e.g. log("PUSHED", file=".pylintrc")."""
+        get_event_log(self._cache_folder).log(event, **fields)
+
+
+    def flush_log(self):
+        """Write the logged events to the event log file (this is done at the end of every command)."""
+        get_event_log(self._cache_folder).flush()
+
+
+    def lock(self, name: str, shared: bool = False, on_wait=None) -> FileLock:
+        """Get a lock (see the *_LOCK names) which is shared by all Switchblade processes using the cache."""
+        return FileLock(self._cache_folder / f".{name}.lock", shared, on_wait)
+
+
+    @contextmanager
+    def add_bundle(self, version: str):
+        """Add a bundle version to the cache.
+
+        The bundle is put together in the temporary folder which is yielded, and only renamed
+        to the version once it's complete, so other processes never see a half-written bundle.
+        """
+        temp_folder = self._cache_folder / f".{version}.{os.getpid()}.tmp"
+        try:
+            yield temp_folder
+            if temp_folder.exists() and not self.has_bundle(version):
+                os.rename(temp_folder, self._cache_folder / version)
+        finally:
+            if temp_folder.exists():
+                shutil.rmtree(temp_folder)
 
 
     def has_bundle(self, version: str) -> bool:
-        """Check if a version is in the cache."""
+        """Check if a version is in the cache (bundles are only added complete, see add_bundle)."""
         return (self._cache_folder / version).exists()
 
 
-    def cleanup(self):
+    def cleanup(self) -> bool:
         """Remove all bundles from cache except the latest.
+
+        Runs hold the bundles lock while they use a cached bundle, so if any run is going
+        (e.g. a --watch), nothing is removed and False is returned; a later cleanup will.
         """
-        latest_version = self.get_latest_version()
-        bundles = self.get_bundles()
-        for bundle in bundles:
-            if bundle.version != latest_version:
-                shutil.rmtree(bundle.bundle_folder)
+        bundles_lock = self.lock(BUNDLES_LOCK)
+        if not bundles_lock.acquire(blocking=False):
+            return False
+        try:
+            latest_version = self.get_latest_version()
+            bundles = self.get_bundles()
+            for bundle in bundles:
+                if bundle.version != latest_version:
+                    shutil.rmtree(bundle.bundle_folder)
+                    shutil.rmtree(self._cache_folder / LINKED_FOLDERNAME / bundle.version, ignore_errors=True)
+                    self.log("REMOVED", version=bundle.version)
+        finally:
+            bundles_lock.release()
+        return True
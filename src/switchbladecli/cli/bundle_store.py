@@ -0,0 +1,152 @@
+import hashlib
+import os
+import tempfile
+
+from pathlib import Path
+from tomlkit import dumps
+
+from switchbladecli.toml_files import read_toml
+from switchbladecli.utils import link_or_copy
+
+STORE_FOLDERNAME = "switchblade"
+OBJECTS_FOLDERNAME = "objects"
+MANIFESTS_FOLDERNAME = "bundles"
+SOURCES_FOLDERNAME = "sources"
+# Objects are shared by the bundle folders of all projects, so they must not be edited in place
+OBJECT_MODE = 0o444
+
+
+def _key(*parts) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class BundleStore:
+    """A user-level store of bundle files, shared between all projects on the machine.
+
+    Files are stored once by content hash in 'objects', and each bundle version
+    (of a given bundle source) has a manifest in 'bundles' mapping the files of
+    the bundle to their objects. Project caches are materialised from the store
+    with hardlinks (or reflinks, or copies), so disk use scales with the number
+    of distinct bundles rather than with the number of projects.
+
+    The store also remembers when each bundle source was last checked for updates,
+    so a fresh project can rely on a recent check made by another project.
+    """
+
+    def __init__(self, store_folder: Path = None):
+        self._store_folder = store_folder or self.default_folder()
+        self._objects_folder = self._store_folder / OBJECTS_FOLDERNAME
+        self._manifests_folder = self._store_folder / MANIFESTS_FOLDERNAME
+        self._sources_folder = self._store_folder / SOURCES_FOLDERNAME
+
+
+    @staticmethod
+    def default_folder() -> Path:
+        """The store folder: $SWITCHBLADE_STORE_DIR, or 'switchblade' in $XDG_CACHE_HOME (~/.cache)."""
+        if os.environ.get("SWITCHBLADE_STORE_DIR"):
+            return Path(os.environ["SWITCHBLADE_STORE_DIR"])
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return Path(cache_home) / STORE_FOLDERNAME
+
+
+    def _object_path(self, file_hash: str) -> Path:
+        return self._objects_folder / file_hash[:2] / file_hash[2:]
+
+
+    def _manifest_path(self, source: str, version: str) -> Path:
+        return self._manifests_folder / f"{_key(source, version)}.toml"
+
+
+    def _get_manifest(self, source: str, version: str) -> dict:
+        manifest_path = self._manifest_path(source, version)
+        if not manifest_path.exists():
+            return None
+        return read_toml(manifest_path)["bundle"]
+
+
+    def _write_atomically(self, path: Path, content: str):
+        """Write a file so that concurrent readers never see it half-written."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=path.parent, delete=False, encoding="utf-8") as temp_file:
+            temp_file.write(content)
+        os.replace(temp_file.name, path)
+
+
+    def _verify_object(self, file_hash: str) -> bool:
+        """Check that a stored object still has the contents it is stored under, removing it if not.
+
+        Objects are read-only, but can still be changed by whoever has the rights to (or
+        was linked to them before they were made read-only).
+        """
+        object_path = self._object_path(file_hash)
+        if not object_path.is_file():
+            return False
+        if hashlib.sha256(object_path.read_bytes()).hexdigest() == file_hash:
+            return True
+        object_path.unlink()
+        return False
+
+
+    def add_bundle(self, source: str, version: str, bundle_folder: Path):
+        """Add the files of a bundle folder to the store.
+
+        The files in the bundle folder are replaced by links to the stored objects,
+        which are read-only. Damaged objects are replaced.
+        """
+        files = []
+        for file in sorted(bundle_folder.rglob("*")):
+            if not file.is_file():
+                continue
+            file_hash = hashlib.sha256(file.read_bytes()).hexdigest()
+            object_path = self._object_path(file_hash)
+            if not self._verify_object(file_hash):
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = object_path.with_name(f"{object_path.name}.{os.getpid()}.tmp")
+                link_or_copy(file, temp_path)
+                os.chmod(temp_path, OBJECT_MODE)
+                os.replace(temp_path, object_path)
+            # Replace the file in the bundle folder with a link to the object
+            temp_path = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+            link_or_copy(object_path, temp_path)
+            os.replace(temp_path, file)
+            files.append({"path": file.relative_to(bundle_folder).as_posix(), "hash": file_hash})
+
+        self._write_atomically(
+            self._manifest_path(source, version),
+            dumps({"bundle": {"source": source, "version": version, "files": files}})
+        )
+
+
+    def materialize_bundle(self, source: str, version: str, bundle_folder: Path) -> bool:
+        """Create a bundle folder from the store. Returns False if the bundle isn't in the store.
+
+        The objects are checked against their hashes first, and if any of them is damaged
+        it is removed and the bundle counts as missing, so it is fetched (and stored) again.
+        """
+        manifest = self._get_manifest(source, version)
+        if manifest is None:
+            return False
+        # Check all the objects before linking any, so all the damaged ones are removed
+        if not all([self._verify_object(file["hash"]) for file in manifest["files"]]):
+            return False
+        for file in manifest["files"]:
+            target = bundle_folder.joinpath(*file["path"].split("/"))
+            target.parent.mkdir(parents=True, exist_ok=True)
+            link_or_copy(self._object_path(file["hash"]), target)
+        return True
+
+
+    def get_source_check(self, source: str) -> dict:
+        """Get the last update check of a bundle source (commit_sha and checked_on), or None."""
+        source_path = self._sources_folder / f"{_key(source)}.toml"
+        if not source_path.exists():
+            return None
+        return read_toml(source_path)["source"]
+
+
+    def set_source_check(self, source: str, version: str, checked_on: str):
+        """Record the result of an update check of a bundle source."""
+        self._write_atomically(
+            self._sources_folder / f"{_key(source)}.toml",
+            dumps({"source": {"source": source, "commit_sha": version, "checked_on": checked_on}})
+        )
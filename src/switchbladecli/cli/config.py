@@ -1,12 +1,11 @@
 import os
-from pathlib import Path
 
 import click
-from tomlkit import loads
 
 from switchbladecli.exceptions import MissingConfiguration, MissingRequiredConfigKey
+from switchbladecli.toml_files import read_toml
+from switchbladecli.utils import CONFIG_FILE_NAMES
 
-CONFIG_FILE_NAMES = [".switchblade", "switchblade.toml"]
 REQUIRED_CONFIG_KEYS = {
     "switchblade": ["mode", "bundle"]
 }
@@ -30,7 +29,7 @@ def get_switchblade_config(verbose, project_dir: str, config_file: str):
     if verbose:
         click.echo(f"Loading configuration from {config_file}")
 
-    config = loads(Path(config_file).read_text(encoding="utf-8"))
+    config = read_toml(config_file)
 
     config["project_dir"] = project_dir
     config["config_file"] = config_file
@@ -0,0 +1,36 @@
+import click
+
+from operator import itemgetter
+from switchbladecli.fleet import FLEET_COMMANDS, Fleet, discover_repos
+
+
+@click.command(context_settings={"ignore_unknown_options": True})
+@click.argument("command", type=click.Choice(FLEET_COMMANDS))
+@click.argument("args", nargs=-1, type=click.UNPROCESSED)
+@click.option("--repos", "repos_specs", multiple=True, required=True, metavar="FILE|GLOB", help="Glob of repo folders, or a file listing them one per line. Can be repeated.")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=None, help="Number of repos to run at the same time. Defaults to the number of CPUs.")
+@click.option("--report", "report_file", metavar="FILE", default=None, help="Write the results as JSON to this file.")
+@click.pass_context
+def fleet(ctx, command: str, args: tuple, repos_specs: tuple, jobs: int, report_file: str):
+    """Run a command in many repos in parallel.
+
+    COMMAND: lint, test or update. Any ARGS are passed on to it, e.g. 'swb fleet lint --repos "~/src/*" -- pylint'.
+    """
+    verbose = itemgetter("verbose")(ctx.obj)
+    if not cmd_fleet(verbose, command, list(args), list(repos_specs), jobs=jobs, report_file=report_file):
+        ctx.exit(1)
+
+
+def cmd_fleet(verbose: bool, command: str, args: list, repos_specs: list, jobs: int = None, report_file: str = None) -> bool:
+    repos, skipped = discover_repos(repos_specs)
+    for folder in skipped:
+        click.echo(f"⚔️ Skipping {folder}, which has no Switchblade config file.")
+    if not repos:
+        raise click.ClickException(f"No repos with a Switchblade config file found in {', '.join(repos_specs)}.")
+
+    repos_fleet = Fleet(repos, command, args, jobs=jobs, verbose=verbose)
+    success = repos_fleet.run()
+    repos_fleet.print_summary()
+    if report_file is not None:
+        repos_fleet.write_report(report_file)
+    return success
@@ -0,0 +1,81 @@
+import shutil
+import tarfile
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+ARCHIVE_DOWNLOAD_TIMEOUT = 60  # seconds
+CONTENTS_DOWNLOAD_WORKERS = 8
+
+
+def download_archive(repo, folder: str, ref: str, destination: Path):
+    """Download a folder of a Github repo at the given ref using the repo tarball.
+
+    The tarball is fetched with a single request and extracted while it is
+    being streamed, so it is never held in memory or written to disk as a whole.
+    Only the regular files (and folders) below the given folder are extracted.
+    """
+    archive_url = repo.get_archive_link("tarball", ref=ref)
+    with urllib.request.urlopen(archive_url, timeout=ARCHIVE_DOWNLOAD_TIMEOUT) as response:  # nosec
+        with tarfile.open(fileobj=response, mode="r|gz") as archive:
+            extract_folder(archive, folder, destination)
+
+
+def extract_folder(archive: tarfile.TarFile, folder: str, destination: Path):
+    """Extract the files below a folder of a streamed Github archive to the destination.
+
+    Github archives have a single top-level folder named after the repo and commit,
+    which is stripped along with the folder itself.
+    """
+    folder_parts = PurePosixPath(folder).parts if folder else ()
+    extracted_files = 0
+    for member in archive:
+        # Skip the top-level folder and anything outside of the bundle folder
+        member_parts = PurePosixPath(member.name).parts[1:]
+        if member_parts[:len(folder_parts)] != folder_parts:
+            continue
+        relative_parts = member_parts[len(folder_parts):]
+        if not relative_parts:
+            continue
+        # Never write outside of the destination, and skip links and special files
+        if ".." in relative_parts or PurePosixPath(*relative_parts).is_absolute():
+            continue
+        target = destination.joinpath(*relative_parts)
+        if member.isdir():
+            target.mkdir(parents=True, exist_ok=True)
+        elif member.isfile():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with archive.extractfile(member) as source, open(target, "wb") as file:
+                shutil.copyfileobj(source, file)
+            extracted_files += 1
+    if not extracted_files:
+        raise FileNotFoundError(f"Folder '{folder}' not found in the repo archive.")
+
+
+def download_contents(repo, folder: str, ref: str, destination: Path, workers: int = CONTENTS_DOWNLOAD_WORKERS):
+    """Download a folder of a Github repo at the given ref file by file, including subfolders.
+
+    This costs one API request per file (plus one per folder), so it is only used
+    if the archive can't be downloaded. The files are downloaded on a bounded pool
+    of worker threads, and each one is written as soon as it arrives.
+    """
+    repo_files = []
+    folders = [folder]
+    while folders:
+        for repo_asset in repo.get_contents(folders.pop(), ref=ref):
+            if repo_asset.type == "dir":
+                folders.append(repo_asset.path)
+            else:
+                repo_files.append(repo_asset)
+
+    def download_file(repo_asset):
+        relative_path = PurePosixPath(repo_asset.path).relative_to(folder) if folder else PurePosixPath(repo_asset.path)
+        target = destination.joinpath(*relative_path.parts)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, "wb") as file:
+            file.write(repo_asset.decoded_content)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Consume the results to surface any download errors
+        list(executor.map(download_file, repo_files))
@@ -0,0 +1,121 @@
+import sqlite3
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+from switchbladecli.toml_files import read_toml, write_toml
+from switchbladecli.utils import blake2_of_file
+from switchbladecli.watch import matches_globs
+
+IMPACT_FOLDERNAME = "impact"
+
+
+class ImpactMap:
+    """Which source files each test file touches, to only run the tests affected by a change.
+
+    The map of a test tool is recorded from the coverage data of a full run with a
+    coverage context per test (e.g. pytest --cov-context=test), and is only used with
+    the same bundle version. Test files are stored with a hash of their contents, so
+    test files which changed since, or are new, are always selected.
+    """
+
+    def __init__(self, cache_folder: Path, project_folder: Path):
+        self._impact_folder = cache_folder / IMPACT_FOLDERNAME
+        self._project_folder = project_folder
+
+
+    def _get_map_file(self, tool_name: str) -> Path:
+        return self._impact_folder / f"{tool_name}.toml"
+
+
+    def _read_coverage_contexts(self, coverage_file: Path) -> dict:
+        """Read the files measured in each test of a coverage data file (coverage.py's SQLite format)."""
+        connection = sqlite3.connect(f"{coverage_file.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            rows = connection.execute(
+                "SELECT context.context, file.path FROM line_bits"
+                " JOIN context ON context.id = line_bits.context_id JOIN file ON file.id = line_bits.file_id"
+                " UNION SELECT context.context, file.path FROM arc"
+                " JOIN context ON context.id = arc.context_id JOIN file ON file.id = arc.file_id"
+            ).fetchall()
+        except sqlite3.DatabaseError:
+            return {}
+        finally:
+            connection.close()
+
+        files_by_context = {}
+        for context, path in rows:
+            path = Path(path)
+            if path.is_absolute():
+                if not path.is_relative_to(self._project_folder):
+                    continue
+                path = path.relative_to(self._project_folder)
+            files_by_context.setdefault(context, set()).add(path.as_posix())
+        return files_by_context
+
+
+    def record(self, tool_name: str, bundle_version: str, coverage_file: Path) -> bool:
+        """Record the map of a tool from its coverage data. Returns False if the data has no test contexts.
+
+        Test contexts are named after the test, e.g. "tests/test_things.py::test_one|run",
+        and the lines run outside of any test (such as imports) are left out.
+        """
+        sources_by_test_file = {}
+        for context, files in self._read_coverage_contexts(coverage_file).items():
+            if "::" not in context:
+                continue
+            sources_by_test_file.setdefault(context.split("::", 1)[0], set()).update(files)
+        if not sources_by_test_file:
+            return False
+
+        tests = {
+            test_file: {"hash": blake2_of_file(self._project_folder / test_file), "sources": sorted(sources)}
+            for test_file, sources in sorted(sources_by_test_file.items())
+            if (self._project_folder / test_file).is_file()
+        }
+        self._impact_folder.mkdir(exist_ok=True)
+        write_toml(
+            self._get_map_file(tool_name),
+            {
+                "impact": {
+                    "bundle_version": bundle_version,
+                    "recorded_on": datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                    "tests": tests,
+                }
+            }
+        )
+        return True
+
+
+    def select(self, tool_name: str, bundle_version: str, test_files: list, changed_files: list, input_globs: list = None) -> list:
+        """Select the test files affected by the changed files, or return None if the map is stale.
+
+        A test file is affected if it is new or changed, or if one of the files it touched
+        changed or is gone. The map is stale if it was recorded with another bundle version,
+        or if a changed file matches the input globs but is unknown to the map (e.g. a
+        conftest.py, whose effect on the tests isn't recorded per test).
+        """
+        map_file = self._get_map_file(tool_name)
+        if not map_file.exists():
+            return None
+        impact = read_toml(map_file)["impact"]
+        if impact["bundle_version"] != bundle_version:
+            return None
+
+        changed_files = set(changed_files)
+        recorded_tests = impact["tests"]
+        known_files = set(test_files).union(*[recorded_test["sources"] for recorded_test in recorded_tests.values()])
+        if input_globs and any(file not in known_files and matches_globs(file, [str(input_glob) for input_glob in input_globs]) for file in changed_files):
+            return None
+
+        affected_test_files = []
+        for test_file in test_files:
+            recorded_test = recorded_tests.get(test_file)
+            if (
+                recorded_test is None
+                or test_file in changed_files
+                or recorded_test["hash"] != blake2_of_file(self._project_folder / test_file)
+                or any(source in changed_files or not (self._project_folder / source).exists() for source in recorded_test["sources"])
+            ):
+                affected_test_files.append(test_file)
+        return affected_test_files
@@ -1,23 +1,45 @@
 import click
 
 from operator import itemgetter
+from pathlib import Path
+from switchbladecli.git import get_changed_files
 from switchbladecli.modes.tool_runner import get_tool_runner
 
 
 @click.command()
 @click.argument("linter", required=False)
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=None, help="Number of linters to run in parallel. Defaults to the bundle setting, or 1.")
+@click.option("--no-cache", is_flag=True, default=False, help="Run every tool, even if a cached result for unchanged inputs exists.")
+@click.option("--changed", is_flag=True, default=False, help="Only lint files changed since HEAD (or --since), for linters supporting {files}.")
+@click.option("--since", metavar="REF", default=None, help="Git ref to compare against for --changed, e.g. origin/main. Implies --changed.")
+@click.option("--staged", is_flag=True, default=False, help="Only lint files staged for commit, for linters supporting {files}.")
+@click.option("--fail-fast/--no-fail-fast", default=None, help="Stop as soon as one of the linters fails, cancelling the rest. Defaults to the bundle setting, or off.")
+@click.option("--watch", is_flag=True, default=False, help="Keep running, and re-run the affected linters whenever files change.")
 @click.pass_context
-def lint(ctx, linter: str):
+def lint(ctx, linter: str, jobs: int, no_cache: bool, changed: bool, since: str, staged: bool, fail_fast: bool, watch: bool):
     """Run linter(s) on project.
     
     LINTER: Linter to run. If not specified, all linters will be run.
     """
     project_dir, config, verbose = itemgetter("project_dir", "config", "verbose")(ctx.obj)
-    result = cmd_lint(verbose, project_dir, config, linter)
+    if watch:
+        if changed or since or staged:
+            raise click.UsageError("--watch can't be combined with --changed, --since or --staged.")
+        cmd_watch_lint(verbose, project_dir, config, linter, jobs=jobs, use_cache=not no_cache)
+        return
+    changed_files = None
+    if changed or since or staged:
+        changed_files = get_changed_files(Path(project_dir), since, staged)
+    result = cmd_lint(verbose, project_dir, config, linter, jobs=jobs, use_cache=not no_cache, changed_files=changed_files, fail_fast=fail_fast)
     if not result:
         ctx.exit(1)
 
 
-def cmd_lint(verbose: bool, project_dir: str, config: dict, linter_tool: str = "all"):
+def cmd_lint(verbose: bool, project_dir: str, config: dict, linter_tool: str = "all", jobs: int = None, use_cache: bool = True, changed_files: list = None, fail_fast: bool = None):
     tool_runner = get_tool_runner(config)(config, verbose)
-    return tool_runner.lint(linter_tool)
+    return tool_runner.lint(linter_tool, jobs=jobs, use_cache=use_cache, changed_files=changed_files, fail_fast=fail_fast)
+
+
+def cmd_watch_lint(verbose: bool, project_dir: str, config: dict, linter_tool: str = "all", jobs: int = None, use_cache: bool = True):
+    tool_runner = get_tool_runner(config)(config, verbose)
+    tool_runner.watch("linters", linter_tool, jobs=jobs, use_cache=use_cache)
@@ -0,0 +1,119 @@
+import copy
+import hashlib
+import json
+import os
+import tempfile
+
+from mergedeep import merge
+from pathlib import Path
+
+from switchbladecli.toml_files import stat_signature
+
+RESOLVED_FOLDERNAME = "resolved"
+# Bump when the contents of the manifest change, so old manifests are not used
+MANIFEST_SCHEMA_VERSION = 1
+# Keys of the switchblade config which are added by Switchblade rather than read from the config file
+RUNTIME_CONFIG_KEYS = ["project_dir", "config_file"]
+
+# Loaded manifests by path, with the stat signature of the file when it was loaded
+_loaded_manifests = {}
+
+
+class ResolvedBundle:
+    """Everything a run needs to know about a bundle, as configured for the project.
+
+    The manifest holds the linters and tests tables merged with the overrides from
+    the project's .switchblade file, the files of the bundle with their hashes, the
+    tool.* sections to add to pyproject.toml and the switchblade dependency group.
+    It is compiled once per bundle version and .switchblade config, and stored as
+    JSON in the cache folder, so later runs load it with a single read instead of
+    parsing bundle.toml, merging the configs and walking the bundle folder again.
+    """
+
+    def __init__(self, manifest: dict):
+        self.version = manifest["version"]
+        self.mode = manifest["mode"]
+        # The merged [linters] and [tests] tables, or None if the bundle has none
+        self.linters = manifest["linters"]
+        self.tests = manifest["tests"]
+        self.files = manifest["files"]
+        self.tool_sections = manifest["tool_sections"]
+        self.switchblade_group = manifest["switchblade_group"]
+
+
+    @property
+    def dependencies(self) -> dict:
+        """The dependencies of the bundle's switchblade group."""
+        return self.switchblade_group.get("dependencies", {})
+
+
+    def get_files(self) -> list:
+        """Get the files (excluding the config) in the bundle, relative to the bundle folder."""
+        return [file["path"] for file in self.files]
+
+
+    @staticmethod
+    def get_key(version: str, switchblade_config: dict) -> str:
+        """Get the key of the manifest for a bundle version and .switchblade config."""
+        config = {key: value for key, value in switchblade_config.items() if key not in RUNTIME_CONFIG_KEYS}
+        key_sha = hashlib.sha256(f"{MANIFEST_SCHEMA_VERSION}\0{version}\0".encode("utf-8"))
+        key_sha.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+        return key_sha.hexdigest()
+
+
+    @classmethod
+    def compile(cls, bundle, switchblade_config: dict) -> "ResolvedBundle":
+        """Compile the manifest of a bundle from its bundle.toml and files, and the .switchblade config."""
+        bundle_config = bundle.bundle_config
+        tool_config = bundle_config.get("tool", {})
+        manifest = {
+            "version": bundle.version,
+            "mode": bundle_config["bundle"]["mode"],
+            "files": [
+                {"path": file, "hash": hashlib.sha256((bundle.bundle_folder / file).read_bytes()).hexdigest()}
+                for file in sorted(bundle.get_files())
+            ],
+            "tool_sections": {section: tool_config[section] for section in tool_config if not section.startswith("poetry")},
+            "switchblade_group": tool_config.get("poetry", {}).get("group", {}).get("switchblade", {"dependencies": {}}),
+        }
+        # Apply local overrides from .switchblade (merging the tool dicts) if any
+        for section in ["linters", "tests"]:
+            manifest[section] = merge({}, bundle_config[section], switchblade_config.get(section, {})) if section in bundle_config else None
+        return cls(manifest)
+
+
+    @classmethod
+    def load(cls, bundle, switchblade_config: dict) -> "ResolvedBundle":
+        """Load the manifest of a bundle from the cache folder, compiling it first if needed.
+
+        Like read_toml, each manifest is only read once per process as long as it doesn't
+        change, e.g. in the serve daemon, whose forked children inherit it.
+        """
+        manifest_file = (Path(bundle.bundle_folder).parent / RESOLVED_FOLDERNAME / f"{cls.get_key(bundle.version, switchblade_config)}.json").absolute()
+        if manifest_file.exists():
+            with open(manifest_file, "rb") as manifest_json:
+                signature = stat_signature(os.fstat(manifest_json.fileno()))
+                loaded_manifest = _loaded_manifests.get(manifest_file)
+                if loaded_manifest is None or loaded_manifest[0] != signature:
+                    loaded_manifest = (signature, json.loads(manifest_json.read()))
+                    _loaded_manifests[manifest_file] = loaded_manifest
+            return cls(copy.deepcopy(loaded_manifest[1]))
+
+        resolved_bundle = cls.compile(bundle, switchblade_config)
+        manifest_file.parent.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=manifest_file.parent, delete=False, encoding="utf-8") as temp_file:
+            json.dump(resolved_bundle.to_manifest(), temp_file, separators=(",", ":"), default=str)
+        os.replace(temp_file.name, manifest_file)
+        return resolved_bundle
+
+
+    def to_manifest(self) -> dict:
+        return {
+            "version": self.version,
+            "mode": self.mode,
+            "linters": self.linters,
+            "tests": self.tests,
+            "files": self.files,
+            "tool_sections": self.tool_sections,
+            "switchblade_group": self.switchblade_group,
+        }
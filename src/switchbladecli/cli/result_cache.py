@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+RESULTS_FOLDERNAME = "results"
+
+
+class ResultCache:
+    """A content-addressed cache of successful tool runs.
+
+    A tool run is only cacheable if the tool declares its input files with
+    'inputs' globs (relative to the project folder). The cache key combines the
+    bundle version, the merged tool config (which includes the command), a digest
+    of the environment the tool runs in (e.g. the project lockfile, which pins the
+    tool versions) and a fingerprint of the input files, so a cached result is only
+    reused if none of them have changed.
+    """
+
+    def __init__(self, cache_folder: Path, project_folder: Path):
+        self._results_folder = cache_folder / RESULTS_FOLDERNAME
+        self._project_folder = project_folder
+
+
+    def get_key(self, bundle_version: str, tool_name: str, tool_config: dict, env_digest: str = "") -> str:
+        """Get the cache key for a tool run, or None if the tool is not cacheable."""
+        if not tool_config.get("inputs"):
+            return None
+        key_sha = hashlib.sha256()
+        key_sha.update(bundle_version.encode("utf-8"))
+        key_sha.update(tool_name.encode("utf-8"))
+        key_sha.update(json.dumps(tool_config, sort_keys=True, default=str).encode("utf-8"))
+        key_sha.update(env_digest.encode("utf-8"))
+        key_sha.update(self.fingerprint_inputs(tool_config["inputs"]).encode("utf-8"))
+        return key_sha.hexdigest()
+
+
+    def fingerprint_inputs(self, input_globs: list) -> str:
+        """Hash the paths and contents of all files matching the input globs."""
+        input_files = set()
+        for input_glob in input_globs:
+            input_files.update(file for file in self._project_folder.glob(str(input_glob)) if file.is_file())
+
+        sha = hashlib.sha256()
+        for input_file in sorted(input_files):
+            sha.update(str(input_file.relative_to(self._project_folder)).encode("utf-8"))
+            sha.update(b"\0")
+            sha.update(hashlib.sha256(input_file.read_bytes()).digest())
+        return sha.hexdigest()
+
+
+    def get(self, key: str) -> dict:
+        """Get a cached result, or None if there is no (readable) result for the key."""
+        result_file = self._results_folder / f"{key}.json"
+        if not result_file.exists():
+            return None
+        try:
+            return json.loads(result_file.read_bytes())["result"]
+        except (ValueError, KeyError):
+            return None
+
+
+    def set(self, key: str, tool_name: str, output: str):
+        """Store the result of a successful tool run.
+
+        Results are stored as JSON, which (unlike TOML) can hold any output, including
+        the escape codes of colored output and other control characters.
+        """
+        self._results_folder.mkdir(exist_ok=True)
+        result = {
+            "result": {
+                "tool": tool_name,
+                "ran_on": datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "output": output or "",
+            }
+        }
+        with tempfile.NamedTemporaryFile("w", dir=self._results_folder, delete=False, encoding="utf-8") as temp_file:
+            json.dump(result, temp_file)
+        os.replace(temp_file.name, self._results_folder / f"{key}.json")
@@ -0,0 +1,46 @@
+import click
+
+from operator import itemgetter
+from switchbladecli import daemon
+from switchbladecli.exceptions import InvalidConfigValue
+from switchbladecli.utils import parse_duration
+
+
+@click.command()
+@click.option("--stop", is_flag=True, default=False, help="Stop the daemon running for the project.")
+@click.option("--idle-timeout", metavar="DURATION", default="1h", help="Stop after being idle this long, e.g. 30m or 2h. 0 means never.")
+@click.pass_context
+def serve(ctx, stop: bool, idle_timeout: str):
+    """Run a warm daemon for the project.
+
+    While the daemon is running, 'swb lint', 'swb test' and 'swb update' in the
+    project are forwarded to it, which avoids most of the startup overhead.
+    """
+    project_dir, verbose = itemgetter("project_dir", "verbose")(ctx.obj)
+    cmd_serve(verbose, project_dir, stop, idle_timeout)
+
+
+def cmd_serve(verbose: bool, project_dir: str, stop: bool = False, idle_timeout: str = "1h"):
+    if stop:
+        if daemon.stop_daemon(project_dir):
+            click.echo("⚔️ Switchblade daemon stopped.")
+        else:
+            click.echo("⚔️ No Switchblade daemon is running for this project.")
+        return
+
+    if not daemon.is_supported():
+        raise click.ClickException("The Switchblade daemon is not supported on this platform.")
+    try:
+        idle_timeout_seconds = parse_duration(idle_timeout)
+    except ValueError as exc:
+        raise InvalidConfigValue(f"Invalid --idle-timeout: {exc}")
+
+    project_daemon = daemon.Daemon(project_dir, idle_timeout_seconds)
+    click.echo(f"⚔️ Switchblade daemon listening on {project_daemon.socket_path}")
+    try:
+        project_daemon.serve()
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc))
+    except KeyboardInterrupt:
+        pass
+    click.echo("⚔️ Switchblade daemon stopped.")
@@ -0,0 +1,59 @@
+import json
+
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+
+import click
+
+from switchbladecli.cli.bundle_cache import BundleCache
+from switchbladecli.events import get_command_stats, get_event_log, get_tool_stats
+from switchbladecli.exceptions import InvalidConfigValue
+from switchbladecli.utils import parse_duration
+
+
+@click.command()
+@click.option("--since", metavar="DURATION", default=None, help="Only include events from this long ago, e.g. 7d or 12h.")
+@click.option("--json", "as_json", is_flag=True, default=False, help="Print the stats as JSON.")
+@click.pass_context
+def stats(ctx, since: str, as_json: bool):
+    """Show tool runtimes, cache hit rates and failure rates from the event log of the project."""
+    project_dir, config, verbose = itemgetter("project_dir", "config", "verbose")(ctx.obj)
+    cmd_stats(verbose, project_dir, config, since, as_json)
+
+
+def _format_seconds(seconds: float) -> str:
+    return "-" if seconds is None else f"{seconds:.2f}s"
+
+
+def cmd_stats(verbose: bool, project_dir: str, config: dict, since: str = None, as_json: bool = False):
+    events = get_event_log(BundleCache(config).cache_folder).read()
+    if since is not None:
+        try:
+            since_time = datetime.now(tz=timezone.utc) - timedelta(seconds=parse_duration(since))
+        except ValueError as exc:
+            raise InvalidConfigValue(f"Invalid --since: {exc}")
+        events = [event for event in events if datetime.fromisoformat(event["time"]) >= since_time]
+
+    tool_stats = get_tool_stats(events)
+    command_stats = get_command_stats(events)
+    if as_json:
+        click.echo(json.dumps({"tools": tool_stats, "commands": command_stats}, indent=2))
+        return
+
+    if not tool_stats and not command_stats:
+        click.echo("⚔️ No runs have been logged for this project yet.")
+        return
+
+    if tool_stats:
+        name_width = max(len("Tool"), *[len(tool_name) for tool_name in tool_stats])
+        click.echo(f"{'Tool':<{name_width}}  {'Runs':>5}  {'p50':>8}  {'p95':>8}  {'Cache hits':>10}  {'Failures':>8}")
+        for tool_name, tool in tool_stats.items():
+            click.echo(
+                f"{tool_name:<{name_width}}  {tool['runs']:>5}  {_format_seconds(tool['p50']):>8}  {_format_seconds(tool['p95']):>8}"
+                f"  {tool['cache_hit_rate']:>10.0%}  {tool['failure_rate']:>8.0%}"
+            )
+    if command_stats:
+        name_width = max(len("Command"), *[len(str(command)) for command in command_stats])
+        click.echo(f"\n{'Command':<{name_width}}  {'Runs':>5}  {'p50':>8}  {'p95':>8}")
+        for command, command_runs in command_stats.items():
+            click.echo(f"{str(command):<{name_width}}  {command_runs['runs']:>5}  {_format_seconds(command_runs['p50']):>8}  {_format_seconds(command_runs['p95']):>8}")
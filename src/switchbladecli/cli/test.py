@@ -1,23 +1,53 @@
 import click
 
 from operator import itemgetter
+from pathlib import Path
+from switchbladecli.exceptions import InvalidConfigValue
+from switchbladecli.git import get_changed_files
 from switchbladecli.modes.tool_runner import get_tool_runner
+from switchbladecli.utils import parse_shard
 
 
 @click.command()
 @click.argument("test", required=False)
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=None, help="Number of testing tools to run in parallel. Defaults to the bundle setting, or 1.")
+@click.option("--no-cache", is_flag=True, default=False, help="Run every tool, even if a cached result for unchanged inputs exists.")
+@click.option("--fail-fast/--no-fail-fast", default=None, help="Stop as soon as one of the testing tools fails, cancelling the rest. Defaults to the bundle setting, or off.")
+@click.option("--shard", metavar="I/N", default=None, help="Only run the I-th of N shards of the tests, e.g. 2/4 on the second of four CI nodes.")
+@click.option("--workers", type=click.IntRange(min=1), default=None, help="Number of processes to split the tests over. Defaults to the bundle setting, or 1.")
+@click.option("--affected", is_flag=True, default=False, help="Only run the tests affected by the files changed since HEAD (or --since), for tests recording their impact.")
+@click.option("--since", metavar="REF", default=None, help="Git ref to compare against for --affected, e.g. origin/main. Implies --affected.")
+@click.option("--watch", is_flag=True, default=False, help="Keep running, and re-run the affected testing tools whenever files change.")
 @click.pass_context
-def test(ctx, test: str):
+def test(ctx, test: str, jobs: int, no_cache: bool, fail_fast: bool, shard: str, workers: int, affected: bool, since: str, watch: bool):
     """Run testing tool(s) on project.
     
     TEST: Testing tool to run. If not specified, all testing tools will be run.
     """
     project_dir, config, verbose = itemgetter("project_dir", "config", "verbose")(ctx.obj)
-    result = cmd_test(verbose, project_dir, config, test)
+    if watch:
+        if affected or since:
+            raise click.UsageError("--watch can't be combined with --affected or --since.")
+        cmd_watch_test(verbose, project_dir, config, test, jobs=jobs, use_cache=not no_cache)
+        return
+    affected_files = None
+    if affected or since:
+        affected_files = get_changed_files(Path(project_dir), since)
+    result = cmd_test(verbose, project_dir, config, test, jobs=jobs, use_cache=not no_cache, fail_fast=fail_fast, shard=shard, workers=workers, affected_files=affected_files)
     if not result:
         ctx.exit(1)
 
 
-def cmd_test(verbose: bool, project_dir: str, config: dict, test_tool: str = "all"):
+def cmd_test(verbose: bool, project_dir: str, config: dict, test_tool: str = "all", jobs: int = None, use_cache: bool = True, fail_fast: bool = None, shard: str = None, workers: int = None, affected_files: list = None):
+    if shard is not None:
+        try:
+            shard = parse_shard(shard)
+        except ValueError as exc:
+            raise InvalidConfigValue(f"Invalid --shard: {exc}")
     tool_runner = get_tool_runner(config)(config, verbose)
-    return tool_runner.test(test_tool)
+    return tool_runner.test(test_tool, jobs=jobs, use_cache=use_cache, fail_fast=fail_fast, shard=shard, workers=workers, affected_files=affected_files)
+
+
+def cmd_watch_test(verbose: bool, project_dir: str, config: dict, test_tool: str = "all", jobs: int = None, use_cache: bool = True):
+    tool_runner = get_tool_runner(config)(config, verbose)
+    tool_runner.watch("tests", test_tool, jobs=jobs, use_cache=use_cache)
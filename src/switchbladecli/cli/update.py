@@ -1,16 +1,20 @@
 import click
 
 from operator import itemgetter
-from switchbladecli.cli.bundle_cache import Bundle
+from switchbladecli.cli.bundle_cache import Bundle, BundleCache
 
 
 @click.command()
+@click.option("--if-stale", is_flag=True, default=False, help="Don't check for updates if the bundle was checked within the check interval.")
 @click.pass_context
-def update(ctx):
+def update(ctx, if_stale: bool):
     project_dir, config, verbose = itemgetter("project_dir", "config", "verbose")(ctx.obj)
-    cmd_update(verbose, project_dir, config)
+    cmd_update(verbose, project_dir, config, if_stale)
 
 
-def cmd_update(verbose: bool, project_dir: str, config: dict):
-    # Instantiating a Bundle object will fetch the latest bundle from the source or cache
-    Bundle(config)
+def cmd_update(verbose: bool, project_dir: str, config: dict, if_stale: bool = False):
+    # Instantiating a Bundle object will fetch the latest bundle from the source or cache.
+    # An explicit update always checks the source, even if it was checked recently (unless if_stale)
+    Bundle(config, force_check=not if_stale)
+    # Bundles other than the latest are no longer needed
+    BundleCache(config).cleanup()
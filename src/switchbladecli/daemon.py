@@ -0,0 +1,335 @@
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+
+from pathlib import Path
+
+from switchbladecli.utils import CONFIG_FILE_NAMES
+
+# Commands which are forwarded to a running daemon, if there is one
+FORWARDED_COMMANDS = ["lint", "test", "update"]
+# Set to disable forwarding commands to the daemon
+NO_DAEMON_ENV_VAR = "SWITCHBLADE_NO_DAEMON"
+DEFAULT_IDLE_TIMEOUT = 60*60  # 1 hour
+MAX_MESSAGE_SIZE = 2**20
+# Global CLI options which take a value
+VALUE_OPTIONS = ["--config", "--profile"]
+
+
+def is_supported() -> bool:
+    """The daemon needs Unix sockets which can pass file descriptors between processes."""
+    return hasattr(socket, "AF_UNIX") and hasattr(socket, "send_fds") and hasattr(os, "fork")
+
+
+def socket_path(project_dir: str) -> Path:
+    """The socket of the daemon for a project.
+
+    The socket lives in the runtime (or temp) folder rather than in the project, since
+    the path of a Unix socket is limited to around 100 characters.
+    """
+    project_key = hashlib.sha256(os.path.abspath(project_dir).encode("utf-8")).hexdigest()[:16]
+    runtime_folder = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return Path(runtime_folder) / f"swb-{os.getuid()}-{project_key}.sock"
+
+
+def _find_project_dir(args: list) -> str:
+    """Find the project folder the same way the CLI does, from --config or the config file in the current folder."""
+    config_file = None
+    for index, arg in enumerate(args):
+        if arg == "--config" and index + 1 < len(args):
+            config_file = args[index + 1]
+        elif arg.startswith("--config="):
+            config_file = arg.split("=", 1)[1]
+    if config_file is None:
+        config_file = next((name for name in CONFIG_FILE_NAMES if os.path.exists(name)), None)
+    if config_file is None or not os.path.exists(config_file):
+        return None
+    return os.path.abspath(os.path.dirname(config_file))
+
+
+def _get_command(args: list) -> str:
+    """Get the subcommand from the CLI args, skipping the global options."""
+    args = iter(args)
+    for arg in args:
+        if arg in VALUE_OPTIONS:
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return None
+
+
+def _send_message(connection: socket.socket, message: dict, fds: list = None):
+    data = json.dumps(message).encode("utf-8") + b"\n"
+    if fds:
+        socket.send_fds(connection, [data], fds)
+    else:
+        connection.sendall(data)
+
+
+def _receive_message(connection: socket.socket, buffer: bytearray, max_fds: int = 0) -> tuple:
+    """Receive a newline-delimited JSON message (and any file descriptors sent along with it)."""
+    fds = []
+    while b"\n" not in buffer:
+        if max_fds and not fds:
+            data, fds, _, _ = socket.recv_fds(connection, MAX_MESSAGE_SIZE, max_fds)
+        else:
+            data = connection.recv(MAX_MESSAGE_SIZE)
+        if not data:
+            return None, fds
+        buffer.extend(data)
+    line, _, rest = bytes(buffer).partition(b"\n")
+    buffer[:] = rest
+    return json.loads(line), fds
+
+
+def forward_command(args: list) -> int:
+    """Run a CLI command in the daemon of the project, if one is running.
+
+    The stdin, stdout and stderr of this process are passed to the daemon, so the
+    output of the command (and of the tools it runs) goes straight to our terminal.
+    Returns the exit code of the command, or None if it can't be forwarded.
+    """
+    if os.environ.get(NO_DAEMON_ENV_VAR) or not is_supported() or _get_command(args) not in FORWARDED_COMMANDS:
+        return None
+    project_dir = _find_project_dir(args)
+    if project_dir is None:
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(str(socket_path(project_dir)))
+    except OSError:
+        connection.close()
+        return None
+
+    with connection:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        request = {"args": args, "cwd": os.getcwd(), "env": dict(os.environ)}
+        _send_message(connection, request, [0, 1, 2])
+        buffer = bytearray()
+        started, _ = _receive_message(connection, buffer)
+        if started is None:
+            print("⚔️ Switchblade daemon stopped unexpectedly.", file=sys.stderr)
+            return 1
+        try:
+            finished, _ = _receive_message(connection, buffer)
+        except KeyboardInterrupt:
+            # Pass the interrupt on to the command running in the daemon
+            os.kill(started["pid"], signal.SIGINT)
+            finished, _ = _receive_message(connection, buffer)
+        if finished is None:
+            print("⚔️ Switchblade daemon stopped unexpectedly.", file=sys.stderr)
+            return 1
+        return finished["exit_code"]
+
+
+def stop_daemon(project_dir: str) -> bool:
+    """Ask the daemon of a project to shut down. Returns False if it isn't running."""
+    if not is_supported():
+        return False
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(str(socket_path(project_dir)))
+    except OSError:
+        connection.close()
+        return False
+    with connection:
+        _send_message(connection, {"stop": True})
+        _receive_message(connection, bytearray())
+    return True
+
+
+class Daemon:
+    """A warm background process which runs Switchblade commands for a project.
+
+    The daemon imports everything up front and then forks a child for every request,
+    so each command starts with warm imports (and whatever the daemon has loaded into
+    memory) but still gets its own working folder, environment and output streams.
+    The child takes over the stdin/stdout/stderr of the client, so the output of the
+    tools it runs is streamed straight to the client's terminal.
+    """
+
+    def __init__(self, project_dir: str, idle_timeout: int = DEFAULT_IDLE_TIMEOUT):
+        self._project_dir = project_dir
+        self._idle_timeout = idle_timeout
+        self.socket_path = socket_path(project_dir)
+        self._children = set()
+
+
+    def warm_up(self):
+        """Import the commands and tool runners, which the CLI only imports when they are used.
+
+        Otherwise every forked child would import them all over again.
+        """
+        # pylint: disable=import-outside-toplevel
+        from switchbladecli.cli.__main__ import LAZY_COMMANDS
+        from switchbladecli.modes.tool_runner import MODE_MAP
+        for import_path in [*LAZY_COMMANDS.values(), *MODE_MAP.values()]:
+            importlib.import_module(import_path.split(":")[0])
+        # PyGithub is only imported when a bundle is fetched from Github
+        importlib.import_module("github")
+        self.load_project()
+
+
+    def load_project(self):
+        """Load the project config, the resolved bundle and the virtualenv bin folder into memory.
+
+        So are the files the update check decides from: the last check of the project and of
+        the bundle store for a remote bundle, or the fingerprint index of a local one. They are
+        kept in memory per process until the files they come from change (see read_toml,
+        ResolvedBundle.load and PythonPoetry.resolve_env_bin_folder), so this is done before
+        every fork: it only reloads what changed, and the child inherits the rest. Anything
+        wrong with the project is left for the command itself to report.
+        """
+        # pylint: disable=import-outside-toplevel
+        from switchbladecli.cli.bundle_cache import BundleCache
+        from switchbladecli.cli.bundle_store import BundleStore
+        from switchbladecli.cli.config import find_config_file, get_switchblade_config
+        from switchbladecli.modes.tool_runner import get_tool_runner
+        previous_cwd = os.getcwd()
+        try:
+            # The config file and the bundle folders are relative to the project folder
+            os.chdir(self._project_dir)
+            with contextlib.redirect_stdout(io.StringIO()):
+                config = get_switchblade_config(False, self._project_dir, find_config_file(False, None))
+                cache = BundleCache(config)
+                bundle = cache.get_latest_bundle()
+                if bundle is not None:
+                    bundle.resolve()
+                bundle_source = config["switchblade"]["bundle"]
+                if not bundle_source.startswith("gh:"):
+                    cache.get_fingerprint_index(bundle_source)
+                elif config["switchblade"].get("shared_store", True):
+                    BundleStore().get_source_check(bundle_source)
+                get_tool_runner(config)(config, False).resolve_env_bin_folder()
+        except Exception:  # pylint: disable=broad-except
+            pass
+        finally:
+            os.chdir(previous_cwd)
+
+
+    def _bind(self) -> socket.socket:
+        if self.socket_path.exists():
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(str(self.socket_path))
+                except OSError:
+                    # A stale socket from a daemon which didn't shut down cleanly
+                    self.socket_path.unlink()
+                else:
+                    raise RuntimeError(f"A Switchblade daemon is already running for {self._project_dir}.")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the current user may connect to the daemon
+        previous_umask = os.umask(0o077)
+        try:
+            server.bind(str(self.socket_path))
+        finally:
+            os.umask(previous_umask)
+        server.listen()
+        return server
+
+
+    def _reap_children(self):
+        for pid in list(self._children):
+            finished_pid, _ = os.waitpid(pid, os.WNOHANG)
+            if finished_pid:
+                self._children.discard(pid)
+
+
+    def serve(self):
+        """Serve requests until stopped, or until idle for the idle timeout."""
+        self.warm_up()
+        server = self._bind()
+        try:
+            server.settimeout(1)
+            idle_seconds = 0
+            while True:
+                self._reap_children()
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    idle_seconds = idle_seconds + 1 if not self._children else 0
+                    if self._idle_timeout and idle_seconds >= self._idle_timeout:
+                        return
+                    continue
+                idle_seconds = 0
+                connection.settimeout(None)
+                if not self._handle(server, connection):
+                    return
+        finally:
+            server.close()
+            self.socket_path.unlink(missing_ok=True)
+            self._reap_children()
+
+
+    def _handle(self, server: socket.socket, connection: socket.socket) -> bool:
+        """Handle a request. Returns False if the daemon should stop."""
+        with connection:
+            request, fds = _receive_message(connection, bytearray(), max_fds=3)
+            if request is None:
+                for fd in fds:
+                    os.close(fd)
+                return True
+            if request.get("stop"):
+                _send_message(connection, {"stopped": True})
+                return False
+
+            self.load_project()
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                exit_code = self._run_request(connection, request, fds)
+                os._exit(exit_code)
+            self._children.add(pid)
+            for fd in fds:
+                os.close(fd)
+        return True
+
+
+    def _run_request(self, connection: socket.socket, request: dict, fds: list) -> int:
+        """Run a forwarded command in a forked child, with the streams of the client."""
+        exit_code = 1
+        try:
+            os.setsid()
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            for target_fd, fd in enumerate(fds):
+                os.dup2(fd, target_fd)
+                os.close(fd)
+            os.chdir(request["cwd"])
+            os.environ.clear()
+            os.environ.update(request["env"])
+            _send_message(connection, {"pid": os.getpid()})
+
+            from switchbladecli.cli.__main__ import switchbladecli  # pylint: disable=import-outside-toplevel
+            try:
+                switchbladecli.main(args=request["args"], prog_name="swb", obj={})
+                exit_code = 0
+            except SystemExit as exc:
+                exit_code = exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+            except KeyboardInterrupt:
+                exit_code = 130
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            try:
+                _send_message(connection, {"exit_code": exit_code})
+            except OSError:
+                pass
+        return exit_code
+
+
+def main():
+    """The 'swb' entry point: forward the command to the project daemon if one is running, else run it here."""
+    exit_code = forward_command(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+    from switchbladecli.cli.__main__ import switchbladecli  # pylint: disable=import-outside-toplevel
+    switchbladecli(obj={})  # pylint: disable=no-value-for-parameter
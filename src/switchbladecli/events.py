@@ -0,0 +1,157 @@
+import atexit
+import json
+import os
+import threading
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+from switchbladecli.locking import FileLock
+
+EVENT_LOG_FILENAME = "events.jsonl"
+# The event log is rotated when it grows over this size, keeping this many old logs
+MAX_EVENT_LOG_SIZE = 5 * 2**20
+ROTATED_EVENT_LOGS = 3
+
+
+class EventLog:
+    """An append-only log of structured events (as JSON lines) in the cache folder.
+
+    Events are buffered in memory and written in one go when the log is flushed,
+    which happens once at the end of a command, rather than opening the file for
+    every event. When the log grows too big, it is rotated to events.jsonl.1 (and
+    so on), keeping the last few.
+    """
+
+    def __init__(self, cache_folder: Path):
+        self._cache_folder = Path(cache_folder)
+        self._events = []
+        self._lock = threading.Lock()
+
+
+    @property
+    def path(self) -> Path:
+        return self._cache_folder / EVENT_LOG_FILENAME
+
+
+    def log(self, event: str, **fields):
+        """Add an event, e.g. log("RAN", tool="pylint", exit_code=0, duration=1.2)."""
+        with self._lock:
+            self._events.append({
+                "time": datetime.now(tz=timezone.utc).isoformat(timespec="milliseconds"),
+                "pid": os.getpid(),
+                "event": event,
+                **fields,
+            })
+
+
+    def flush(self):
+        """Append the buffered events to the log file, rotating it first if it's too big."""
+        with self._lock:
+            events, self._events = self._events, []
+        if not events or not self._cache_folder.is_dir():
+            return
+        data = "".join(json.dumps(event, default=str) + "\n" for event in events)
+        # Other processes may be appending to the log too
+        with FileLock(self._cache_folder / ".events.lock"):
+            if self.path.exists() and self.path.stat().st_size + len(data) > MAX_EVENT_LOG_SIZE:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as event_log:
+                event_log.write(data)
+
+
+    def _rotate(self):
+        for index in range(ROTATED_EVENT_LOGS - 1, 0, -1):
+            rotated_log = self._cache_folder / f"{EVENT_LOG_FILENAME}.{index}"
+            if rotated_log.exists():
+                os.replace(rotated_log, self._cache_folder / f"{EVENT_LOG_FILENAME}.{index + 1}")
+        os.replace(self.path, self._cache_folder / f"{EVENT_LOG_FILENAME}.1")
+
+
+    def read(self) -> list:
+        """Read the events in the log (including the rotated logs), oldest first."""
+        self.flush()
+        log_files = [self._cache_folder / f"{EVENT_LOG_FILENAME}.{index}" for index in range(ROTATED_EVENT_LOGS, 0, -1)]
+        events = []
+        for log_file in [*log_files, self.path]:
+            if not log_file.exists():
+                continue
+            with open(log_file, encoding="utf-8") as event_log:
+                for line in event_log:
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash
+                        continue
+        return events
+
+
+# The event logs of the cache folders used by this process
+_event_logs = {}
+_event_logs_lock = threading.Lock()
+
+
+def get_event_log(cache_folder: Path) -> EventLog:
+    """Get the (shared) event log of a cache folder."""
+    cache_folder = os.path.abspath(cache_folder)
+    with _event_logs_lock:
+        if cache_folder not in _event_logs:
+            _event_logs[cache_folder] = EventLog(cache_folder)
+        return _event_logs[cache_folder]
+
+
+def flush_event_logs():
+    """Write the buffered events of all the event logs."""
+    with _event_logs_lock:
+        event_logs = list(_event_logs.values())
+    for event_log in event_logs:
+        event_log.flush()
+
+
+# Don't lose the events of a command which didn't finish normally
+atexit.register(flush_event_logs)
+
+
+def percentile(values: list, percent: float) -> float:
+    """The nearest-rank percentile of a list of numbers, or None if it's empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+def get_tool_stats(events: list) -> dict:
+    """Aggregate the RAN events into runs, p50/p95 runtimes, cache hit rate and failure rate per tool.
+
+    Runtimes are of the runs which weren't cached, and cancelled runs don't count as failures.
+    """
+    runs_by_tool = {}
+    for event in events:
+        if event.get("event") == "RAN":
+            runs_by_tool.setdefault(event["tool"], []).append(event)
+
+    tool_stats = {}
+    for tool_name, runs in sorted(runs_by_tool.items()):
+        durations = [run["duration"] for run in runs if not run.get("cached") and run.get("duration") is not None]
+        finished_runs = [run for run in runs if not run.get("cancelled")]
+        tool_stats[tool_name] = {
+            "runs": len(runs),
+            "p50": percentile(durations, 50),
+            "p95": percentile(durations, 95),
+            "cache_hit_rate": sum(1 for run in runs if run.get("cached")) / len(runs),
+            "failure_rate": sum(1 for run in finished_runs if not run.get("success")) / len(finished_runs) if finished_runs else 0.0,
+        }
+    return tool_stats
+
+
+def get_command_stats(events: list) -> dict:
+    """Aggregate the TIMINGS events into runs and p50/p95 runtimes per command."""
+    totals_by_command = {}
+    for event in events:
+        if event.get("event") == "TIMINGS":
+            totals_by_command.setdefault(event["command"], []).append(event["total"])
+    return {
+        command: {"runs": len(totals), "p50": percentile(totals, 50), "p95": percentile(totals, 95)}
+        for command, totals in sorted(totals_by_command.items())
+    }
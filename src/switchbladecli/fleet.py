@@ -0,0 +1,221 @@
+import glob
+import json
+import os
+import subprocess  # nosec
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import click
+
+from switchbladecli.cli.bundle_cache import CHECK_INTERVAL_ENV_VAR
+from switchbladecli.cli.config import get_switchblade_config
+from switchbladecli.utils import CONFIG_FILE_NAMES
+
+FLEET_COMMANDS = ["lint", "test", "update"]
+
+
+class FleetRepo:
+    """A repository of a fleet, with the result of running a command in it."""
+
+    def __init__(self, project_dir: str, config_file: str):
+        self.project_dir = project_dir
+        self.config_file = config_file
+        self.bundle_source = None
+        self.exit_code = None
+        self.duration = 0.0
+        self.output = ""
+        self.error = None
+
+
+    @property
+    def passed(self) -> bool:
+        return self.error is None and self.exit_code == 0
+
+
+    def load_bundle_source(self, verbose: bool):
+        """Read the bundle source from the config of the repo (local sources are made absolute)."""
+        try:
+            config = get_switchblade_config(verbose, self.project_dir, os.path.basename(self.config_file))
+        except click.ClickException as exc:
+            self.error = exc.format_message()
+            return
+        bundle_source = config["switchblade"]["bundle"]
+        if not bundle_source.startswith("gh:"):
+            bundle_source = os.path.normpath(os.path.join(self.project_dir, bundle_source))
+        self.bundle_source = bundle_source
+
+
+    def to_report(self) -> dict:
+        return {
+            "repo": self.project_dir,
+            "bundle": self.bundle_source,
+            "passed": self.passed,
+            "exit_code": self.exit_code,
+            "duration": round(self.duration, 3),
+            "error": self.error,
+            "output": self.output,
+        }
+
+
+def _find_config_file(path: str) -> str:
+    if os.path.isfile(path):
+        return path if os.path.basename(path) in CONFIG_FILE_NAMES else None
+    return next((os.path.join(path, name) for name in CONFIG_FILE_NAMES if os.path.isfile(os.path.join(path, name))), None)
+
+
+def discover_repos(repos_specs: list) -> tuple:
+    """Find the repos of a fleet from --repos values.
+
+    Each value is a glob of repo folders (or config files), or a file listing such
+    globs one per line (relative to the file, '#' starts a comment). Returns the
+    repos with a Switchblade config file, and the folders matched without one.
+    """
+    paths = []
+    for repos_spec in repos_specs:
+        repos_spec = os.path.expanduser(repos_spec)
+        if os.path.isfile(repos_spec) and os.path.basename(repos_spec) not in CONFIG_FILE_NAMES:
+            list_folder = os.path.dirname(os.path.abspath(repos_spec))
+            with open(repos_spec, encoding="utf-8") as repos_file:
+                patterns = [line.split("#", 1)[0].strip() for line in repos_file]
+            patterns = [os.path.join(list_folder, os.path.expanduser(pattern)) for pattern in patterns if pattern]
+        else:
+            patterns = [repos_spec]
+        for pattern in patterns:
+            paths.extend(sorted(glob.glob(pattern, recursive=True)))
+
+    repos = {}
+    skipped = []
+    for path in paths:
+        config_file = _find_config_file(path)
+        if config_file is None:
+            if os.path.isdir(path):
+                skipped.append(os.path.abspath(path))
+            continue
+        config_file = os.path.abspath(config_file)
+        repos.setdefault(os.path.dirname(config_file), FleetRepo(os.path.dirname(config_file), config_file))
+    return list(repos.values()), skipped
+
+
+class Fleet:
+    """Runs a Switchblade command in many repos, a limited number at a time.
+
+    Every repo runs in its own 'swb' process. The repos are grouped by bundle source,
+    and one repo of each group fetches the bundle first, so every distinct bundle is
+    only fetched once: the other repos get it from the shared bundle store, and trust
+    the update check made at the start of the fleet run.
+    """
+
+    def __init__(self, repos: list, command: str, args: list = None, jobs: int = None, verbose: bool = False):
+        self.repos = repos
+        self._command = command
+        self._args = list(args or [])
+        self._jobs = jobs or os.cpu_count() or 1
+        self._verbose = verbose
+        self._echo_lock = threading.Lock()
+
+
+    def _swb_command(self, repo: FleetRepo, command: str, args: list) -> list:
+        return [sys.executable, "-m", "switchbladecli.cli", "--config", repo.config_file, command, *args]
+
+
+    def _run(self, repo: FleetRepo, command: str, args: list, env: dict) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            self._swb_command(repo, command, args),
+            cwd=repo.project_dir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            check=False,
+        )  # nosec
+
+
+    def _fetch_bundle(self, repo: FleetRepo) -> bool:
+        """Fetch the latest bundle in the first repo of a bundle source group."""
+        start_time = time.monotonic()
+        result = self._run(repo, "update", [], dict(os.environ))
+        repo.output += result.stdout
+        repo.duration += time.monotonic() - start_time
+        if result.returncode != 0:
+            # The other repos fetch the bundle themselves
+            self._echo(f"⚔️ Switchblade failed to fetch bundle {repo.bundle_source} in {repo.project_dir}")
+            return False
+        if self._command == "update":
+            repo.exit_code = 0
+        return True
+
+
+    def _run_repo(self, repo: FleetRepo, env: dict):
+        start_time = time.monotonic()
+        args = ["--if-stale"] if self._command == "update" else self._args
+        result = self._run(repo, self._command, args, env)
+        repo.output += result.stdout
+        repo.exit_code = result.returncode
+        repo.duration += time.monotonic() - start_time
+        self._echo(f"⚔️ {'✅' if repo.passed else '❌'} {repo.project_dir} ({repo.duration:.1f}s)")
+
+
+    def _echo(self, message: str):
+        with self._echo_lock:
+            click.echo(message)
+
+
+    def run(self) -> bool:
+        """Run the command in every repo. Returns whether it passed in all of them."""
+        start_time = time.time()
+        for repo in self.repos:
+            repo.load_bundle_source(self._verbose)
+        runnable_repos = [repo for repo in self.repos if repo.error is None]
+        for repo in self.repos:
+            if repo.error is not None:
+                self._echo(f"⚔️ ❌ {repo.project_dir}: {repo.error}")
+
+        groups = {}
+        for repo in runnable_repos:
+            groups.setdefault(repo.bundle_source, []).append(repo)
+        click.echo(f"⚔️ Switchblade fleet running '{self._command}' in {len(runnable_repos)} repo(s) using {len(groups)} bundle(s)...")
+
+        with ThreadPoolExecutor(max_workers=self._jobs) as executor:
+            # Fetch every distinct bundle once, in the first repo using it
+            fetched = list(executor.map(lambda repos: self._fetch_bundle(repos[0]), groups.values()))
+            for repos, bundle_fetched in zip(groups.values(), fetched):
+                if bundle_fetched and self._command == "update":
+                    self._echo(f"⚔️ ✅ {repos[0].project_dir} ({repos[0].duration:.1f}s)")
+
+            # Then run the command in the repos, trusting the update checks made since the start
+            env = {**os.environ, CHECK_INTERVAL_ENV_VAR: f"{int(time.time() - start_time) + 1}s"}
+            pending_repos = [repo for repo in runnable_repos if repo.exit_code is None]
+            list(executor.map(lambda repo: self._run_repo(repo, env), pending_repos))
+
+        return all(repo.passed for repo in self.repos)
+
+
+    def print_summary(self):
+        """Print a table of the results, and the output of the repos which failed."""
+        failed_repos = [repo for repo in self.repos if not repo.passed]
+        for repo in failed_repos:
+            click.secho(f"\n⚔️ Output of {repo.project_dir}:", bold=True)
+            click.echo(repo.error or repo.output.rstrip())
+
+        repo_width = max([len("Repo"), *[len(repo.project_dir) for repo in self.repos]])
+        click.echo(f"\n{'Repo':<{repo_width}}  {'Result':<6}  Duration")
+        for repo in self.repos:
+            click.secho(
+                f"{repo.project_dir:<{repo_width}}  {'passed' if repo.passed else 'FAILED':<6}  {repo.duration:.1f}s",
+                fg=None if repo.passed else "red",
+            )
+        click.echo(f"\n⚔️ {len(self.repos) - len(failed_repos)} passed, {len(failed_repos)} failed.")
+
+
+    def write_report(self, report_file: str):
+        """Write the results as JSON."""
+        report = {
+            "command": self._command,
+            "passed": all(repo.passed for repo in self.repos),
+            "repos": [repo.to_report() for repo in self.repos],
+        }
+        Path(report_file).write_text(json.dumps(report, indent=2), encoding="utf-8")
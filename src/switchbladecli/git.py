@@ -0,0 +1,68 @@
+import subprocess  # nosec
+
+from pathlib import Path
+
+import click
+
+
+def _git(project_folder: Path, *args) -> list:
+    """Run a git command in the project folder and return the non-empty lines of its output."""
+    try:
+        cmd_result = subprocess.run(
+            ["git", *args], cwd=project_folder, check=False, capture_output=True
+        )  # nosec
+    except FileNotFoundError as exc:
+        raise click.ClickException("git is required to find changed files, but it could not be found.") from exc
+    if cmd_result.returncode != 0:
+        error = cmd_result.stderr.decode("utf-8", errors="replace").strip() if cmd_result.stderr else ""
+        raise click.ClickException(f"'git {' '.join(args)}' failed: {error}")
+    stdout = cmd_result.stdout.decode("utf-8", errors="replace") if cmd_result.stdout else ""
+    return [line for line in stdout.splitlines() if line]
+
+
+def get_changed_files(project_folder: Path, since: str = None, staged: bool = False) -> list:
+    """Get the files in the project folder that were changed according to git.
+
+    - staged: the files staged for commit
+    - since: the files changed compared to the given ref (e.g. origin/main), including
+      uncommitted and untracked files
+    - otherwise: the files changed compared to HEAD, including untracked files
+
+    Deleted files are left out. Paths are relative to the project folder, and
+    files outside of the project folder are ignored.
+    """
+    if staged:
+        return sorted(set(_git(project_folder, "diff", "--name-only", "--relative", "--diff-filter=d", "--cached")))
+
+    changed_files = _git(project_folder, "diff", "--name-only", "--relative", "--diff-filter=d", since or "HEAD")
+    untracked_files = _git(project_folder, "ls-files", "--others", "--exclude-standard")
+    return sorted(set(changed_files + untracked_files))
+
+
+def get_project_files(project_folder: Path) -> list:
+    """Get the files in the project folder that git knows about (tracked or untracked, but not ignored)."""
+    return _git(project_folder, "ls-files", "--cached", "--others", "--exclude-standard")
+
+
+def set_excluded_files(project_folder: Path, files: list):
+    """Make git ignore the given files of the project folder, without changing .gitignore.
+
+    The files are listed in a block of the repo's .git/info/exclude which is managed by
+    Switchblade (one per project folder), replacing the files of an earlier call. Does
+    nothing if the project folder isn't in a git repo.
+    """
+    try:
+        exclude_file = project_folder / _git(project_folder, "rev-parse", "--git-path", "info/exclude")[0]
+        prefix = next(iter(_git(project_folder, "rev-parse", "--show-prefix")), "")
+    except click.ClickException:
+        return
+    block_start = f"# >>> switchblade /{prefix} >>>"
+    block_end = f"# <<< switchblade /{prefix} <<<"
+
+    lines = exclude_file.read_text(encoding="utf-8").splitlines() if exclude_file.exists() else []
+    if block_start in lines and block_end in lines:
+        del lines[lines.index(block_start):lines.index(block_end) + 1]
+    if files:
+        lines.extend([block_start, *[f"/{prefix}{Path(file).as_posix()}" for file in sorted(files)], block_end])
+    exclude_file.parent.mkdir(parents=True, exist_ok=True)
+    exclude_file.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
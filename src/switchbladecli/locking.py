@@ -0,0 +1,81 @@
+import os
+import time
+
+try:
+    import fcntl
+except ModuleNotFoundError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# How often to retry a lock on Windows, which can't block on one
+LOCK_RETRY_INTERVAL = 0.1
+
+
+class FileLock:
+    """An advisory lock on a file, shared between processes.
+
+    Shared locks can be held by many processes at once (e.g. runs reading from the
+    cache), an exclusive lock by only one (e.g. a run changing the cache). The lock
+    is released when the process exits, so a crashed run never leaves it behind.
+    On Windows every lock is exclusive.
+    """
+
+    def __init__(self, path, shared: bool = False, on_wait=None):
+        self._path = path
+        self._shared = shared
+        # Called before blocking on a lock which is held by another process
+        self._on_wait = on_wait
+        self._lock_file = None
+
+
+    def _try_lock(self) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), (fcntl.LOCK_SH if self._shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+            else:
+                self._lock_file.seek(0)
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Acquire the lock, waiting for it unless blocking is False. Returns whether it was acquired."""
+        self._lock_file = open(self._path, "a+")  # pylint: disable=consider-using-with
+        if self._try_lock():
+            return True
+        if not blocking:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+        if self._on_wait is not None:
+            self._on_wait()
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_SH if self._shared else fcntl.LOCK_EX)
+        else:
+            while not self._try_lock():
+                time.sleep(LOCK_RETRY_INTERVAL)
+        return True
+
+
+    def release(self):
+        if self._lock_file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._lock_file.seek(0)
+            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._lock_file.close()
+        self._lock_file = None
+
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -1,18 +1,56 @@
 from pathlib import Path
 import click
+import functools
+import hashlib
+import importlib.metadata
+import json
+import os
 import shutil
 import subprocess  # nosec
+import threading
+import time
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime, timezone
-from mergedeep import merge
 from tomlkit import dumps, loads
 
-from switchbladecli.cli.bundle_cache import Bundle, BundleCache
+from switchbladecli.cli.bundle_cache import BUNDLES_LOCK, LINKED_FOLDERNAME, PROJECT_LOCK, Bundle, BundleCache
+from switchbladecli.cli.bundle_store import BundleStore
+from switchbladecli.cli.impact_map import ImpactMap
+from switchbladecli.cli.result_cache import ResultCache
+from switchbladecli.exceptions import InvalidConfigValue
+from switchbladecli.git import set_excluded_files
+from switchbladecli.modes.scheduler import ToolResult, ToolScheduler
+from switchbladecli.modes.tools_venv import ToolsVenv
+from switchbladecli.timings import timings
+from switchbladecli.toml_files import stat_signature
+from switchbladecli.utils import blake2_of_file, max_command_length, normalize_distribution_name, reflink, split_into_chunks, split_into_shards
+from switchbladecli.watch import POLL_INTERVAL, Watcher, matches_globs
+
+# Placeholder in tool commands which is replaced with the files to run the tool on
+FILES_PLACEHOLDER = "{files}"
+def _using_bundles(method):
+    """Hold the bundles lock (shared) from fetching the bundle until the run is cleaned up.
+
+    BundleCache.cleanup() only removes old bundles while no run holds it, so a run
+    never loses the bundle it is using.
+    """
+    @functools.wraps(method)
+    def locked_method(self, *args, **kwargs):
+        with self._cache.lock(BUNDLES_LOCK, shared=True):  # pylint: disable=protected-access
+            return method(self, *args, **kwargs)
+    return locked_method
+
+
+# Resolved virtualenv bin folders by lockfile, with the stat signature of the lockfile they were resolved for
+_env_bin_folders = {}
 
 
 class PythonPoetry:
 
-    SKIP_UPDATE_IF_INSTALLED_WITHIN = 60*60*24  # 24 hours
+    TOOLS_ENVS = ["project", "isolated"]
+    MATERIALIZE_STRATEGIES = ["copy", "symlink", "reflink", "persistent"]
     mode = "python-poetry"
 
     def __init__(self, config: dict, verbose: bool):
@@ -20,14 +58,39 @@ class PythonPoetry:
         self._project_folder = Path(config["project_dir"])
         self._verbose = verbose
         self._cache = BundleCache(self._config)
+        self._result_cache = ResultCache(self._cache.cache_folder, self._project_folder)
+        self._impact_map = ImpactMap(self._cache.cache_folder, self._project_folder)
+        self._tools_env = self._config["switchblade"].get("tools_env", "project")
+        if self._tools_env not in self.TOOLS_ENVS:
+            raise InvalidConfigValue(f"Invalid [switchblade].tools_env '{self._tools_env}', must be one of {self.TOOLS_ENVS}.")
+        # How the bundle files are put into the project
+        self._materialize = self._config["switchblade"].get("materialize", "copy")
+        if self._materialize not in self.MATERIALIZE_STRATEGIES:
+            raise InvalidConfigValue(f"Invalid [switchblade].materialize '{self._materialize}', must be one of {self.MATERIALIZE_STRATEGIES}.")
+        # The original pyproject.toml and poetry.lock, restored after the run
+        self._pyproject_file_raw_before = None
+        self._poetry_lockfile_raw_before = None
+        # The bin folder of the isolated tools virtualenv, if tools_env = "isolated"
+        self._tools_bin_folder = None
+        # The bin folder of the project virtualenv, if it could be resolved
+        self._env_bin_folder = None
+        # The tool processes which are currently running, and whether the current run was cancelled
+        self._processes = set()
+        self._processes_lock = threading.Lock()
+        self._cancelled = threading.Event()
 
 
     # TODO: Make this an override
-    def install_dev_tools(self, bundle: Bundle):
+    @timings.phase("install dev tools")
+    def install_dev_tools(self, bundle: Bundle, dependencies: dict = None):
+        """Install the dev tools of the bundle (only the given dependencies, or all of them if None)."""
+        resolved_bundle = bundle.resolve()
+        all_dependencies = resolved_bundle.dependencies
+        if dependencies is None:
+            dependencies = all_dependencies
+
         # Check for a virtualenv and return an error if one is not found
-        check_env = subprocess.run(["poetry", "env", "info", "--path"], cwd=self._project_folder, check=False, capture_output=True)  # nosec
-        if check_env.returncode != 0:
-            raise click.ClickException("No virtualenv found. Please run `poetry install` first.")
+        self._env_bin_folder = self.resolve_env_bin_folder()
 
         # Read pyproject.toml and remove the sections [tool.poetry.group.switchblade]
         # and [tool.poetry.group.switchblade.dependencies], and add the ones from the
@@ -41,99 +104,717 @@ class PythonPoetry:
         else:
             self._poetry_lockfile_raw_before = None
         pyproject_config = loads(self._pyproject_file_raw_before)
-        pyproject_config["tool"]["poetry"]["group"][
-            "switchblade"
-        ] = bundle.bundle_config["tool"]["poetry"]["group"]["switchblade"]
+        if self._tools_env == "project":
+            switchblade_group = dict(resolved_bundle.switchblade_group)
+            switchblade_group["dependencies"] = dependencies
+            pyproject_config["tool"]["poetry"]["group"]["switchblade"] = switchblade_group
 
         # Also take all other sections beginning with 'tool.' and add them to the pyproject.toml
         # unless there is already a section with the same name in the pyproject.toml
-        for section in bundle.bundle_config["tool"]:
-            if not section.startswith("poetry") and section not in pyproject_config["tool"]:
-                pyproject_config["tool"][section] = bundle.bundle_config["tool"][
-                    section
-                ]
-        with open(self._pyproject_file, "w") as pyproject_toml:
-            pyproject_toml.write(dumps(pyproject_config))
-
-        # If the bundle was recently installed, we can optimistically skip the update
-        latest_config = self._cache.get_latest_config()
-        last_installed_on = latest_config["last_installed_on"]
-        if last_installed_on:
-            last_installed_on = datetime.strptime(last_installed_on, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-            current_datetime = datetime.now(tz=timezone.utc)
-            if (current_datetime - last_installed_on).total_seconds() < self.SKIP_UPDATE_IF_INSTALLED_WITHIN:
-                print("🔒 bundle dependencies were recently installed, skipping...")
-                return
+        for section, section_config in resolved_bundle.tool_sections.items():
+            if section not in pyproject_config["tool"]:
+                pyproject_config["tool"][section] = section_config
+        # Leave the file alone if nothing changed, so file watchers aren't triggered
+        pyproject_raw = dumps(pyproject_config)
+        if pyproject_raw != self._pyproject_file_raw_before:
+            with open(self._pyproject_file, "w") as pyproject_toml:
+                pyproject_toml.write(pyproject_raw)
 
-        subprocess.run(
-            ["poetry", "update", "--only", "switchblade"],
-            cwd=self._project_folder,
-            check=True,
-            capture_output=False,
-        )
+        if self._tools_env == "isolated":
+            self.install_tools_venv(dependencies)
+            return
+
+        # If these bundle dependencies (or all of them) are already installed with this lockfile, skip the update
+        installed_digest = self._cache.get_latest_config().get("installed_digest")
+        if installed_digest in {self._get_install_digest(dependencies), self._get_install_digest(all_dependencies)} and self._has_distributions(dependencies):
+            print("🔒 bundle dependencies are already installed, skipping...")
+            return
+
+        with timings.phase("poetry update"):
+            subprocess.run(
+                ["poetry", "update", "--only", "switchblade"],
+                cwd=self._project_folder,
+                check=True,
+                capture_output=False,
+            )
 
+        # Record what was installed (the project lockfile is restored after the run,
+        # so the digest is of the lockfile as it was before the update)
         self._cache.update_latest_config({
-            "last_installed_on": datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            "last_installed_on": datetime.now(tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+            "installed_digest": self._get_install_digest(dependencies),
         })
 
 
+    def get_tool_dependencies(self, bundle: Bundle, tools_config: dict, tool_names: list) -> dict:
+        """Get the dependencies needed to run the given tools.
+
+        Tools can declare the packages they need with 'requires', which must be dependencies
+        of the bundle's switchblade group. If any of the tools doesn't declare its requirements,
+        all of the dependencies are needed.
+        """
+        all_dependencies = bundle.resolve().dependencies
+        dependencies = {}
+        for tool_name in tool_names:
+            if tool_name not in tools_config:
+                raise InvalidConfigValue(f"Tool '{tool_name}' is not defined in the bundle.")
+            if "requires" not in tools_config[tool_name]:
+                return all_dependencies
+            for requirement in tools_config[tool_name]["requires"]:
+                if requirement not in all_dependencies:
+                    raise InvalidConfigValue(f"Tool '{tool_name}' requires '{requirement}', which is not a dependency in the bundle.")
+                dependencies[requirement] = all_dependencies[requirement]
+        return dependencies
+
+
+    def _get_install_digest(self, dependencies: dict) -> str:
+        """Get a digest of the bundle dependencies and the project lockfile, which together determine what gets installed."""
+        digest = hashlib.sha256(json.dumps(dict(sorted(dependencies.items())), sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+        if self._poetry_lockfile_raw_before is not None:
+            digest.update(self._poetry_lockfile_raw_before.encode("utf-8"))
+        return digest.hexdigest()
+
+
+    def _has_distributions(self, dependencies: dict) -> bool:
+        """Quickly check that the dependencies are installed in the project virtualenv.
+
+        This only looks for the distribution metadata in site-packages, so it can't tell
+        if the installed versions are right (the install digest takes care of that).
+        If the virtualenv path isn't known, the install digest is trusted on its own.
+        """
+        if self._env_bin_folder is None:
+            return True
+        env_folder = self._env_bin_folder.parent
+        site_packages = [*env_folder.glob("lib/python*/site-packages"), env_folder / "Lib" / "site-packages"]
+        installed = {
+            normalize_distribution_name(distribution.metadata["Name"] or "")
+            for distribution in importlib.metadata.distributions(path=[str(folder) for folder in site_packages if folder.is_dir()])
+        }
+        return all(normalize_distribution_name(name) in installed for name in dependencies)
+
+
+    def resolve_env_bin_folder(self) -> Path:
+        """Get the bin folder of the project virtualenv, so tools can be run without 'poetry run'.
+
+        The virtualenv path is cached in the bundle cache, keyed by a hash of the
+        lockfile, so 'poetry env info' only runs when the dependencies change.
+        Raises an error if there is no virtualenv, and returns None if it exists
+        but its path could not be resolved. The result is also kept in memory until the
+        lockfile changes, e.g. in the serve daemon, whose forked children inherit it.
+        """
+        lockfile = (self._project_folder / "poetry.lock").absolute()
+        lock_signature = stat_signature(lockfile.stat()) if lockfile.exists() else None
+        resolved = _env_bin_folders.get(lockfile)
+        if resolved is not None and resolved[0] == lock_signature and resolved[1].is_dir():
+            return resolved[1]
+
+        lock_hash = hashlib.sha256(lockfile.read_bytes() if lockfile.exists() else b"").hexdigest()
+        env_config = self._cache.get_env_config()
+        if env_config is not None and env_config["lock_hash"] == lock_hash and Path(env_config["path"]).is_dir():
+            env_folder = Path(env_config["path"])
+        else:
+            with timings.phase("poetry env info"):
+                check_env = subprocess.run(["poetry", "env", "info", "--path"], cwd=self._project_folder, check=False, capture_output=True)  # nosec
+            if check_env.returncode != 0:
+                raise click.ClickException("No virtualenv found. Please run `poetry install` first.")
+            env_path = check_env.stdout.decode("utf-8", errors="replace").strip() if check_env.stdout else ""
+            if not env_path or not Path(env_path).is_dir():
+                return None
+            env_folder = Path(env_path)
+            self._cache.set_env_config({"lock_hash": lock_hash, "path": str(env_folder)})
+
+        bin_folder = env_folder / ("Scripts" if os.name == "nt" else "bin")
+        if not bin_folder.is_dir():
+            return None
+        _env_bin_folders[lockfile] = (lock_signature, bin_folder)
+        return bin_folder
+
+
+    @timings.phase("install tools virtualenv")
+    def install_tools_venv(self, dependencies: dict):
+        """Install dev tools into a virtualenv shared by all projects using the same tools."""
+        tools_venv = ToolsVenv(dependencies, BundleStore.default_folder())
+        if tools_venv.is_installed():
+            print("🔒 bundle dependencies are already installed in the tools virtualenv, skipping...")
+        else:
+            print(f"⚔️ Switchblade installing dev tools into {tools_venv.folder}...")
+            tools_venv.install()
+            self._cache.log("INSTALLED_TOOLS_VENV", key=tools_venv.key)
+        self._tools_bin_folder = tools_venv.bin_folder
+
+
+    def _get_linked_copy(self, bundle: Bundle, file: str) -> Path:
+        """Get the private copy of a bundle file which is symlinked into the project.
+
+        The files in the bundle folder are hardlinks to the objects of the shared bundle
+        store, so editing the file through a link to them would change the bundle for
+        every project using it. The copy is made again if it no longer matches the bundle.
+        """
+        source = bundle.bundle_folder / file
+        linked_copy = bundle.bundle_folder.parent / LINKED_FOLDERNAME / bundle.version / file
+        if not linked_copy.is_file() or blake2_of_file(linked_copy) != blake2_of_file(source):
+            linked_copy.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, linked_copy)
+        return linked_copy
+
+
+    def _materialize_file(self, bundle: Bundle, file: str, strategy: str):
+        """Put a bundle file into the project: as a copy, a (relative) symlink or a copy-on-write clone.
+
+        Falls back to a regular copy where links or clones aren't supported (e.g. symlinks on
+        Windows without developer mode, or reflinks on filesystems without copy-on-write).
+        """
+        source = bundle.bundle_folder / file
+        destination = self._project_folder / file
+        if strategy in ["symlink", "persistent"]:
+            try:
+                linked_copy = self._get_linked_copy(bundle, file)
+                os.symlink(os.path.relpath(linked_copy.resolve(), destination.parent.resolve()), destination)
+                return
+            except OSError:
+                pass
+        elif strategy == "reflink":
+            try:
+                reflink(source, destination)
+                return
+            except (ImportError, OSError):
+                pass
+        shutil.copyfile(source, destination)
+
+
+    def _is_materialized(self, file: str, file_hash: str) -> bool:
+        """Check that a file kept in the project is still the one Switchblade put there."""
+        path = self._project_folder / file
+        if path.is_symlink():
+            return path.exists()
+        return path.is_file() and blake2_of_file(path) == file_hash
+
+
+    def _unmaterialize(self, materialized: dict):
+        """Remove the bundle files (and folders) which were kept in the project between runs.
+
+        Files which were replaced since, e.g. with a config of the project's own, are left alone.
+        """
+        for file, file_hash in materialized["files"].items():
+            path = self._project_folder / file
+            if path.is_symlink() or (path.is_file() and blake2_of_file(path) == file_hash):
+                path.unlink()
+                self._cache.log("POPPED", file=file)
+        for folder in reversed(materialized["folders"]):
+            path = self._project_folder / folder
+            if path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+                self._cache.log("POPPED", file=folder)
+        self._cache.set_materialized(None)
+        set_excluded_files(self._project_folder, [])
+
+
+    def _materialize_persistent(self, bundle: Bundle):
+        """Keep the bundle files linked into the project between runs, changing them only when the bundle version changes.
+
+        The files are git-ignored (in .git/info/exclude), so they don't show up as changes.
+        """
+        materialized = self._cache.get_materialized()
+        if materialized is not None:
+            if materialized["version"] == bundle.version and all(
+                self._is_materialized(file, file_hash) for file, file_hash in materialized["files"].items()
+            ):
+                return
+            self._unmaterialize(materialized)
+
+        pushed_files = self._push_config_files(bundle, "persistent")
+        files = {file: blake2_of_file(bundle.bundle_folder / file) for file in pushed_files if not (self._project_folder / file).is_dir()}
+        folders = [file for file in pushed_files if file not in files]
+        self._cache.set_materialized({"version": bundle.version, "files": files, "folders": folders})
+        set_excluded_files(self._project_folder, pushed_files)
+
+
     # TODO: Place this in a superclass
+    @timings.phase("copy config files")
     def copy_config_files(self, bundle: Bundle):
+        """Put the bundle files into the project for a run, and return the ones to remove afterwards.
+
+        With [switchblade].materialize = "persistent" the files are kept in the project between
+        runs, so there is nothing to remove.
+        """
+        if self._materialize == "persistent":
+            self._materialize_persistent(bundle)
+            return []
+        materialized = self._cache.get_materialized()
+        if materialized is not None:
+            # The strategy was persistent before
+            self._unmaterialize(materialized)
+        return self._push_config_files(bundle, self._materialize)
+
+
+    def _push_config_files(self, bundle: Bundle, strategy: str) -> list:
         # For each file in the bundle, check if the file exists in the project folder
         pushed_files = []
-        for file in bundle.get_files():
+        for file in bundle.resolve().get_files():
             if (self._project_folder / file).exists():
                 # If the file exists, skip it
-                self._cache.log(f"SKIPPED {file}")
+                self._cache.log("SKIPPED", file=file)
                 continue
             else:
-                # If the file doesn't exist, copy it from the commit SHA folder to the project folder
-                shutil.copyfile(
-                    bundle.bundle_folder / file,
-                    self._project_folder / file
-                )
+                # Create any missing parent folders, and remember them so they are removed again
+                missing_folders = []
+                parent_folder = (self._project_folder / file).parent
+                while not parent_folder.exists():
+                    missing_folders.insert(0, parent_folder)
+                    parent_folder = parent_folder.parent
+                for folder in missing_folders:
+                    folder.mkdir()
+                    folder_name = str(folder.relative_to(self._project_folder))
+                    pushed_files.append(folder_name)
+                    self._cache.log("PUSHED", file=folder_name)
+                # If the file doesn't exist, copy (or link) it from the commit SHA folder to the project folder
+                self._materialize_file(bundle, file, strategy)
                 pushed_files.append(file)
-                self._cache.log(f"PUSHED {file}")
+                self._cache.log("PUSHED", file=file)
         return pushed_files
 
 
-    # TODO: Make this an override (must return False if the linter fails)
-    def run_linter(self, bundle: Bundle, linter: dict):
-        linter_command_list = linter["command"].split(" ")
-        cmd_result = subprocess.run(
-            ["poetry", "run", *linter_command_list], cwd=self._project_folder, check=False
-        )
-        return cmd_result.returncode == 0
+    # TODO: Place this in a superclass
+    @timings.phase("remove config files")
+    def remove_config_files(self, pushed_files: list):
+        # Remove the files (and folders) from the project folder that were added by copy_config_files,
+        # in reverse order so folders are empty by the time they are removed
+        for file in reversed(pushed_files):
+            if (self._project_folder / file).is_dir():
+                (self._project_folder / file).rmdir()
+            else:
+                (self._project_folder / file).unlink()
+            self._cache.log("POPPED", file=file)
+
+
+    # TODO: Make this an override (must return a falsy result if the linter fails)
+    def run_linter(self, bundle: Bundle, linter: dict, capture_output: bool = False, files: list = None) -> ToolResult:
+        return self._run_tool_command(linter["command"], capture_output, files, linter.get("env"))
+
+
+    # TODO: Make this an override (must return a falsy result if the test fails)
+    def run_test(self, bundle: Bundle, test: dict, capture_output: bool = False, files: list = None) -> ToolResult:
+        return self._run_tool_command(test["command"], capture_output, files, test.get("env"))
+
+
+    def _run_tool_command(self, command: str, capture_output: bool, files: list = None, extra_env: dict = None) -> ToolResult:
+        """Run a tool command in the project virtualenv.
+
+        If capture_output is set, stdout and stderr are buffered together and
+        returned with the result instead of going straight to the terminal.
+        If files are given, they replace the {files} placeholder in the command.
+        extra_env is added to the environment of the tool process.
+        """
+        command_list = []
+        for arg in command.split(" "):
+            if arg == FILES_PLACEHOLDER:
+                command_list.extend(files or [])
+            else:
+                command_list.append(arg)
+        # Tools from the isolated virtualenv are found after those installed in the project,
+        # so projects can still override them
+        bin_folders = [str(folder) for folder in [self._env_bin_folder, self._tools_bin_folder] if folder is not None]
+        env = None
+        if bin_folders or extra_env:
+            env = {**os.environ, **(extra_env or {})}
+        if bin_folders:
+            env["PATH"] = os.pathsep.join([*bin_folders, os.environ.get("PATH", "")])
+
+        # Run the tool executable directly if we can find it, to avoid the startup cost of
+        # 'poetry run' for every tool. Otherwise let Poetry find it in the project virtualenv.
+        executable = shutil.which(command_list[0], path=os.pathsep.join(bin_folders)) if bin_folders else None
+        if executable is not None and self._env_bin_folder is not None:
+            env["VIRTUAL_ENV"] = str(self._env_bin_folder.parent)
+            env.pop("PYTHONHOME", None)
+            run_command_list = [executable, *command_list[1:]]
+        else:
+            run_command_list = ["poetry", "run", *command_list]
+
+        # A chunk or worker of a tool may only get to start after the run was cancelled
+        if self._cancelled.is_set():
+            return ToolResult(False, "Cancelled.\n")
+        with subprocess.Popen(
+            run_command_list,
+            cwd=self._project_folder,
+            env=env,
+            stdout=subprocess.PIPE if capture_output else None,
+            stderr=subprocess.STDOUT if capture_output else None,
+        ) as process:  # nosec
+            # Keep track of the running processes, so they can be cancelled
+            with self._processes_lock:
+                self._processes.add(process)
+                # Started while cancel() was stopping the others
+                if self._cancelled.is_set():
+                    process.terminate()
+            try:
+                stdout, _ = process.communicate()
+            finally:
+                with self._processes_lock:
+                    self._processes.discard(process)
+        output = stdout.decode("utf-8", errors="replace") if stdout else None
+        return ToolResult(process.returncode == 0 and not self._cancelled.is_set(), output, exit_code=process.returncode)
+
+
+    def cancel(self):
+        """Cancel the current run: stop the running tools, and don't start any more."""
+        self._cancelled.set()
+        with self._processes_lock:
+            for process in self._processes:
+                process.terminate()
+
+
+    def _get_tool_files(self, tool_name: str, tool_config: dict, changed_files: list = None) -> list:
+        """Get the files to substitute for the {files} placeholder in the tool command.
+
+        Returns None if the command has no placeholder. The files are the ones
+        matching the tool's 'files' globs (or its 'inputs' globs), limited to
+        the changed files if a list of changed files is given. Without globs,
+        there is no telling which of the changed files the tool can handle.
+        """
+        if FILES_PLACEHOLDER not in tool_config["command"].split(" "):
+            return None
+        file_globs = tool_config.get("files", tool_config.get("inputs"))
+        if not file_globs:
+            raise InvalidConfigValue(f"Tool '{tool_name}' uses {FILES_PLACEHOLDER} in its command, but declares no 'files' globs.")
+        matching_files = set()
+        for file_glob in file_globs:
+            matching_files.update(
+                file.relative_to(self._project_folder).as_posix()
+                for file in self._project_folder.glob(str(file_glob)) if file.is_file()
+            )
+        if changed_files is not None:
+            matching_files.intersection_update(changed_files)
+        return sorted(matching_files)
+
+
+    def _run_tool_on_files(self, run_tool, tool_config: dict, files: list, capture_output: bool, jobs: int) -> ToolResult:
+        """Run a tool on a list of files, split into chunks that fit on a command line.
+
+        The chunks are run in parallel, and the tool succeeds if it succeeds on all of them.
+        """
+        max_length = max_command_length() - len(tool_config["command"].encode("utf-8"))
+        chunks = split_into_chunks(files, max_length)
+        if len(chunks) == 1:
+            return run_tool(tool_config, capture_output, chunks[0])
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(lambda chunk: run_tool(tool_config, True, chunk), chunks))
+        exit_code = next((result.exit_code for result in results if result.exit_code), results[0].exit_code)
+        return ToolResult(all(results), "".join(result.output or "" for result in results), exit_code=exit_code)
+
+
+    def _get_shard_config(self, tool_config: dict) -> dict:
+        """Get the config of a tool for a run split into shards, which uses its 'shard_command' if it has one."""
+        if "shard_command" not in tool_config:
+            return tool_config
+        return {**tool_config, "command": tool_config["shard_command"]}
+
+
+    def _get_file_weights(self, files: list, file_durations: dict) -> dict:
+        """Estimate how long a tool takes on each of its files, to balance the shards.
+
+        Files without a recorded duration count as the average of the recorded ones,
+        and if none are recorded yet, the files are weighed by their size.
+        """
+        recorded_durations = [file_durations[file] for file in files if file in file_durations]
+        if not recorded_durations:
+            return {file: (self._project_folder / file).stat().st_size for file in files}
+        average_duration = sum(recorded_durations) / len(recorded_durations)
+        return {file: file_durations.get(file, average_duration) for file in files}
+
+
+    def _run_tool_in_workers(self, run_tool, tool_config: dict, files: list, weights: dict, capture_output: bool, workers: int, shard: tuple = None) -> tuple:
+        """Run a tool on its files split over a number of processes, balanced by the weights of the files.
+
+        Returns the merged result, and how long the tool took on each file (the time of its
+        process, shared out by weight). Tools which declare 'coverage' have every process
+        write its own coverage data file, and these are combined once all of them finished,
+        unless this is one shard of a run split over CI nodes: then the coverage data files
+        of all the shards are combined at the end, by CI.
+        """
+        worker_files = [shard_files for shard_files in split_into_shards(files, workers, weights) if shard_files]
+        if shard is None:
+            coverage_files = [f".coverage.switchblade-{index + 1}" for index in range(len(worker_files))]
+        elif len(worker_files) == 1:
+            coverage_files = [f".coverage.shard-{shard[0]}-of-{shard[1]}"]
+        else:
+            coverage_files = [f".coverage.shard-{shard[0]}-of-{shard[1]}-{index + 1}" for index in range(len(worker_files))]
+        worker_configs = [tool_config] * len(worker_files)
+        if tool_config.get("coverage", False):
+            for coverage_file in coverage_files:
+                (self._project_folder / coverage_file).unlink(missing_ok=True)
+            worker_configs = [
+                {**tool_config, "env": {**tool_config.get("env", {}), "COVERAGE_FILE": coverage_file}}
+                for coverage_file in coverage_files
+            ]
+
+        def run_worker(index: int) -> tuple:
+            start_time = time.monotonic()
+            result = self._run_tool_on_files(run_tool, worker_configs[index], worker_files[index], capture_output or len(worker_files) > 1, 1)
+            return result, time.monotonic() - start_time
+
+        with ThreadPoolExecutor(max_workers=len(worker_files)) as executor:
+            worker_results = list(executor.map(run_worker, range(len(worker_files))))
+        results = [result for result, _ in worker_results]
+        if tool_config.get("coverage", False) and shard is None and not self._cancelled.is_set():
+            results.append(self._combine_coverage(coverage_files))
+
+        file_durations = {}
+        for run_files, (_, duration) in zip(worker_files, worker_results):
+            total_weight = sum(weights[file] for file in run_files)
+            for file in run_files:
+                file_durations[file] = duration * weights[file] / total_weight if total_weight else duration / len(run_files)
+        exit_code = next((result.exit_code for result in results if result.exit_code), results[0].exit_code)
+        return ToolResult(all(results), "".join(result.output or "" for result in results), exit_code=exit_code), file_durations
+
+
+    def _combine_coverage(self, coverage_files: list) -> ToolResult:
+        """Combine the coverage data files of the worker processes into .coverage, and report the total coverage."""
+        coverage_files = [coverage_file for coverage_file in coverage_files if (self._project_folder / coverage_file).exists()]
+        if not coverage_files:
+            return ToolResult(True)
+        combine_result = self._run_tool_command(f"coverage combine {FILES_PLACEHOLDER}", True, coverage_files)
+        if not combine_result:
+            return combine_result
+        report_result = self._run_tool_command("coverage report", True)
+        return ToolResult(report_result.success, (combine_result.output or "") + (report_result.output or ""), exit_code=report_result.exit_code)
 
 
-    # TODO: Make this an override (must return False if the test fails)
-    def run_test(self, bundle: Bundle, test: dict):
-        test_command_list = test["command"].split(" ")
-        cmd_result = subprocess.run(
-            ["poetry", "run", *test_command_list], cwd=self._project_folder, check=False
+    def _select_affected_files(self, bundle: Bundle, tool_name: str, tool_config: dict, files: list, affected_files: list) -> list:
+        """Select the files of a tool which are affected by the changed files, using its test impact map.
+
+        Tools which don't declare 'impact' do a full run, as do tools whose map is stale.
+        """
+        if not tool_config.get("impact", False):
+            return files
+        if files is None:
+            raise InvalidConfigValue(f"Tool '{tool_name}' declares 'impact', but has no {FILES_PLACEHOLDER} placeholder in its command or shard_command.")
+        selected_files = self._impact_map.select(tool_name, bundle.version, files, affected_files, tool_config.get("inputs"))
+        if selected_files is None:
+            click.echo(f"⚔️ Switchblade has no up-to-date test impact map for {tool_name}, running all of its tests...")
+            return files
+        click.echo(f"⚔️ Switchblade selected {len(selected_files)} of {len(files)} file(s) of {tool_name} affected by the changes.")
+        return selected_files
+
+
+    def _get_coverage_file(self) -> Path:
+        return self._project_folder / os.environ.get("COVERAGE_FILE", ".coverage")
+
+
+    def _record_impact(self, bundle: Bundle, tool_name: str, coverage_mtime_before: int):
+        """Record the test impact map of a tool from the coverage data its full run wrote."""
+        coverage_file = self._get_coverage_file()
+        if not coverage_file.exists() or coverage_file.stat().st_mtime_ns == coverage_mtime_before:
+            click.echo(f"⚔️ Switchblade found no coverage data from {tool_name} to record its test impact map.")
+        elif not self._impact_map.record(tool_name, bundle.version, coverage_file):
+            click.echo(f"⚔️ Switchblade found no per-test coverage from {tool_name}, add --cov-context=test to record its test impact map.")
+
+
+    def _run_tools(self, bundle: Bundle, tools_config: dict, tool_names: list, run_tool, jobs: int = None, use_cache: bool = True, changed_files: list = None, fail_fast: bool = None, shard: tuple = None, workers: int = None, affected_files: list = None) -> bool:
+        """Run the given tools and return True if all of them succeeded.
+
+        The number of parallel jobs is taken from the jobs argument (--jobs), then
+        from the 'jobs' key of the merged [linters]/[tests] config, defaulting to 1.
+        Each tool may declare the tools it must run 'after', and whether it is
+        'exclusive' (i.e. it rewrites files, so nothing else may run alongside it).
+        Parallel tools are started longest first, going by how long their last
+        full runs took.
+
+        With fail_fast (--fail-fast, or the 'fail_fast' key of the config), the
+        remaining tools are cancelled as soon as one fails.
+
+        Tools with a {files} placeholder in their command (or 'shard_command') can be
+        split into shards: with shard (i, N) (--shard i/N), only the i-th of N shards
+        of their files is run, and the tools which can't be split only run in the
+        first shard. With workers (--workers, or the 'workers' key of the config),
+        the files are split over that many processes. Shards are balanced using how
+        long each file took in earlier --workers runs.
+
+        Tools which declare 'impact' record which files each of their test files
+        touches on a full run. If affected_files is given (--affected), they only
+        run the test files affected by those changed files (see ImpactMap).
+
+        Tools which declare their 'inputs' are skipped if a successful result for
+        the same bundle version, tool config and input files is found in the
+        result cache (unless use_cache is False).
+
+        Tools with a {files} placeholder in their command are run on the files
+        matching their 'files' globs. If changed_files is given, only the changed
+        files are passed to them, and they are skipped if none of their files
+        changed. Tools without the placeholder always do a full run.
+        """
+        if jobs is None:
+            jobs = tools_config.get("jobs", 1)
+        if fail_fast is None:
+            fail_fast = tools_config.get("fail_fast", False)
+        if workers is None:
+            workers = tools_config.get("workers", 1)
+        sharded = shard is not None or workers > 1
+
+        dependencies = {}
+        exclusive = set()
+        for tool_name in tool_names:
+            if tool_name not in tools_config:
+                raise InvalidConfigValue(f"Tool '{tool_name}' is not defined in the bundle.")
+            tool_config = tools_config[tool_name]
+            for dep in tool_config.get("after", []):
+                if dep not in tools_config:
+                    raise InvalidConfigValue(f"Tool '{tool_name}' is set to run after unknown tool '{dep}'.")
+            dependencies[tool_name] = tool_config.get("after", [])
+            if tool_config.get("exclusive", False):
+                exclusive.add(tool_name)
+
+        # Runs on part of the files use the 'shard_command' of the tools which have one
+        run_configs = {
+            tool_name: self._get_shard_config(tools_config[tool_name]) if sharded or affected_files is not None else tools_config[tool_name]
+            for tool_name in tool_names
+        }
+        tool_files = {
+            tool_name: self._get_tool_files(tool_name, run_configs[tool_name], changed_files)
+            for tool_name in tool_names
+        }
+        if affected_files is not None:
+            for tool_name in tool_names:
+                tool_files[tool_name] = self._select_affected_files(bundle, tool_name, run_configs[tool_name], tool_files[tool_name], affected_files)
+
+        # The lockfile pins the versions of the tools, so results are only reused with the same lockfile
+        env_digest = hashlib.sha256((self._poetry_lockfile_raw_before or "").encode("utf-8")).hexdigest()
+
+        # How long the tools took, if they did a full run, and how long they took on each file in sharded runs
+        durations = {}
+        file_durations = {}
+
+        def run_cached_tool(tool_name: str, capture_output: bool) -> ToolResult:
+            start_time = time.monotonic()
+            with timings.phase(f"run {tool_name}"):
+                result = run_tool_with_cache(tool_name, capture_output)
+            duration = time.monotonic() - start_time
+            cancelled = self._cancelled.is_set()
+            # A run split over shards or workers, or on the affected tests only, doesn't tell how long the whole tool takes
+            if not result.cached and not cancelled and changed_files is None and affected_files is None and not sharded:
+                durations[tool_name] = duration
+            self._cache.log(
+                "RAN",
+                tool=tool_name,
+                success=result.success,
+                exit_code=result.exit_code,
+                duration=round(duration, 6),
+                cached=result.cached,
+                cancelled=cancelled,
+            )
+            return result
+
+        def run_tool_with_cache(tool_name: str, capture_output: bool) -> ToolResult:
+            tool_config = run_configs[tool_name]
+            files = tool_files[tool_name]
+            if self._cancelled.is_set():
+                return ToolResult(False, "Cancelled.\n")
+            if files is not None and not files:
+                if affected_files is not None:
+                    return ToolResult(True, "No tests affected by the changes.\n")
+                return ToolResult(True, "No changed files to check.\n" if changed_files is not None else None)
+            if shard is not None and files is None and shard[0] != 1:
+                return ToolResult(True, f"{tool_name} can't be split into shards, so it only runs in shard 1/{shard[1]}.\n")
+
+            weights = None
+            if sharded and files is not None:
+                weights = self._get_file_weights(files, self._cache.get_file_durations(tool_name))
+                if shard is not None:
+                    files = split_into_shards(files, shard[1], weights)[shard[0] - 1]
+                    if not files:
+                        return ToolResult(True, f"No files of {tool_name} in shard {shard[0]}/{shard[1]}.\n")
+                    # The result of a shard is only valid for the files it ran on
+                    tool_config = {**tool_config, "shard_files": files}
+            if affected_files is not None and files is not None:
+                tool_config = {**tool_config, "affected_files": files}
+            # Only full runs record the test impact map
+            record_impact = tool_config.get("impact", False) and shard is None and affected_files is None and changed_files is None
+
+            cache_key = self._result_cache.get_key(bundle.version, tool_name, tool_config, env_digest) if use_cache else None
+            cached_result = self._result_cache.get(cache_key) if cache_key else None
+            if cached_result is not None:
+                result = ToolResult(True, cached_result["output"], cached=True)
+            else:
+                # Cacheable tools have their output captured so it can be replayed later
+                capture_tool_output = capture_output or cache_key is not None
+                coverage_file = self._get_coverage_file()
+                # To tell whether the run wrote new coverage data to record the test impact map from
+                coverage_mtime_before = coverage_file.stat().st_mtime_ns if record_impact and coverage_file.exists() else None
+                if files is None:
+                    result = run_tool(tool_config, capture_tool_output)
+                elif weights is not None:
+                    result, run_file_durations = self._run_tool_in_workers(run_tool, tool_config, files, weights, capture_tool_output, workers, shard)
+                    # Every shard must see the same timings to split the files the same way, so only
+                    # runs which aren't part of a --shard run record them
+                    if shard is None and changed_files is None and not self._cancelled.is_set():
+                        file_durations[tool_name] = run_file_durations
+                else:
+                    result = self._run_tool_on_files(run_tool, tool_config, files, capture_tool_output, jobs)
+                if record_impact and not self._cancelled.is_set():
+                    self._record_impact(bundle, tool_name, coverage_mtime_before)
+                # A run on the changed files only doesn't tell us whether all files pass
+                if cache_key and result and (files is None or changed_files is None) and not self._cancelled.is_set():
+                    self._result_cache.set(cache_key, tool_name, result.output)
+            if not capture_output and result.output:
+                click.echo(result.output, nl=not result.output.endswith("\n"))
+            return result
+
+        scheduler = ToolScheduler(jobs)
+        results = scheduler.run(
+            tool_names,
+            run_cached_tool,
+            dependencies,
+            exclusive,
+            durations=self._cache.get_tool_durations(),
+            fail_fast=fail_fast,
+            cancel=self.cancel,
         )
-        return cmd_result.returncode == 0
+        if durations:
+            self._cache.update_tool_durations(durations)
+        for tool_name, tool_file_durations in file_durations.items():
+            self._cache.update_file_durations(tool_name, tool_file_durations)
+        return all(results.values()) and len(results) == len(tool_names)
+
+
+    def lock_run(self) -> ExitStack:
+        """Lock the project for a run, until the returned locks are closed.
+
+        Any number of runs can use the cached bundles at the same time (see _using_bundles),
+        but the setup and teardown of the project (pyproject.toml, poetry.lock and the pushed
+        config files) is not shared, so runs in the same project take turns.
+        """
+        locks = ExitStack()
+        locks.enter_context(self._cache.lock(
+            PROJECT_LOCK,
+            on_wait=lambda: print("⚔️ Switchblade waiting for another run in this project to finish..."),
+        ))
+        return locks
 
 
     # TODO: Make this an override
+    @timings.phase("restore pyproject.toml")
     def post_cleanup(self, bundle: Bundle, pushed_files: list):
-        # Restore the original pyproject.toml
-        if self._pyproject_file_raw_before:
+        # Restore the original pyproject.toml and poetry.lock, if they were changed
+        if self._pyproject_file_raw_before and self._has_changed(self._pyproject_file, self._pyproject_file_raw_before):
             with open(self._pyproject_file, "w") as pyproject_toml:
                 pyproject_toml.write(self._pyproject_file_raw_before)
-        # Restore the original poetry.lock
-        if self._poetry_lockfile_raw_before:
+        if self._poetry_lockfile_raw_before and self._has_changed(self._poetry_lockfile, self._poetry_lockfile_raw_before):
             with open(self._poetry_lockfile, "w") as poetry_lock:
                 poetry_lock.write(self._poetry_lockfile_raw_before)
 
 
+    def _has_changed(self, file: Path, raw_before: str) -> bool:
+        return not file.exists() or file.read_text(encoding="utf-8") != raw_before
+
+
     # TODO: Place this in a superclass
-    def lint(self, linter_tool: str):
+    @_using_bundles
+    def lint(self, linter_tool: str, jobs: int = None, use_cache: bool = True, changed_files: list = None, fail_fast: bool = None):
         # Instantiating a Bundle object will fetch the latest bundle from the source or cache
         latest_bundle = Bundle(self._config)
 
-        bundle_config = latest_bundle.bundle_config
-        bundle_mode = bundle_config["bundle"]["mode"]
+        resolved_bundle = latest_bundle.resolve()
+        bundle_mode = resolved_bundle.mode
 
         if bundle_mode != self.mode:
             click.echo(
@@ -142,69 +823,72 @@ class PythonPoetry:
             )
             raise click.Abort()
 
-        self._cache.log(f"LINTING {latest_bundle.version}")
+        self._cache.log("LINTING", version=latest_bundle.version)
 
         # Show error message if the bundle does not contain any linters
-        if "linters" not in bundle_config:
-            self._cache.log(f"LINTING {latest_bundle.version} ABORTED_NO_LINTERS_IN_BUNDLE")
+        if resolved_bundle.linters is None:
+            self._cache.log("LINTING", version=latest_bundle.version, status="ABORTED_NO_LINTERS_IN_BUNDLE")
             click.secho(
                 "⚔️ The Switchblade bundle does not contain any linters.",
                 err=True, fg="red"
             )
             raise click.Abort()
 
+        run_locks = self.lock_run()
         pushed_files = []
         success = False
         try:
+            # The linters with local overrides from .switchblade applied
+            merged_linters_config = resolved_bundle.linters
+
+            linter_names = merged_linters_config["all"] if linter_tool in ["all", None] else [linter_tool]
+
             print("⚔️ Switchblade installing dev tools...")
-            self.install_dev_tools(latest_bundle)
+            self.install_dev_tools(latest_bundle, self.get_tool_dependencies(latest_bundle, merged_linters_config, linter_names))
 
             print("⚔️ Switchblade copying configuration...")
             pushed_files = self.copy_config_files(latest_bundle)
 
-            # Apply local overrides from .switchblade (merging the linter dicts) if any
-            switchblade_linters_config = self._config["linters"] if "linters" in self._config else {}
-            merged_linters_config = merge({}, bundle_config["linters"], switchblade_linters_config)
-
-            success = True
-            linter_names = merged_linters_config["all"] if linter_tool in ["all", None] else [linter_tool]
-            for linter_name in linter_names:
-                print(f"⚔️ Switchblade running {linter_name}...", end=" ")
-                linter_success = self.run_linter(latest_bundle, merged_linters_config[linter_name])
-                print("✅" if linter_success else "❌")
-                success = success and linter_success
-                self._cache.log(f"RAN {linter_name}")
+            success = self._run_tools(
+                latest_bundle,
+                merged_linters_config,
+                linter_names,
+                lambda linter, capture_output, files=None: self.run_linter(latest_bundle, linter, capture_output, files),
+                jobs,
+                use_cache,
+                changed_files,
+                fail_fast,
+            )
 
         except Exception as exc:
-            self._cache.log(f"LINTING {latest_bundle.version} FAILED_WITH_EXCEPTION")
+            self._cache.log("LINTING", version=latest_bundle.version, status="FAILED_WITH_EXCEPTION")
             raise click.ClickException(f"Exception detected while running linters, aborting... {exc}")
 
         finally:
             print("⚔️ Switchblade cleaning up...")
-            # Remove the files from the project folder that were added in Step 3
-            for file in pushed_files:
-                (self._project_folder / file).unlink()
-                self._cache.log(f"POPPED {file}")
+            self.remove_config_files(pushed_files)
 
             self.post_cleanup(latest_bundle, pushed_files)
+            run_locks.close()
 
         if success:
-            self._cache.log(f"LINTING {latest_bundle.version} FINISHED_SUCCESSFULLY")
+            self._cache.log("LINTING", version=latest_bundle.version, status="FINISHED_SUCCESSFULLY")
             click.echo("⚔️ Linting finished successfully. 😎")
         else:
-            self._cache.log(f"LINTING {latest_bundle.version} FINISHED_WITH_ERRORS")
+            self._cache.log("LINTING", version=latest_bundle.version, status="FINISHED_WITH_ERRORS")
             click.secho("⚔️ Linting finished with errors. 😭", err=True, fg="red", bold=True)
 
         return success
 
 
     # TODO: Place this in a superclass
-    def test(self, test_tool: str):
+    @_using_bundles
+    def test(self, test_tool: str, jobs: int = None, use_cache: bool = True, changed_files: list = None, fail_fast: bool = None, shard: tuple = None, workers: int = None, affected_files: list = None):
         # Instantiating a Bundle object will fetch the latest bundle from the source or cache
         latest_bundle = Bundle(self._config)
 
-        bundle_config = latest_bundle.bundle_config
-        bundle_mode = bundle_config["bundle"]["mode"]
+        resolved_bundle = latest_bundle.resolve()
+        bundle_mode = resolved_bundle.mode
 
         if bundle_mode != self.mode:
             click.echo(
@@ -213,58 +897,196 @@ class PythonPoetry:
             )
             raise click.Abort()
 
-        self._cache.log(f"TESTING {latest_bundle.version}")
+        self._cache.log("TESTING", version=latest_bundle.version)
 
         # Show error message if the bundle does not contain any linters
-        if "tests" not in bundle_config:
-            self._cache.log(f"TESTING {latest_bundle.version} ABORTED_NO_TESTS_IN_BUNDLE")
+        if resolved_bundle.tests is None:
+            self._cache.log("TESTING", version=latest_bundle.version, status="ABORTED_NO_TESTS_IN_BUNDLE")
             click.secho(
                 "⚔️ The Switchblade bundle does not contain any tests.",
                 err=True, fg="red"
             )
             raise click.Abort()
 
+        run_locks = self.lock_run()
         pushed_files = []
         success = False
         try:
+            # The tests with local overrides from .switchblade applied
+            merged_tests_config = resolved_bundle.tests
+
+            test_tool_names = merged_tests_config["all"] if test_tool in ["all", None] else [test_tool]
+
             print("⚔️ Switchblade installing dev tools...")
-            self.install_dev_tools(latest_bundle)
+            self.install_dev_tools(latest_bundle, self.get_tool_dependencies(latest_bundle, merged_tests_config, test_tool_names))
 
             print("⚔️ Switchblade copying configuration...")
             pushed_files = self.copy_config_files(latest_bundle)
 
-            # Apply local overrides from .switchblade (merging the tests dicts) if any
-            bundle_tests_config = bundle_config["tests"]
-            switchblade_tests_config = self._config["tests"] if "tests" in self._config else {}
-            merged_tests_config = merge({}, bundle_tests_config, switchblade_tests_config)
-
-            success = True
-            test_tool_names = merged_tests_config["all"] if test_tool in ["all", None] else [test_tool]
-            for test_tool_name in test_tool_names:
-                print(f"⚔️ Switchblade running {test_tool_name}...", end = " ")
-                test_success = self.run_test(latest_bundle, merged_tests_config[test_tool_name])
-                print("✅" if test_success else "❌")
-                success = success and test_success
-                self._cache.log(f"RAN {test_tool_name}")
+            success = self._run_tools(
+                latest_bundle,
+                merged_tests_config,
+                test_tool_names,
+                lambda test, capture_output, files=None: self.run_test(latest_bundle, test, capture_output, files),
+                jobs,
+                use_cache,
+                changed_files,
+                fail_fast,
+                shard,
+                workers,
+                affected_files,
+            )
 
         except Exception as exc:
-            self._cache.log(f"TESTING {latest_bundle.version} FAILED_WITH_EXCEPTION")
+            self._cache.log("TESTING", version=latest_bundle.version, status="FAILED_WITH_EXCEPTION")
             raise click.ClickException(f"Exception detected while running tests, aborting... {exc}")
 
         finally:
             print("⚔️ Switchblade cleaning up...")
-            # Remove the files from the project folder that were added in Step 3
-            for file in pushed_files:
-                (self._project_folder / file).unlink()
-                self._cache.log(f"POPPED {file}")
+            self.remove_config_files(pushed_files)
 
             self.post_cleanup(latest_bundle, pushed_files)
+            run_locks.close()
 
         if success:
-            self._cache.log(f"TESTING {latest_bundle.version} FINISHED_SUCCESSFULLY")
+            self._cache.log("TESTING", version=latest_bundle.version, status="FINISHED_SUCCESSFULLY")
             click.echo("⚔️ Tests finished successfully. 😎")
         else:
-            self._cache.log(f"TESTING {latest_bundle.version} FINISHED_WITH_ERRORS")
+            self._cache.log("TESTING", version=latest_bundle.version, status="FINISHED_WITH_ERRORS")
             click.secho("⚔️ Tests finished with errors. 😭", err=True, fg="red", bold=True)
 
         return success
+
+
+    def get_affected_tools(self, tools_config: dict, tool_names: list, changed_files: set) -> list:
+        """Get the tools which need to run again after the given files changed.
+
+        Tools are affected if any of the changed files match their 'inputs' or 'files'
+        globs. Tools which declare neither are affected by any change.
+        """
+        affected_tools = []
+        for tool_name in tool_names:
+            file_globs = [str(file_glob) for file_glob in [*tools_config[tool_name].get("inputs", []), *tools_config[tool_name].get("files", [])]]
+            if not file_globs or any(matches_globs(file, file_globs) for file in changed_files):
+                affected_tools.append(tool_name)
+        return affected_tools
+
+
+    # TODO: Place this in a superclass
+    @_using_bundles
+    def watch(self, section: str, tool: str, jobs: int = None, use_cache: bool = True):
+        """Run the linters or tests (section), then re-run the affected ones whenever files change.
+
+        The bundle is only set up once, and torn down when the watch is stopped with Ctrl+C.
+        A run which is still going when more files change is cancelled, since its results
+        would be stale, and the affected tools are run again with all the changes.
+        """
+        latest_bundle = Bundle(self._config)
+
+        resolved_bundle = latest_bundle.resolve()
+        bundle_mode = resolved_bundle.mode
+        # What is finished when a run is done, i.e. "Linting" or "Tests"
+        kind = "Linting" if section == "linters" else "Tests"
+
+        if bundle_mode != self.mode:
+            click.echo(
+                f"⚔️ The Switchblade bundle is for a project of mode {bundle_mode}, but this project is of mode {self.mode}.",
+                err=True
+            )
+            raise click.Abort()
+
+        # The linters or tests with local overrides from .switchblade applied
+        merged_tools_config = resolved_bundle.linters if section == "linters" else resolved_bundle.tests
+        if merged_tools_config is None:
+            click.secho(f"⚔️ The Switchblade bundle does not contain any {section}.", err=True, fg="red")
+            raise click.Abort()
+
+        self._cache.log("WATCHING", section=section, version=latest_bundle.version)
+
+        tool_names = merged_tools_config["all"] if tool in ["all", None] else [tool]
+        run_tool_command = self.run_linter if section == "linters" else self.run_test
+
+        def run_tools(run_tool_names: list, changed_files: list) -> bool:
+            self._cancelled.clear()
+            return self._run_tools(
+                latest_bundle,
+                merged_tools_config,
+                run_tool_names,
+                lambda tool_config, capture_output, files=None: run_tool_command(latest_bundle, tool_config, capture_output, files),
+                jobs,
+                use_cache,
+                changed_files,
+            )
+
+        run_locks = self.lock_run()
+        pushed_files = []
+        try:
+            print("⚔️ Switchblade installing dev tools...")
+            self.install_dev_tools(latest_bundle, self.get_tool_dependencies(latest_bundle, merged_tools_config, tool_names))
+
+            print("⚔️ Switchblade copying configuration...")
+            pushed_files = self.copy_config_files(latest_bundle)
+
+            watcher = Watcher(self._project_folder)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # The first run is a full run of all the tools
+                run_changed_files = None
+                run = executor.submit(run_tools, tool_names, run_changed_files)
+                try:
+                    while True:
+                        # While a run is going, check on it regularly so it is reported when done
+                        changed_files = watcher.wait_for_changes(timeout=POLL_INTERVAL if run is not None else None)
+                        if run is not None and run.done():
+                            self._report_watch_run(kind, run.result())
+                            run = None
+                        if not changed_files:
+                            continue
+
+                        if run is not None:
+                            # The current run is stale, so cancel it and include its changes in the next run
+                            click.echo("⚔️ Switchblade detected more changes, cancelling the current run...")
+                            self.cancel()
+                            run.result()
+                            run = None
+                            if run_changed_files is None:
+                                changed_files = None
+                            else:
+                                changed_files.update(run_changed_files)
+
+                        if changed_files is None:
+                            rerun_tool_names = tool_names
+                        else:
+                            rerun_tool_names = self.get_affected_tools(merged_tools_config, tool_names, changed_files)
+                            if not rerun_tool_names:
+                                continue
+                            click.echo(f"⚔️ Switchblade detected changes in {len(changed_files)} file(s), running {', '.join(rerun_tool_names)}...")
+                        run_changed_files = sorted(changed_files) if changed_files is not None else None
+                        run = executor.submit(run_tools, rerun_tool_names, run_changed_files)
+                finally:
+                    self.cancel()
+
+        except KeyboardInterrupt:
+            pass
+
+        except Exception as exc:
+            self._cache.log("WATCHING", section=section, version=latest_bundle.version, status="FAILED_WITH_EXCEPTION")
+            raise click.ClickException(f"Exception detected while watching {section}, aborting... {exc}")
+
+        finally:
+            print("⚔️ Switchblade cleaning up...")
+            self.remove_config_files(pushed_files)
+
+            self.post_cleanup(latest_bundle, pushed_files)
+            run_locks.close()
+
+        self._cache.log("WATCHING", section=section, version=latest_bundle.version, status="STOPPED")
+
+
+    def _report_watch_run(self, kind: str, success: bool):
+        if success:
+            click.echo(f"⚔️ {kind} finished successfully. 😎")
+        else:
+            click.secho(f"⚔️ {kind} finished with errors. 😭", err=True, fg="red", bold=True)
+        # A watch can go on for hours, so write the events of every run
+        self._cache.flush_log()
+        click.echo("⚔️ Switchblade watching for changes (press Ctrl+C to stop)...")
@@ -0,0 +1,166 @@
+import click
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from switchbladecli.exceptions import InvalidConfigValue
+
+
+class ToolResult:
+    """The outcome of running a single dev tool.
+
+    Evaluates as truthy if the tool succeeded, so runners can keep returning
+    it where a boolean pass/fail is expected.
+    """
+
+    def __init__(self, success: bool, output: str = None, cached: bool = False, exit_code: int = None):
+        self.success = success
+        self.output = output
+        self.cached = cached
+        # The exit code of the tool process, if it ran
+        self.exit_code = exit_code
+
+    def __bool__(self):
+        return self.success
+
+
+class ToolScheduler:
+    """Runs a set of named dev tools, optionally on a bounded pool of worker threads.
+
+    The tools form a DAG: a tool may declare that it must run after other tools
+    (e.g. linters reading files that a formatter rewrites), and a tool may be
+    exclusive, meaning nothing else runs while it does. Within those
+    constraints, tools are started in the order they are listed, or if their
+    durations from earlier runs are known, longest first: a tool's priority is
+    its own duration plus the longest chain of tools which have to run after it
+    (i.e. longest processing time first, along the critical path), so the slow
+    tools don't end up running on their own at the end.
+
+    The tools themselves run as subprocesses, so threads are enough to keep
+    several of them busy at the same time.
+    """
+
+    def __init__(self, jobs: int = 1):
+        self.jobs = max(1, jobs or 1)
+
+
+    def run(self, tool_names: list, run_tool, dependencies: dict = None, exclusive: set = None, durations: dict = None, fail_fast: bool = False, cancel=None) -> dict:
+        """Run the tools and return a dict of tool name -> ToolResult.
+
+        run_tool is called as run_tool(tool_name, capture_output) and must return
+        a ToolResult. dependencies maps a tool name to the tools it must run after;
+        dependencies on tools that are not being run are ignored. exclusive is the
+        set of tools that must run on their own. durations maps tool names to how
+        long they took before, in seconds.
+
+        With fail_fast, no more tools are started once one has failed, and cancel
+        is called to stop the ones still running. The tools which weren't run are
+        left out of the results.
+
+        With a single job, tools run in dependency order and their output goes
+        straight to the terminal. With more jobs, the output of each tool is
+        buffered and printed in one piece once the tool has finished, so the
+        logs of tools running side by side don't interleave.
+        """
+        dependencies = {
+            tool_name: {dep for dep in (dependencies or {}).get(tool_name, []) if dep in tool_names}
+            for tool_name in tool_names
+        }
+        exclusive = exclusive or set()
+        ordered_tool_names = self._topological_order(tool_names, dependencies)
+
+        results = {}
+        if self.jobs == 1 or len(tool_names) <= 1:
+            for tool_name in ordered_tool_names:
+                print(f"⚔️ Switchblade running {tool_name}...", end=" ")
+                results[tool_name] = run_tool(tool_name, False)
+                print(self._status(results[tool_name]))
+                if fail_fast and not results[tool_name]:
+                    self._report_fail_fast(tool_name, [name for name in ordered_tool_names if name not in results])
+                    break
+            return results
+
+        priorities = self._priorities(ordered_tool_names, dependencies, durations or {})
+        pending = sorted(ordered_tool_names, key=lambda tool_name: -priorities[tool_name])
+        print(f"⚔️ Switchblade running {', '.join(pending)} with {self.jobs} parallel jobs...")
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while pending or running:
+                for tool_name in self._ready_tools(pending, running, results, dependencies, exclusive):
+                    pending.remove(tool_name)
+                    running[executor.submit(run_tool, tool_name, True)] = tool_name
+
+                # Results are reported from the main thread as they come in
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tool_name = running.pop(future)
+                    results[tool_name] = future.result()
+                    self._report(tool_name, results[tool_name])
+                    if fail_fast and not results[tool_name] and (pending or running):
+                        self._report_fail_fast(tool_name, [*running.values(), *pending])
+                        pending = []
+                        if cancel is not None:
+                            cancel()
+        return results
+
+
+    def _priorities(self, ordered_tool_names: list, dependencies: dict, durations: dict) -> dict:
+        """Get the priority of each tool: its duration plus the longest chain of tools which run after it.
+
+        Tools which haven't run before are assumed to take the average time of the others.
+        """
+        known_durations = [durations[tool_name] for tool_name in ordered_tool_names if tool_name in durations]
+        default_duration = sum(known_durations) / len(known_durations) if known_durations else 0
+        priorities = {}
+        # Tools come after their dependencies in the topological order, so walk it backwards
+        for tool_name in reversed(ordered_tool_names):
+            dependents = [name for name in ordered_tool_names if tool_name in dependencies[name]]
+            priorities[tool_name] = durations.get(tool_name, default_duration) + max((priorities[name] for name in dependents), default=0)
+        return priorities
+
+
+    def _ready_tools(self, pending: list, running: dict, results: dict, dependencies: dict, exclusive: set) -> list:
+        """Pick the pending tools that can be started right now."""
+        if any(tool_name in exclusive for tool_name in running.values()):
+            return []
+        ready = []
+        for tool_name in pending:
+            if len(running) + len(ready) >= self.jobs:
+                break
+            if not all(dep in results for dep in dependencies[tool_name]):
+                continue
+            if tool_name in exclusive:
+                # An exclusive tool waits for everything else to finish, and
+                # holds back the tools after it so it doesn't get starved
+                if not running and not ready:
+                    ready.append(tool_name)
+                break
+            ready.append(tool_name)
+        return ready
+
+
+    def _topological_order(self, tool_names: list, dependencies: dict) -> list:
+        """Order the tools so each one comes after its dependencies, keeping the listed order otherwise."""
+        ordered = []
+        remaining = list(tool_names)
+        while remaining:
+            tool_name = next((name for name in remaining if dependencies[name].issubset(ordered)), None)
+            if tool_name is None:
+                raise InvalidConfigValue(f"Circular 'after' dependencies between tools: {', '.join(remaining)}")
+            ordered.append(tool_name)
+            remaining.remove(tool_name)
+        return ordered
+
+
+    def _report_fail_fast(self, tool_name: str, skipped_tool_names: list):
+        click.secho(f"⚔️ Switchblade stopping after {tool_name} failed (--fail-fast), cancelling {', '.join(skipped_tool_names)}.", err=True, fg="red")
+
+
+    def _report(self, tool_name: str, result: ToolResult):
+        print(f"⚔️ Switchblade ran {tool_name}", self._status(result))
+        if result.output:
+            click.echo(result.output, nl=not result.output.endswith("\n"))
+
+
+    def _status(self, result: ToolResult) -> str:
+        status = "✅" if result else "❌"
+        return f"{status} (cached)" if result.cached else status
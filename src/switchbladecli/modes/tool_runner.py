@@ -1,11 +1,15 @@
+import importlib
+
 from switchbladecli.exceptions import InvalidConfigValue
-from switchbladecli.modes.python_poetry import PythonPoetry
+
+# The tool runner class for each mode, imported when it is used
+MODE_MAP = {
+    "python-poetry": "switchbladecli.modes.python_poetry:PythonPoetry",
+}
 
 def get_tool_runner(config):
-    mode_map = {
-        "python-poetry": PythonPoetry
-    }
-    if config["switchblade"]["mode"] not in mode_map:
+    if config["switchblade"]["mode"] not in MODE_MAP:
         raise InvalidConfigValue(f'Invalid project mode {config["switchblade"]["mode"]} specified.')
 
-    return mode_map[config["switchblade"]["mode"]]
+    module_name, class_name = MODE_MAP[config["switchblade"]["mode"]].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
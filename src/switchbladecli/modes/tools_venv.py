@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess  # nosec
+import sys
+import venv
+
+from pathlib import Path
+from tomlkit import dumps
+
+import click
+
+from switchbladecli.locking import FileLock
+
+TOOLS_VENVS_FOLDERNAME = "tools"
+VENV_FOLDERNAME = ".venv"
+INSTALLED_MARKER_FILENAME = ".installed"
+
+
+class ToolsVenv:
+    """A virtualenv with the dev tools of a bundle, shared by all projects on the machine.
+
+    The virtualenv is keyed by a hash of the tool dependencies and the Python
+    version, so it is only installed once per machine for each distinct set of
+    tools, and it never touches the project's own virtualenv. The dependencies
+    are resolved and installed by Poetry from a minimal pyproject.toml in the
+    virtualenv folder.
+    """
+
+    def __init__(self, dependencies: dict, tools_folder: Path):
+        self._dependencies = dict(sorted(dependencies.items()))
+        self._python_version = f"{sys.version_info.major}.{sys.version_info.minor}"
+        self.key = self._get_key()
+        self.folder = tools_folder / TOOLS_VENVS_FOLDERNAME / self.key
+
+
+    def _get_key(self) -> str:
+        dependencies_json = json.dumps(self._dependencies, sort_keys=True, default=str)
+        return hashlib.sha256(f"{self._python_version}\0{dependencies_json}".encode("utf-8")).hexdigest()[:16]
+
+
+    @property
+    def bin_folder(self) -> Path:
+        """The folder with the tool executables."""
+        return self.folder / VENV_FOLDERNAME / ("Scripts" if os.name == "nt" else "bin")
+
+
+    def is_installed(self) -> bool:
+        return (self.folder / INSTALLED_MARKER_FILENAME).exists()
+
+
+    def install(self):
+        """Create the virtualenv and install the tools into it, unless that was already done."""
+        if self.is_installed():
+            return
+
+        # Projects installing the same tools at the same time wait for the first one to finish
+        self.folder.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.folder.with_name(f"{self.key}.lock")):
+            if not self.is_installed():
+                self._install()
+
+
+    def _install(self):
+        # Start over if a previous install didn't finish
+        if self.folder.exists():
+            shutil.rmtree(self.folder)
+        self.folder.mkdir(parents=True)
+
+        with open(self.folder / "pyproject.toml", "w") as pyproject_toml:
+            pyproject_toml.write(
+                dumps(
+                    {
+                        "tool": {
+                            "poetry": {
+                                "name": "switchblade-tools",
+                                "version": "0.0.0",
+                                "description": "Dev tools installed by Switchblade",
+                                "authors": [],
+                                "dependencies": {"python": f"~{self._python_version}", **self._dependencies},
+                            }
+                        }
+                    }
+                )
+            )
+
+        # Poetry uses the .venv folder next to the pyproject.toml if it exists
+        venv.create(self.folder / VENV_FOLDERNAME, with_pip=False, symlinks=os.name != "nt")
+        install_result = subprocess.run(
+            ["poetry", "install", "--no-root"],
+            cwd=self.folder,
+            # Don't let an active virtualenv (e.g. the project's) take the place of our own
+            env={**{key: value for key, value in os.environ.items() if key != "VIRTUAL_ENV"}, "POETRY_VIRTUALENVS_IN_PROJECT": "true"},
+            check=False,
+        )  # nosec
+        if install_result.returncode != 0:
+            raise click.ClickException(f"Installing the dev tools into {self.folder} failed.")
+
+        (self.folder / INSTALLED_MARKER_FILENAME).touch()
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class Timings:
+    """Monotonic timings of the phases of a command, e.g. fetching the bundle or running a tool.
+
+    Phases started inside another phase (in the same thread) are recorded as part of it,
+    so the breakdown shows e.g. the update check as part of fetching the bundle. Tools run
+    in parallel are recorded from their own threads, as top-level phases.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+
+    def reset(self):
+        """Start timing a new command."""
+        with self._lock:
+            self._start_time = time.monotonic()
+            self._started_on = datetime.now(tz=timezone.utc)
+            self._phases = []
+
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a phase of the command."""
+        parents = getattr(self._local, "parents", [])
+        self._local.parents = [*parents, name]
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start_time
+            self._local.parents = parents
+            with self._lock:
+                self._phases.append({
+                    "phase": name,
+                    "parent": parents[-1] if parents else None,
+                    "depth": len(parents),
+                    "start": start_time - self._start_time,
+                    "duration": duration,
+                })
+
+
+    def get_phases(self) -> list:
+        """Get the finished phases, in the order they were started."""
+        with self._lock:
+            return sorted(self._phases, key=lambda phase: phase["start"])
+
+
+    def get_total(self) -> float:
+        return time.monotonic() - self._start_time
+
+
+    def format_breakdown(self) -> str:
+        phases = self.get_phases()
+        total = self.get_total()
+        name_width = max([len("total"), *[len(phase["phase"]) + 2 * phase["depth"] for phase in phases]])
+        lines = ["⚔️ Switchblade timings:"]
+        for phase in phases:
+            name = "  " * phase["depth"] + phase["phase"]
+            lines.append(f"  {name:<{name_width}}  {phase['duration']:8.3f}s  {100 * phase['duration'] / total:5.1f}%")
+        lines.append(f"  {'total':<{name_width}}  {total:8.3f}s")
+        return "\n".join(lines)
+
+
+    def get_event_fields(self, command: str) -> dict:
+        """The fields of the TIMINGS event of the command in the event log (durations in seconds)."""
+        return {
+            "command": command,
+            "started_on": self._started_on.strftime("%Y-%m-%d %H:%M:%S"),
+            "total": round(self.get_total(), 6),
+            "phases": [
+                {**phase, "start": round(phase["start"], 6), "duration": round(phase["duration"], 6)}
+                for phase in self.get_phases()
+            ],
+        }
+
+
+# The timings of the current command
+timings = Timings()
@@ -0,0 +1,55 @@
+import copy
+import os
+import tempfile
+import threading
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
+
+# Parsed TOML files by path, with the stat signature of the file when it was parsed
+_parsed_files = {}
+_parsed_files_lock = threading.Lock()
+
+
+def stat_signature(stat: os.stat_result) -> tuple:
+    """Get what tells whether a file changed since it was last stat'ed (the mtime alone may not change)."""
+    return (stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size, stat.st_ino)
+
+
+def read_toml(path) -> dict:
+    """Read a TOML file which is only read, not edited, e.g. a config or cache file.
+
+    This uses the (much faster) stdlib parser rather than tomlkit, and each file is only
+    parsed once per process as long as it doesn't change. The result is a copy, so the
+    caller is free to modify it.
+    """
+    path = os.path.abspath(path)
+    with open(path, "rb") as toml_file:
+        signature = stat_signature(os.fstat(toml_file.fileno()))
+        with _parsed_files_lock:
+            parsed_file = _parsed_files.get(path)
+        if parsed_file is None or parsed_file[0] != signature:
+            parsed_file = (signature, tomllib.load(toml_file))
+            with _parsed_files_lock:
+                _parsed_files[path] = parsed_file
+    return copy.deepcopy(parsed_file[1])
+
+
+def write_toml(path, document: dict):
+    """Write a TOML file, making sure the next read_toml of it doesn't return an outdated result.
+
+    (The modification time of a file may not change when it is written twice in quick succession.)
+    The file is replaced atomically, so other processes never read it half-written.
+    """
+    # tomlkit is only needed to write files, so a command which only reads them doesn't import it
+    from tomlkit import dumps  # pylint: disable=import-outside-toplevel
+    path = os.path.abspath(path)
+    with _parsed_files_lock:
+        _parsed_files.pop(path, None)
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), delete=False, encoding="utf-8") as temp_file:
+        temp_file.write(dumps(document))
+    os.replace(temp_file.name, path)
+    with _parsed_files_lock:
+        _parsed_files.pop(path, None)
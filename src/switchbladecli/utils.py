@@ -1,11 +1,17 @@
 import hashlib
 import os
+import re
+import shutil
 
 
+CONFIG_FILE_NAMES = [".switchblade", "switchblade.toml"]
+READ_BLOCK_SIZE = 2**20  # one-megabyte blocks
+FINGERPRINT_PREFIX = "b2-"  # versions of the BLAKE2 based fingerprint scheme, as opposed to SHA-1 from hash_dir
+
 def sha1OfFile(filepath, use_sha):
     with open(filepath, 'rb') as f:
         while True:
-            block = f.read(2**10) # Magic number: one-megabyte blocks.
+            block = f.read(READ_BLOCK_SIZE)
             if not block: break
             use_sha.update(block)
         return use_sha.hexdigest()
@@ -19,3 +25,140 @@ def hash_dir(dir_path, existing_sha=None):
             hash_dir(os.path.join(path, dir), sha)
         break # we only need one iteration - to get files and dirs in current directory
     return sha.hexdigest()
+
+def blake2_of_file(filepath):
+    with open(filepath, 'rb') as f:
+        if hasattr(hashlib, "file_digest"):
+            # Python 3.11+ hashes straight from the file buffer
+            return hashlib.file_digest(f, hashlib.blake2b).hexdigest()
+        blake2 = hashlib.blake2b()
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+            blake2.update(block)
+        return blake2.hexdigest()
+
+def fingerprint_dir(dir_path, index=None):
+    """Fingerprint the contents of a folder, re-hashing only the files that changed.
+
+    index maps the relative path of each file to its size, mtime_ns, inode and digest,
+    as returned by a previous call. Files whose stat data still match the index are
+    not read again. Returns the fingerprint (prefixed with FINGERPRINT_PREFIX to
+    tell it apart from hash_dir versions) and the updated index.
+    """
+    index = index or {}
+    new_index = {}
+    for path, dirs, files in os.walk(dir_path):
+        dirs.sort()
+        for file in files:
+            file_path = os.path.join(path, file)
+            relative_path = os.path.relpath(file_path, dir_path).replace(os.sep, "/")
+            stat = os.stat(file_path)
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+            previous_entry = index.get(relative_path)
+            if previous_entry is not None and all(previous_entry.get(key) == value for key, value in entry.items()):
+                entry["digest"] = previous_entry["digest"]
+            else:
+                entry["digest"] = blake2_of_file(file_path)
+            new_index[relative_path] = entry
+
+    fingerprint = hashlib.blake2b(digest_size=20)
+    for relative_path in sorted(new_index):
+        fingerprint.update(relative_path.encode("utf-8") + b"\0" + new_index[relative_path]["digest"].encode("ascii") + b"\0")
+    return FINGERPRINT_PREFIX + fingerprint.hexdigest(), new_index
+
+def max_command_length():
+    """Get a safe upper bound (in bytes) for the arguments of a single command.
+
+    This is half of what the OS allows for argv and the environment combined,
+    after taking the current environment into account.
+    """
+    try:
+        arg_max = os.sysconf("SC_ARG_MAX")
+    except (AttributeError, ValueError, OSError):
+        arg_max = 32767  # Windows limits the whole command line to 32767 characters
+    env_size = sum(len(key) + len(value) + 2 for key, value in os.environ.items())
+    return max(4096, (arg_max - env_size) // 2)
+
+def split_into_chunks(args, max_length):
+    """Split a list of arguments into chunks whose total length stays under max_length bytes."""
+    chunks = []
+    chunk = []
+    chunk_length = 0
+    for arg in args:
+        arg_length = len(arg.encode("utf-8")) + 1
+        if chunk and chunk_length + arg_length > max_length:
+            chunks.append(chunk)
+            chunk = []
+            chunk_length = 0
+        chunk.append(arg)
+        chunk_length += arg_length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def split_into_shards(items, count, weights):
+    """Split items into count shards of about equal total weight (e.g. test files by how long they take).
+
+    The heaviest items are placed first, each into the lightest shard so far, with ties
+    broken by name and shard number, so the same items and weights always give the same shards.
+    """
+    shards = [[] for _ in range(count)]
+    shard_weights = [0] * count
+    for item in sorted(items, key=lambda item: (-weights.get(item, 0), item)):
+        index = min(range(count), key=lambda index: (shard_weights[index], len(shards[index]), index))
+        shards[index].append(item)
+        shard_weights[index] += weights.get(item, 0)
+    return [sorted(shard) for shard in shards]
+
+def parse_shard(value):
+    """Parse a shard like "2/4" (the second of four shards) into (2, 4)."""
+    index, _, count = str(value).partition("/")
+    if not index.isdigit() or not count.isdigit() or not 1 <= int(index) <= int(count):
+        raise ValueError(f"Invalid shard {value!r}, expected e.g. \"2/4\" for the second of four shards.")
+    return int(index), int(count)
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 60*60, "d": 60*60*24}
+
+def parse_duration(value):
+    """Parse a duration like "30s", "15m", "2h" or "1d" (or a number of seconds) into seconds."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        seconds = value
+    elif isinstance(value, str) and value[:-1].isdigit() and value[-1] in DURATION_UNITS:
+        seconds = int(value[:-1]) * DURATION_UNITS[value[-1]]
+    elif isinstance(value, str) and value.isdigit():
+        seconds = int(value)
+    else:
+        raise ValueError(f"Invalid duration {value!r}, expected e.g. \"30s\", \"15m\", \"2h\" or \"1d\".")
+    if seconds < 0:
+        raise ValueError(f"Invalid duration {value!r}, must not be negative.")
+    return seconds
+
+FICLONE = 0x40049409  # Linux ioctl to clone (reflink) a file on copy-on-write filesystems
+
+def reflink(source, destination):
+    """Create a copy-on-write clone of a file. Only supported on Linux (btrfs, xfs...)."""
+    import fcntl  # pylint: disable=import-outside-toplevel
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        try:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+        except OSError:
+            destination_file.close()
+            os.unlink(destination)
+            raise
+
+def link_or_copy(source, destination):
+    """Hardlink a file, falling back to a reflink and then to a regular copy."""
+    try:
+        os.link(source, destination)
+        return
+    except OSError:
+        pass
+    try:
+        reflink(source, destination)
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(source, destination)
+
+def normalize_distribution_name(name: str) -> str:
+    """Normalize a Python distribution name (PEP 503), so e.g. 'Pre_Commit' matches 'pre-commit'."""
+    return re.sub(r"[-_.]+", "-", name).lower()
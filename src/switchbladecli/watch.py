@@ -0,0 +1,92 @@
+import os
+import time
+
+from fnmatch import fnmatch
+from pathlib import Path
+
+import click
+
+from switchbladecli.git import get_project_files
+
+POLL_INTERVAL = 0.5  # seconds
+DEBOUNCE_INTERVAL = 0.3  # seconds
+# Folders which are never watched if the project isn't a git repo
+IGNORED_FOLDERS = {".git", ".switchblade-cache", ".venv", ".tox", "__pycache__", ".mypy_cache", ".pytest_cache", ".ruff_cache", "node_modules"}
+
+
+def matches_globs(file: str, globs: list) -> bool:
+    """Check if a relative file path matches any of the globs, erring on the side of a match.
+
+    This also works for files which no longer exist, unlike Path.glob.
+    """
+    return any(fnmatch(file, file_glob) or fnmatch(file, file_glob.replace("**/", "")) for file_glob in globs)
+
+
+class Watcher:
+    """Watches the files of a project for changes by polling their size and modification time.
+
+    In a git repo, only the files known to git (tracked, or untracked but not
+    ignored) are watched, so build artifacts and caches written by the tools
+    themselves don't trigger new runs.
+    """
+
+    def __init__(self, project_folder: Path, poll_interval: float = POLL_INTERVAL, debounce_interval: float = DEBOUNCE_INTERVAL):
+        self._project_folder = project_folder
+        self._poll_interval = poll_interval
+        self._debounce_interval = debounce_interval
+        self._snapshot = self._take_snapshot()
+
+
+    def _list_files(self) -> list:
+        try:
+            return get_project_files(self._project_folder)
+        except click.ClickException:
+            pass
+        files = []
+        for folder, subfolders, folder_files in os.walk(self._project_folder):
+            subfolders[:] = [subfolder for subfolder in subfolders if subfolder not in IGNORED_FOLDERS]
+            relative_folder = Path(folder).relative_to(self._project_folder)
+            files.extend((relative_folder / file).as_posix() for file in folder_files)
+        return files
+
+
+    def _take_snapshot(self) -> dict:
+        snapshot = {}
+        for file in self._list_files():
+            try:
+                stat = os.stat(self._project_folder / file)
+            except OSError:
+                continue
+            snapshot[file] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+
+    def poll(self) -> set:
+        """Get the files which were added, changed or deleted since the last poll."""
+        snapshot = self._take_snapshot()
+        changed_files = {file for file in snapshot.keys() | self._snapshot.keys() if snapshot.get(file) != self._snapshot.get(file)}
+        self._snapshot = snapshot
+        return changed_files
+
+
+    def wait_for_changes(self, timeout: float = None) -> set:
+        """Wait for changes (up to timeout seconds), and return the changed files.
+
+        Once something changes, we keep collecting changes until the files have been
+        quiet for the debounce interval, so a burst of changes (e.g. a save-all in the
+        editor or a git checkout) results in a single run.
+        Returns an empty set if nothing changed within the timeout.
+        """
+        started_at = time.monotonic()
+        changed_files = self.poll()
+        while not changed_files:
+            if timeout is not None and time.monotonic() - started_at >= timeout:
+                return set()
+            time.sleep(self._poll_interval)
+            changed_files = self.poll()
+        while True:
+            time.sleep(self._debounce_interval)
+            more_changed_files = self.poll()
+            if not more_changed_files:
+                return changed_files
+            changed_files |= more_changed_files
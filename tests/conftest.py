@@ -1,4 +1,8 @@
+import http.server
+import io
 import os
+import tarfile
+import threading
 from pathlib import Path
 
 import pytest
@@ -20,6 +24,13 @@ def pytest_configure(config: pytest.Config) -> None:
     os.environ["AWS_SESSION_TOKEN"] = "testing"
     os.environ["GITHUB_TOKEN"] = "testing"
 
+@pytest.fixture(autouse=True)
+def bundle_store(tmp_path_factory, monkeypatch):
+    """Give every test its own user-level bundle store."""
+    store_dir = tmp_path_factory.mktemp("bundle-store")
+    monkeypatch.setenv("SWITCHBLADE_STORE_DIR", str(store_dir))
+    return store_dir
+
 @pytest.fixture
 def project(tmp_path):
     # Setup
@@ -97,30 +108,77 @@ def project_with_bad_config(tmp_path, bad_config_file):
     return project_dir
 
 
+class GithubAsset:
+    def __init__(self, path, type, decoded_content=None):
+        self.name = os.path.basename(path)
+        self.path = path
+        self.type = type
+        self.decoded_content = decoded_content
+
+
+class ArchiveRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the tarball of the test bundle, like codeload.github.com does."""
+
+    archive = b""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-gzip")
+        self.send_header("Content-Length", str(len(self.archive)))
+        self.end_headers()
+        self.wfile.write(self.archive)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_bundle_archive(bundle_folder, repo_folder):
+    """Create a Github style tarball with the test bundle in a subfolder of the repo."""
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        tar.add(bundle_folder, arcname=f"username-folder-1234567/{repo_folder}")
+        # Files outside of the bundle folder should not be extracted
+        tar.add(bundle_folder / "bundle.toml", arcname="username-folder-1234567/README.md")
+    return archive.getvalue()
+
+
 # Patch pygithub
 @pytest.fixture()
 def patched_pygithub():
-
-    class GithubAsset:
-        def __init__(self, name, decoded_content):
-            self.name = name
-            self.decoded_content = decoded_content
-
     # Read /tests/files/testbundle and list files
+    repo_folder = "dummy-bundle"
     bundle_folder = Path(os.path.join(os.path.dirname(__file__), "files", "testbundle"))
-    bundle_files = [
-        GithubAsset(str(file.relative_to(bundle_folder)), file.read_bytes())
-        for file in bundle_folder.iterdir()
-    ]
-    with patch("switchbladecli.cli.bundle_cache.Github") as pygithub:
+
+    def get_contents(path, ref=None):
+        folder = bundle_folder / os.path.relpath(path, repo_folder)
+        return [
+            GithubAsset(f"{path}/{file.name}", "dir" if file.is_dir() else "file", None if file.is_dir() else file.read_bytes())
+            for file in folder.iterdir()
+        ]
+
+    # Serve the bundle archive from a local HTTP server
+    ArchiveRequestHandler.archive = make_bundle_archive(bundle_folder, repo_folder)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ArchiveRequestHandler)
+    server_thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    server_thread.start()
+
+    with patch("github.Github") as pygithub:
         pygithub.return_value.get_repo.return_value.get_branch.return_value.commit.sha = "12345678"
-        pygithub.return_value.get_repo.return_value.get_contents.return_value = bundle_files
+        pygithub.return_value.get_repo.return_value.get_archive_link.return_value = f"http://127.0.0.1:{server.server_port}/tarball"
+        pygithub.return_value.get_repo.return_value.get_contents.side_effect = get_contents
+        # Conditional requests for the latest commit go through the requester
+        pygithub.return_value.get_repo.return_value._requester.requestJsonAndCheck.return_value = (
+            {"etag": 'W/"etag-12345678"'}, {"sha": "12345678"}
+        )
         yield pygithub
 
+    server.shutdown()
+    server.server_close()
+
 
 @pytest.fixture()
 def patched_pygithub_with_exception():
-    with patch("switchbladecli.cli.bundle_cache.Github") as pygithub:
+    with patch("github.Github") as pygithub:
         # Raise an exception when trying to get the repo
         pygithub.return_value.get_repo.side_effect = Exception("Test exception")
         yield pygithub
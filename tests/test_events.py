@@ -0,0 +1,70 @@
+import json
+
+from switchbladecli import events
+from switchbladecli.cli.config import find_config_file, get_switchblade_config
+from switchbladecli.cli.stats import cmd_stats
+from switchbladecli.events import EVENT_LOG_FILENAME, EventLog, get_event_log, get_tool_stats, percentile
+
+
+def test_event_log_is_buffered_until_flushed(tmp_path):
+    event_log = EventLog(tmp_path)
+    event_log.log("PUSHED", file=".pylintrc")
+    event_log.log("RAN", tool="pylint", success=True, exit_code=0, duration=1.5, cached=False)
+    assert not (tmp_path / EVENT_LOG_FILENAME).exists()
+
+    event_log.flush()
+    logged_events = [json.loads(line) for line in (tmp_path / EVENT_LOG_FILENAME).read_text(encoding="utf-8").splitlines()]
+    assert [event["event"] for event in logged_events] == ["PUSHED", "RAN"]
+    assert logged_events[1]["tool"] == "pylint" and logged_events[1]["duration"] == 1.5
+    assert all("time" in event and "pid" in event for event in logged_events)
+
+
+def test_event_log_is_rotated(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "MAX_EVENT_LOG_SIZE", 200)
+    event_log = EventLog(tmp_path)
+    for index in range(10):
+        event_log.log("RAN", tool="pylint", success=True, duration=index)
+        event_log.flush()
+
+    assert (tmp_path / f"{EVENT_LOG_FILENAME}.1").exists()
+    assert not (tmp_path / f"{EVENT_LOG_FILENAME}.{events.ROTATED_EVENT_LOGS + 1}").exists()
+    assert (tmp_path / EVENT_LOG_FILENAME).stat().st_size <= 200
+    # The events are read back oldest first, across the rotated logs
+    durations = [event["duration"] for event in event_log.read()]
+    assert durations == sorted(durations) and durations[-1] == 9
+
+
+def test_tool_stats():
+    runs = [{"event": "RAN", "tool": "pytest", "success": True, "duration": duration, "cached": False} for duration in range(1, 11)]
+    runs.append({"event": "RAN", "tool": "pytest", "success": True, "duration": 0.01, "cached": True})
+    runs.append({"event": "RAN", "tool": "pytest", "success": False, "duration": 20, "cached": False, "cancelled": True})
+    runs.append({"event": "RAN", "tool": "pylint", "success": False, "exit_code": 1, "duration": 2, "cached": False})
+
+    tool_stats = get_tool_stats(runs)
+    assert tool_stats["pytest"]["runs"] == 12
+    assert tool_stats["pytest"]["p50"] == 6
+    assert tool_stats["pytest"]["p95"] == 20
+    assert tool_stats["pytest"]["cache_hit_rate"] == 1 / 12
+    # Cancelled runs are not failures
+    assert tool_stats["pytest"]["failure_rate"] == 0
+    assert tool_stats["pylint"]["failure_rate"] == 1
+    assert percentile([], 50) is None
+
+
+def test_stats_of_project(project, capsys):
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+    event_log = get_event_log(project / ".switchblade-cache")
+    event_log.log("RAN", tool="pylint", success=True, exit_code=0, duration=1.25, cached=False)
+    event_log.log("RAN", tool="pylint", success=True, exit_code=None, duration=0.01, cached=True)
+    event_log.log("TIMINGS", command="lint", total=2.5, phases=[])
+
+    cmd_stats(False, project, config)
+    output = capsys.readouterr().out
+    assert "pylint" in output and "1.25s" in output and "50%" in output
+    assert "lint" in output and "2.50s" in output
+
+    cmd_stats(False, project, config, as_json=True)
+    stats_json = json.loads(capsys.readouterr().out)
+    assert stats_json["tools"]["pylint"]["runs"] == 2
+    assert stats_json["commands"]["lint"]["runs"] == 1
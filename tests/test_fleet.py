@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from switchbladecli.cli.bundle_cache import BundleCache
+from switchbladecli.cli.config import get_switchblade_config
+from switchbladecli.cli.fleet import cmd_fleet
+from switchbladecli.events import get_event_log
+from switchbladecli.fleet import discover_repos
+
+
+@pytest.fixture
+def fleet_folder(tmp_path, monkeypatch):
+    # The repos are run with 'python -m switchbladecli.cli'
+    monkeypatch.setenv("PYTHONPATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+    shutil.copytree(os.path.join(os.path.dirname(__file__), "files", "testbundle"), tmp_path / "bundle")
+    for repo_name in ["repo-a", "repo-b"]:
+        shutil.copytree(os.path.join(os.path.dirname(__file__), "files", "testproject"), tmp_path / "repos" / repo_name)
+        with open(tmp_path / "repos" / repo_name / ".switchblade", "w") as switchblade_file:
+            switchblade_file.write('[switchblade]\nmode = "python-poetry"\nbundle = "../../bundle"\n')
+    # A folder which is not a Switchblade project
+    (tmp_path / "repos" / "not-a-repo").mkdir()
+    return tmp_path
+
+
+def test_discover_repos_from_globs_and_repo_lists(fleet_folder):
+    repos, skipped = discover_repos([str(fleet_folder / "repos" / "*")])
+    assert [repo.project_dir for repo in repos] == [str(fleet_folder / "repos" / "repo-a"), str(fleet_folder / "repos" / "repo-b")]
+    assert skipped == [str(fleet_folder / "repos" / "not-a-repo")]
+
+    repos_file = fleet_folder / "repos.txt"
+    repos_file.write_text("# The repos using the test bundle\nrepos/repo-b\nrepos/repo-a/.switchblade\n", encoding="utf-8")
+    repos, skipped = discover_repos([str(repos_file)])
+    assert [repo.project_dir for repo in repos] == [str(fleet_folder / "repos" / "repo-b"), str(fleet_folder / "repos" / "repo-a")]
+    assert skipped == []
+
+
+def test_fleet_updates_repos_and_writes_report(fleet_folder):
+    report_file = fleet_folder / "report.json"
+
+    assert cmd_fleet(False, "update", [], [str(fleet_folder / "repos" / "*")], jobs=2, report_file=str(report_file)) == True
+
+    report = json.loads(report_file.read_text(encoding="utf-8"))
+    assert report["command"] == "update"
+    assert report["passed"] == True
+    assert [repo["repo"] for repo in report["repos"]] == [str(fleet_folder / "repos" / "repo-a"), str(fleet_folder / "repos" / "repo-b")]
+    assert {repo["bundle"] for repo in report["repos"]} == {str(fleet_folder / "bundle")}
+
+    # The bundle was fetched in the first repo, and the second one got it from the bundle store
+    versions = set()
+    for repo in report["repos"]:
+        config = get_switchblade_config(False, repo["repo"], ".switchblade")
+        versions.add(BundleCache(config).get_latest_version())
+    assert len(versions) == 1 and None not in versions
+    events = get_event_log(fleet_folder / "repos" / "repo-b" / ".switchblade-cache").read()
+    assert "RESTORED_FROM_STORE" in [event.get("status") for event in events if event["event"] == "UPDATING"]
+
+
+def test_fleet_reports_failing_repos(fleet_folder, capsys):
+    with open(fleet_folder / "repos" / "repo-b" / ".switchblade", "w") as switchblade_file:
+        switchblade_file.write('[switchblade]\nmode = "python-poetry"\n')
+
+    assert cmd_fleet(False, "update", [], [str(fleet_folder / "repos" / "*")]) == False
+    output = capsys.readouterr().out
+    assert "Required configuration key not found: [switchblade].bundle" in output
+    assert "1 passed, 1 failed." in output
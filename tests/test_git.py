@@ -0,0 +1,31 @@
+import subprocess
+
+from switchbladecli.git import get_changed_files
+
+
+def git(project, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=project, check=True, capture_output=True
+    )
+
+
+def test_get_changed_files(project):
+    git(project, "init")
+    git(project, "add", ".")
+    git(project, "commit", "-m", "Initial commit")
+
+    assert get_changed_files(project) == []
+
+    (project / "src" / "some_thing.py").write_text("# changed\n", encoding="utf-8")
+    (project / "src" / "new_thing.py").write_text("", encoding="utf-8")
+    (project / "tests" / "test_things.py").unlink()
+
+    # Deleted files are left out, untracked files are included
+    assert get_changed_files(project) == ["src/new_thing.py", "src/some_thing.py"]
+
+    git(project, "add", "src/new_thing.py")
+    assert get_changed_files(project, staged=True) == ["src/new_thing.py"]
+
+    git(project, "commit", "-m", "Add new thing")
+    assert get_changed_files(project, since="HEAD~1") == ["src/new_thing.py", "src/some_thing.py"]
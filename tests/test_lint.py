@@ -1,5 +1,18 @@
+import click
+import hashlib
+import pytest
+import subprocess
+import threading
+
+from tomlkit import loads
+
+from switchbladecli.cli.bundle_cache import PROJECT_LOCK, Bundle, BundleCache
 from switchbladecli.cli.config import find_config_file, get_switchblade_config
-from switchbladecli.cli.lint import cmd_lint
+from switchbladecli.cli.lint import cmd_lint, cmd_watch_lint
+from switchbladecli.events import get_event_log
+from switchbladecli.locking import FileLock
+from switchbladecli.modes import python_poetry
+from switchbladecli.timings import timings
 
 
 def test_lint_all(fp, project, patched_pygithub):
@@ -49,3 +62,595 @@ def test_lint_all_with_errors(fp, project, patched_pygithub):
     assert fp.call_count(["poetry", "run", "pre-commit", "run", "--all-files"]) == 1
 
     assert lint_result == False
+
+
+def test_lint_all_in_parallel(fp, project, patched_pygithub, capsys):
+    fp.keep_last_process(True)
+    fp.register(["poetry", "run", "pylint", "src"], stdout="pylint says hi", returncode=1)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    lint_result = cmd_lint(False, project, config, jobs=2)
+
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 1
+    assert fp.call_count(["poetry", "run", "pre-commit", "run", "--all-files"]) == 1
+    assert lint_result == False
+
+    # The buffered output of each tool is printed after the tool has finished
+    output = capsys.readouterr().out
+    assert "with 2 parallel jobs" in output
+    assert output.index("Switchblade ran pylint") < output.index("pylint says hi")
+
+
+def test_lint_jobs_default_from_config(fp, project, patched_pygithub, capsys):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write("\n[linters]\njobs = 2\n")
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == True
+    assert "with 2 parallel jobs" in capsys.readouterr().out
+
+
+def test_lint_starts_longest_linters_first(fp, project, patched_pygithub, capsys):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    # pre-commit took longer than pylint before, so it is started first
+    BundleCache(config).update_tool_durations({"pylint": 1.0, "pre-commit": 10.0})
+    assert cmd_lint(False, project, config, jobs=2) == True
+    assert "running pre-commit, pylint with 2 parallel jobs" in capsys.readouterr().out
+
+    # The durations are updated with the new runs
+    durations = BundleCache(config).get_tool_durations()
+    assert durations["pre-commit"] < 10.0
+    assert durations["pylint"] < 1.0
+
+
+def test_lint_fail_fast(fp, project, patched_pygithub, capsys):
+    fp.keep_last_process(True)
+    fp.register(["poetry", "run", "pylint", "src"], returncode=1)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config, fail_fast=True) == False
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 1
+    assert fp.call_count(["poetry", "run", "pre-commit", "run", "--all-files"]) == 0
+    assert "stopping after pylint failed (--fail-fast), cancelling pre-commit" in capsys.readouterr().err
+
+
+def test_lint_fail_fast_stops_chunked_tools(fp, project, patched_pygithub, monkeypatch):
+    fp.keep_last_process(True)
+    cancelled = threading.Event()
+    original_cancel = python_poetry.PythonPoetry.cancel
+
+    def cancel(tool_runner):
+        original_cancel(tool_runner)
+        cancelled.set()
+
+    monkeypatch.setattr(python_poetry.PythonPoetry, "cancel", cancel)
+    monkeypatch.setattr("switchbladecli.modes.python_poetry.max_command_length", lambda: 60)
+    pylint_started = threading.Event()
+
+    def run_pylint(process):
+        pylint_started.set()
+        cancelled.wait(timeout=5)
+
+    # The first chunks of pylint are still running when pre-commit fails
+    fp.register(["poetry", "run", "pylint", fp.any()], callback=run_pylint, occurrences=3)
+    fp.register(["poetry", "run", "pre-commit", "run", "--all-files"], callback=lambda process: pylint_started.wait(timeout=5), returncode=1)
+    fp.register(["poetry", fp.any()])
+
+    changed_files = [f"src/module_{i}.py" for i in range(6)]
+    for changed_file in changed_files:
+        (project / changed_file).write_text("", encoding="utf-8")
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write(
+            '\n[linters]\nall = ["pre-commit", "pylint"]\njobs = 2\n'
+            '\n[linters.pylint]\ncommand = "pylint {files}"\nfiles = ["src/**/*.py"]\n'
+        )
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    # No more chunks are started once the run is cancelled
+    assert cmd_lint(False, project, config, changed_files=changed_files, fail_fast=True) == False
+    assert cancelled.is_set()
+    assert fp.call_count(["poetry", "run", "pylint", fp.any()]) == 2
+
+
+def test_lint_respects_after_and_exclusive(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write(
+            '\n[linters]\nall = ["pylint", "pre-commit", "black"]\njobs = 4\n'
+            '\n[linters.black]\ncommand = "black src"\nexclusive = true\n'
+            '\n[linters.pylint]\nafter = ["black"]\n'
+        )
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == True
+
+    tools_run = [call[2] for call in fp.calls if call[:2] == ["poetry", "run"]]
+    assert tools_run == ["pre-commit", "black", "pylint"]
+
+
+def test_lint_fails_on_circular_dependencies(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write(
+            '\n[linters.pylint]\nafter = ["pre-commit"]\n'
+            '\n[linters.pre-commit]\nafter = ["pylint"]\n'
+        )
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    with pytest.raises(click.ClickException, match="Circular"):
+        cmd_lint(False, project, config)
+
+    assert fp.call_count(["poetry", "run", fp.any()]) == 0
+
+
+def test_lint_skips_tools_with_unchanged_inputs(fp, project, patched_pygithub, capsys):
+    fp.keep_last_process(True)
+    fp.register(["poetry", "run", "pylint", "src"], stdout="Your code has been rated at 10.00/10")
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters.pylint]\ninputs = ["src/**/*.py"]\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == True
+    assert cmd_lint(False, project, config) == True
+
+    # The second run reuses the cached pylint result, but pre-commit declares no inputs
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 1
+    assert fp.call_count(["poetry", "run", "pre-commit", "run", "--all-files"]) == 2
+    output = capsys.readouterr().out
+    assert "✅ (cached)" in output
+    assert output.count("Your code has been rated at 10.00/10") == 2
+
+    # Changing an input file invalidates the cached result
+    (project / "src" / "some_thing.py").write_text("# changed\n", encoding="utf-8")
+    assert cmd_lint(False, project, config) == True
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 2
+
+    # So does a change to the lockfile, e.g. an upgrade of pylint
+    with open(project / "poetry.lock", "a") as lockfile:
+        lockfile.write("\n# changed\n")
+    assert cmd_lint(False, project, config) == True
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 3
+
+    # The cache can be bypassed
+    assert cmd_lint(False, project, config, use_cache=False) == True
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 4
+
+
+def test_lint_does_not_cache_failures(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", "run", "pylint", "src"], returncode=1)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters.pylint]\ninputs = ["src/**/*.py"]\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == False
+    assert cmd_lint(False, project, config) == False
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 2
+
+
+def test_lint_changed_files_only(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    (project / "src" / "other_thing.py").write_text("", encoding="utf-8")
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters.pylint]\ncommand = "pylint {files}"\nfiles = ["src/**/*.py"]\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    # A full run passes all matching files
+    assert cmd_lint(False, project, config) == True
+    assert fp.call_count(["poetry", "run", "pylint", "src/other_thing.py", "src/some_thing.py"]) == 1
+
+    # A changed run only passes the changed files matching the glob
+    assert cmd_lint(False, project, config, changed_files=["README.md", "src/some_thing.py"]) == True
+    assert fp.call_count(["poetry", "run", "pylint", "src/some_thing.py"]) == 1
+
+    # Linters without the placeholder always do a full run
+    assert fp.call_count(["poetry", "run", "pre-commit", "run", "--all-files"]) == 2
+
+    # Linters with no changed files are skipped
+    assert cmd_lint(False, project, config, changed_files=["README.md"]) == True
+    assert fp.call_count(["poetry", "run", "pylint", fp.any()]) == 2
+
+
+def test_lint_changed_files_need_file_globs(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters.pylint]\ncommand = "pylint {files}"\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    # Without globs, a changed file pylint can't handle would be passed to it as well
+    with pytest.raises(click.ClickException, match="declares no 'files' globs"):
+        cmd_lint(False, project, config, changed_files=["README.md", "src/some_thing.py"])
+    assert fp.call_count(["poetry", "run", "pylint", fp.any()]) == 0
+
+
+def test_lint_splits_long_file_lists(fp, project, patched_pygithub, monkeypatch):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    monkeypatch.setattr("switchbladecli.modes.python_poetry.max_command_length", lambda: 60)
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters]\nall = ["pylint"]\n\n[linters.pylint]\ncommand = "pylint {files}"\nfiles = ["src/**/*.py"]\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    changed_files = [f"src/module_{i}.py" for i in range(6)]
+    for changed_file in changed_files:
+        (project / changed_file).write_text("", encoding="utf-8")
+    assert cmd_lint(False, project, config, changed_files=changed_files) == True
+
+    pylint_calls = [call[3:] for call in fp.calls if call[:3] == ["poetry", "run", "pylint"]]
+    assert len(pylint_calls) == 3
+    assert sorted(file for call in pylint_calls for file in call) == changed_files
+
+
+def test_lint_removes_pushed_config_folders(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == True
+
+    # Config files in bundle subfolders are pushed along with their folders, and removed afterwards
+    events = get_event_log(project / ".switchblade-cache").read()
+    assert "hooks" in [event["file"] for event in events if event["event"] == "PUSHED"]
+    assert not (project / "hooks").exists()
+    assert not (project / ".pylintrc").exists()
+
+
+def test_lint_with_symlinked_config_files(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    linked_files = []
+    fp.register(["poetry", "run", "pylint", "src"], callback=lambda process: linked_files.append((project / ".pylintrc").is_symlink()))
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('materialize = "symlink"\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == True
+
+    # The config files are linked to the bundle during the run, and removed afterwards
+    assert linked_files == [True]
+    assert not (project / ".pylintrc").exists()
+    assert not (project / "hooks").exists()
+
+
+def test_lint_with_persistent_config_files(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+    fp.allow_unregistered(True)
+    subprocess.run(["git", "init", "-q"], cwd=project, check=True)
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('materialize = "persistent"\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    # The config files are linked into the project, and stay there (git-ignored) between runs
+    assert cmd_lint(False, project, config) == True
+    assert (project / ".pylintrc").is_symlink()
+    linked_on = (project / ".pylintrc").lstat().st_mtime_ns
+    exclude_lines = (project / ".git" / "info" / "exclude").read_text(encoding="utf-8").splitlines()
+    assert "/.pylintrc" in exclude_lines and "/hooks" in exclude_lines
+    assert ".pylintrc" not in subprocess.run(["git", "status", "--porcelain"], cwd=project, capture_output=True, text=True).stdout
+
+    # They are left alone while the bundle version stays the same
+    assert cmd_lint(False, project, config) == True
+    assert (project / ".pylintrc").lstat().st_mtime_ns == linked_on
+
+    # And removed when switching to another strategy
+    config["switchblade"]["materialize"] = "copy"
+    assert cmd_lint(False, project, config) == True
+    assert not (project / ".pylintrc").exists()
+    assert not (project / "hooks").exists()
+    assert "/.pylintrc" not in (project / ".git" / "info" / "exclude").read_text(encoding="utf-8")
+
+
+def test_lint_with_persistent_config_files_keeps_store_intact(fp, project, patched_pygithub, bundle_store):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+    fp.allow_unregistered(True)
+    subprocess.run(["git", "init", "-q"], cwd=project, check=True)
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('materialize = "persistent"\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == True
+    pylintrc = (project / ".switchblade-cache" / "12345678" / ".pylintrc").read_bytes()
+
+    # Editing a linked config file only changes the project's own copy, not the shared store
+    (project / ".pylintrc").write_text("[MAIN]\n", encoding="utf-8")
+    assert (project / ".switchblade-cache" / "12345678" / ".pylintrc").read_bytes() == pylintrc
+    store_objects = [path for path in (bundle_store / "objects").glob("*/*") if path.is_file()]
+    assert store_objects
+    for store_object in store_objects:
+        assert hashlib.sha256(store_object.read_bytes()).hexdigest() == store_object.parent.name + store_object.name
+
+
+def test_lint_with_isolated_tools_env(fp, project, patched_pygithub, bundle_store):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('tools_env = "isolated"\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == True
+    assert cmd_lint(False, project, config) == True
+
+    # The tools are installed once into a shared virtualenv, not into the project
+    assert fp.call_count(["poetry", "install", "--no-root"]) == 1
+    assert fp.call_count(["poetry", "update", "--only", "switchblade"]) == 0
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 2
+    tools_venvs = [folder for folder in (bundle_store / "tools").iterdir() if folder.is_dir()]
+    assert len(tools_venvs) == 1
+    assert "pylint" in (tools_venvs[0] / "pyproject.toml").read_text(encoding="utf-8")
+
+
+def test_lint_runs_tools_directly_from_project_env(fp, project, patched_pygithub, tmp_path_factory):
+    env_folder = tmp_path_factory.mktemp("project-env")
+    (env_folder / "bin").mkdir()
+    pylint = env_folder / "bin" / "pylint"
+    pylint.write_text("#!/bin/sh\n", encoding="utf-8")
+    pylint.chmod(0o755)
+
+    fp.keep_last_process(True)
+    fp.register(["poetry", "env", "info", "--path"], stdout=str(env_folder))
+    fp.register([str(pylint), "src"])
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == True
+    assert cmd_lint(False, project, config) == True
+
+    # Tools in the project env skip 'poetry run', others still go through it
+    assert fp.call_count([str(pylint), "src"]) == 2
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 0
+    assert fp.call_count(["poetry", "run", "pre-commit", "run", "--all-files"]) == 2
+    # The project env is only resolved once
+    assert fp.call_count(["poetry", "env", "info", "--path"]) == 1
+
+
+def test_lint_skips_install_when_dependencies_are_unchanged(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    cmd_lint(False, project, config)
+    cmd_lint(False, project, config)
+    assert fp.call_count(["poetry", "update", "--only", "switchblade"]) == 1
+
+    # A change to the project lockfile means the tools have to be installed again
+    with open(project / "poetry.lock", "a") as lockfile:
+        lockfile.write("\n# changed\n")
+    cmd_lint(False, project, config)
+    assert fp.call_count(["poetry", "update", "--only", "switchblade"]) == 2
+
+
+def test_lint_reinstalls_missing_distributions(fp, project, patched_pygithub, tmp_path_factory):
+    env_folder = tmp_path_factory.mktemp("project-env")
+    (env_folder / "bin").mkdir()
+    site_packages = env_folder / "lib" / "python3.11" / "site-packages"
+    site_packages.mkdir(parents=True)
+
+    fp.keep_last_process(True)
+    fp.register(["poetry", "env", "info", "--path"], stdout=str(env_folder))
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    # The install digest matches, but nothing is actually installed in the project env
+    cmd_lint(False, project, config)
+    cmd_lint(False, project, config)
+    assert fp.call_count(["poetry", "update", "--only", "switchblade"]) == 2
+
+    for name in ["bandit", "black", "flake8", "pre_commit", "pylint", "pytest", "pytest_cov", "ruff"]:
+        dist_info = site_packages / f"{name}-1.0.dist-info"
+        dist_info.mkdir()
+        (dist_info / "METADATA").write_text(f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n", encoding="utf-8")
+    cmd_lint(False, project, config)
+    assert fp.call_count(["poetry", "update", "--only", "switchblade"]) == 2
+
+
+def test_lint_installs_only_required_dependencies(fp, project, patched_pygithub):
+    installed_groups = []
+    def record_switchblade_group(process):
+        installed_groups.append(loads((project / "pyproject.toml").read_text(encoding="utf-8"))["tool"]["poetry"]["group"]["switchblade"])
+
+    fp.keep_last_process(True)
+    fp.register(["poetry", "update", "--only", "switchblade"], callback=record_switchblade_group)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters.pylint]\nrequires = ["pylint"]\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config, "pylint") == True
+    assert list(installed_groups[0]["dependencies"]) == ["pylint"]
+
+    # A tool without 'requires' needs all of the dependencies
+    assert cmd_lint(False, project, config) == True
+    assert "pre-commit" in installed_groups[1]["dependencies"]
+
+    # ...which also covers the ones required by pylint
+    assert cmd_lint(False, project, config, "pylint") == True
+    assert len(installed_groups) == 2
+
+
+def test_lint_fails_on_unknown_requirement(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters.pylint]\nrequires = ["pylint-plugin"]\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    with pytest.raises(click.ClickException, match="pylint-plugin"):
+        cmd_lint(False, project, config, "pylint")
+
+
+def test_lint_watch_reruns_affected_linters(fp, project, patched_pygithub, monkeypatch):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters.pylint]\ninputs = ["src/**/*.py"]\n')
+        switchblade_file.write('\n[linters.pre-commit]\ninputs = [".pre-commit-config.yaml"]\n')
+
+    class FakeWatcher:
+        def __init__(self, project_folder):
+            self._changes = [
+                {"src/some_thing.py"},
+                {"README.md"},
+            ]
+
+        def wait_for_changes(self, timeout=None):
+            # Only change files once the current run is done
+            if timeout is not None:
+                return set()
+            if not self._changes:
+                raise KeyboardInterrupt()
+            changes = self._changes.pop(0)
+            for file in changes:
+                (project / file).write_text("# changed\n", encoding="utf-8")
+            return changes
+
+    monkeypatch.setattr(python_poetry, "Watcher", FakeWatcher)
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    cmd_watch_lint(False, project, config)
+
+    # The bundle is set up once, and the linters are re-run only if their inputs changed
+    assert fp.call_count(["poetry", "update", "--only", "switchblade"]) == 1
+    assert fp.call_count(["poetry", "run", "pylint", "src"]) == 2
+    assert fp.call_count(["poetry", "run", "pre-commit", "run", "--all-files"]) == 1
+    # ...and torn down when the watch is stopped
+    assert not (project / ".pylintrc").exists()
+
+
+def test_lint_uses_resolved_bundle_manifest(fp, project, patched_pygithub, monkeypatch):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    assert cmd_lint(False, project, config) == True
+    resolved_folder = project / ".switchblade-cache" / "resolved"
+    assert len(list(resolved_folder.iterdir())) == 1
+
+    # Later runs load the manifest instead of parsing bundle.toml
+    monkeypatch.setattr(Bundle, "_load_bundle_config", lambda self: pytest.fail("bundle.toml was parsed"))
+    assert cmd_lint(False, project, config) == True
+    monkeypatch.undo()
+
+    # A change to the .switchblade config gets its own manifest
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters.pylint]\ncommand = "pylint src tests"\n')
+    config = get_switchblade_config(False, str(project), config_file)
+    assert cmd_lint(False, project, config) == True
+    assert len(list(resolved_folder.iterdir())) == 2
+    assert fp.call_count(["poetry", "run", "pylint", "src", "tests"]) == 1
+
+
+def test_lint_waits_for_a_concurrent_run_in_the_project(fp, project, patched_pygithub, capsys):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+    pyproject_before = (project / "pyproject.toml").read_text(encoding="utf-8")
+
+    # Another run is setting up the project, and finishes a moment later
+    (project / ".switchblade-cache").mkdir(exist_ok=True)
+    project_lock = FileLock(project / ".switchblade-cache" / f".{PROJECT_LOCK}.lock")
+    project_lock.acquire()
+    threading.Timer(0.2, project_lock.release).start()
+
+    assert cmd_lint(False, project, config) == True
+    assert "waiting for another run in this project" in capsys.readouterr().out
+    assert (project / "pyproject.toml").read_text(encoding="utf-8") == pyproject_before
+    # The bundle was fetched into a temporary folder which was renamed into place
+    assert not [folder for folder in (project / ".switchblade-cache").iterdir() if folder.name.endswith(".tmp")]
+
+
+def test_lint_records_timings_of_each_phase(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    timings.reset()
+    assert cmd_lint(False, project, config) == True
+
+    phases = {phase["phase"]: phase for phase in timings.get_phases()}
+    for phase_name in ["fetch bundle", "check for updates", "download bundle", "install dev tools", "poetry update",
+                       "copy config files", "run pylint", "run pre-commit", "remove config files", "restore pyproject.toml"]:
+        assert phase_name in phases
+    assert phases["check for updates"]["parent"] == "fetch bundle"
+    assert phases["poetry update"]["parent"] == "install dev tools"
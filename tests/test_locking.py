@@ -0,0 +1,27 @@
+import subprocess  # nosec
+import sys
+
+from switchbladecli.locking import FileLock
+
+
+def test_shared_locks_are_held_together_but_not_with_an_exclusive_lock(tmp_path):
+    lock_file = tmp_path / "cache.lock"
+
+    with FileLock(lock_file, shared=True), FileLock(lock_file, shared=True):
+        assert not FileLock(lock_file).acquire(blocking=False)
+
+    exclusive_lock = FileLock(lock_file)
+    assert exclusive_lock.acquire(blocking=False)
+    assert not FileLock(lock_file, shared=True).acquire(blocking=False)
+    exclusive_lock.release()
+    assert FileLock(lock_file, shared=True).acquire(blocking=False)
+
+
+def test_lock_is_released_when_the_process_exits(tmp_path):
+    lock_file = tmp_path / "cache.lock"
+    # A process which exits (or crashes) while holding the lock doesn't leave it behind
+    subprocess.run(
+        [sys.executable, "-c", f"from switchbladecli.locking import FileLock; FileLock({str(lock_file)!r}).acquire(); raise SystemExit(1)"],
+        check=False,
+    )  # nosec
+    assert FileLock(lock_file).acquire(blocking=False)
@@ -0,0 +1,15 @@
+from switchbladecli.cli.result_cache import ResultCache
+
+
+def test_result_cache_keeps_any_output(tmp_path):
+    result_cache = ResultCache(tmp_path, tmp_path)
+
+    # Colored output, and other control characters which TOML can't hold as they are
+    output = "\x1b[1m\x1b[31msrc/thing.py:1:0: C0114\x1b[0m\r\n\t\x00\x7f\\e done\n"
+    result_cache.set("key", "pylint", output)
+    assert result_cache.get("key")["output"] == output
+    assert result_cache.get("other-key") is None
+
+    # A damaged result file counts as a miss instead of failing every later run
+    (tmp_path / "results" / "key.json").write_text('{"result": {"output": "trunc', encoding="utf-8")
+    assert result_cache.get("key") is None
@@ -0,0 +1,28 @@
+import threading
+
+from switchbladecli.modes.scheduler import ToolResult, ToolScheduler
+
+
+def test_priorities_follow_the_critical_path():
+    scheduler = ToolScheduler(2)
+    tool_names = ["format", "lint", "typecheck", "test"]
+    dependencies = {"format": set(), "lint": {"format"}, "typecheck": set(), "test": set()}
+    priorities = scheduler._priorities(tool_names, dependencies, {"format": 1.0, "lint": 2.0, "typecheck": 2.5})
+
+    # format is short, but lint has to wait for it; test hasn't run before so gets the average
+    assert priorities == {"format": 3.0, "lint": 2.0, "typecheck": 2.5, "test": (1.0 + 2.0 + 2.5) / 3}
+
+
+def test_fail_fast_cancels_running_tools():
+    cancelled = threading.Event()
+
+    def run_tool(tool_name, capture_output):
+        if tool_name == "slow":
+            cancelled.wait(timeout=10)
+            return ToolResult(False, "Cancelled.\n")
+        return ToolResult(False, "failed\n", exit_code=1)
+
+    results = ToolScheduler(2).run(["slow", "fails", "never"], run_tool, fail_fast=True, cancel=cancelled.set)
+
+    assert cancelled.is_set()
+    assert set(results) == {"slow", "fails"}
@@ -0,0 +1,133 @@
+import os
+import shutil
+import subprocess  # nosec
+import sys
+import time
+
+from unittest import mock
+
+import pytest
+
+from switchbladecli import daemon
+from switchbladecli.cli.bundle_cache import BundleCache
+from switchbladecli.cli.config import get_switchblade_config
+from switchbladecli.cli.resolved_bundle import ResolvedBundle
+from switchbladecli.cli.update import cmd_update
+from switchbladecli.modes.python_poetry import PythonPoetry
+
+pytestmark = pytest.mark.skipif(not daemon.is_supported(), reason="The daemon needs Unix sockets")
+
+
+@pytest.fixture
+def local_bundle_project(project):
+    shutil.copytree(os.path.join(os.path.dirname(__file__), "files", "testbundle"), project / "local-bundle")
+    with open(project / ".switchblade", "w") as switchblade_file:
+        switchblade_file.write('[switchblade]\nmode = "python-poetry"\nbundle = "local-bundle"\n')
+    return project
+
+
+SRC_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+
+@pytest.fixture
+def running_daemon(local_bundle_project):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "switchbladecli.cli", "serve"],
+        cwd=local_bundle_project,
+        env={**os.environ, "PYTHONPATH": SRC_FOLDER},
+    )  # nosec
+    socket_path = daemon.socket_path(str(local_bundle_project))
+    for _ in range(100):
+        if socket_path.exists():
+            break
+        time.sleep(0.1)
+    yield process
+    daemon.stop_daemon(str(local_bundle_project))
+    process.wait(timeout=10)
+
+
+def test_serve_runs_forwarded_commands(local_bundle_project, running_daemon, capfd):
+    assert daemon.forward_command(["update"]) == 0
+
+    # The command ran in the daemon, in the project
+    config = get_switchblade_config(False, str(local_bundle_project), ".switchblade")
+    assert BundleCache(config).get_latest_version().startswith("b2-")
+
+    # Output is streamed to the client's stdout/stderr
+    assert daemon.forward_command(["lint", "no-such-linter"]) == 1
+    assert "no-such-linter" in capfd.readouterr().err
+
+
+def test_serve_only_forwards_to_a_running_daemon(local_bundle_project):
+    assert daemon.forward_command(["update"]) is None
+
+
+def test_serve_stops(local_bundle_project, running_daemon):
+    assert daemon.stop_daemon(str(local_bundle_project)) == True
+    running_daemon.wait(timeout=10)
+    assert not daemon.socket_path(str(local_bundle_project)).exists()
+    assert daemon.forward_command(["update"]) is None
+
+
+def test_serve_imports_commands_up_front(local_bundle_project):
+    # The modules the CLI imports lazily are imported by the daemon, so its children start warm
+    warm_up = "import sys; from switchbladecli import daemon; daemon.Daemon('.').warm_up(); print(' '.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", warm_up],
+        cwd=local_bundle_project,
+        env={**os.environ, "PYTHONPATH": SRC_FOLDER},
+        capture_output=True,
+        text=True,
+        check=True,
+    )  # nosec
+    modules = result.stdout.split()
+    for module in [
+        "switchbladecli.cli.lint",
+        "switchbladecli.cli.test",
+        "switchbladecli.cli.update",
+        "switchbladecli.modes.python_poetry",
+        "switchbladecli.cli.bundle_cache",
+        "mergedeep",
+        "github",
+    ]:
+        assert module in modules
+
+
+def test_serve_stop_without_daemon_support(local_bundle_project, monkeypatch):
+    # e.g. on Windows, which has no os.getuid() to find the socket with
+    monkeypatch.setattr(daemon, "is_supported", lambda: False)
+    monkeypatch.delattr(os, "getuid")
+    assert daemon.stop_daemon(str(local_bundle_project)) == False
+
+
+def test_serve_keeps_the_project_loaded(fp, local_bundle_project, tmp_path_factory):
+    env_folder = tmp_path_factory.mktemp("project-env")
+    (env_folder / "bin").mkdir()
+    fp.register(["poetry", "env", "info", "--path"], stdout=str(env_folder), occurrences=2)
+    config = get_switchblade_config(False, str(local_bundle_project), ".switchblade")
+    cmd_update(False, local_bundle_project, config)
+
+    project_daemon = daemon.Daemon(str(local_bundle_project))
+    project_daemon.load_project()
+    assert fp.call_count(["poetry", "env", "info", "--path"]) == 1
+
+    # The next request loads the project from memory: nothing is parsed, compiled or resolved again
+    with mock.patch("switchbladecli.toml_files.tomllib.load", side_effect=AssertionError("config re-read")), \
+            mock.patch("switchbladecli.cli.resolved_bundle.json.loads", side_effect=AssertionError("manifest re-read")), \
+            mock.patch.object(ResolvedBundle, "compile", side_effect=AssertionError("bundle re-resolved")):
+        project_daemon.load_project()
+        config = get_switchblade_config(False, str(local_bundle_project), ".switchblade")
+        assert BundleCache(config).get_latest_bundle().resolve().linters is not None
+        assert ".pylintrc" in BundleCache(config).get_fingerprint_index("local-bundle")
+        assert PythonPoetry(config, False).resolve_env_bin_folder() == env_folder / "bin"
+    assert fp.call_count(["poetry", "env", "info", "--path"]) == 1
+
+    # Until the files they come from change
+    with open(local_bundle_project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('\n[linters.pylint]\nextra = true\n')
+    with open(local_bundle_project / "poetry.lock", "a") as lockfile:
+        lockfile.write("\n# changed\n")
+    with mock.patch.object(ResolvedBundle, "compile", wraps=ResolvedBundle.compile) as compile_bundle:
+        project_daemon.load_project()
+    assert compile_bundle.call_count == 1
+    assert fp.call_count(["poetry", "env", "info", "--path"]) == 2
@@ -0,0 +1,57 @@
+import os
+import subprocess  # nosec
+import sys
+
+import pytest
+
+SRC_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+# Budgets for the cumulative import time of the CLI modules. Wall-clock timings depend on the
+# machine and its load, so they are only checked when this is set (e.g. on a quiet machine)
+TIMING_TESTS_ENV_VAR = "SWITCHBLADE_TIMING_TESTS"
+CLI_IMPORT_BUDGET_US = 250_000
+CLIENT_IMPORT_BUDGET_US = 100_000
+# Dependencies which must only be imported when they are actually used
+HEAVY_MODULES = ["github", "requests", "jwt", "nacl"]
+
+
+def import_time(module: str) -> int:
+    """The cumulative import time of a module (in microseconds) in a fresh interpreter, best of three."""
+    timings = []
+    for _ in range(3):
+        cmd_result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            env={**os.environ, "PYTHONPATH": SRC_FOLDER}, check=True, capture_output=True, text=True,
+        )  # nosec
+        last_line = cmd_result.stderr.strip().splitlines()[-1]
+        _, cumulative, name = last_line.split("|")
+        assert name.strip() == module
+        timings.append(int(cumulative))
+    return min(timings)
+
+
+def imported_modules(module: str) -> set:
+    cmd_result = subprocess.run(
+        [sys.executable, "-c", f"import sys, {module}; print(' '.join(sys.modules))"],
+        env={**os.environ, "PYTHONPATH": SRC_FOLDER}, check=True, capture_output=True, text=True,
+    )  # nosec
+    return {name.split(".")[0] for name in cmd_result.stdout.split()}
+
+
+@pytest.mark.parametrize("module", ["switchbladecli.cli.__main__", "switchbladecli.modes.python_poetry"])
+def test_startup_does_not_import_heavy_dependencies(module):
+    assert not imported_modules(module) & set(HEAVY_MODULES)
+
+
+def test_startup_client_does_not_import_click():
+    assert "click" not in imported_modules("switchbladecli.daemon")
+
+
+def test_startup_cli_does_not_import_tomlkit():
+    # Only commands which write TOML files import it
+    assert "tomlkit" not in imported_modules("switchbladecli.cli.__main__")
+
+
+@pytest.mark.skipif(not os.environ.get(TIMING_TESTS_ENV_VAR), reason=f"Set {TIMING_TESTS_ENV_VAR}=1 to check import timings")
+def test_startup_import_time_is_within_budget():
+    assert import_time("switchbladecli.cli.__main__") < CLI_IMPORT_BUDGET_US
+    assert import_time("switchbladecli.daemon") < CLIENT_IMPORT_BUDGET_US
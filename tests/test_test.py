@@ -1,3 +1,8 @@
+import click
+import pytest
+import sqlite3
+
+from switchbladecli.cli.bundle_cache import BundleCache
 from switchbladecli.cli.config import find_config_file, get_switchblade_config
 from switchbladecli.cli.test import cmd_test
 
@@ -46,3 +51,149 @@ def test_test_all_with_errors(fp, project, patched_pygithub):
     assert fp.call_count(["poetry", "run", "pytest", "-c", "pyproject.toml", fp.any()]) == 1
 
     assert test_result == False
+
+
+def write_sharded_tests(project):
+    """Add test files of different sizes, and make the pytest test shardable."""
+    for name, size in [("test_big.py", 400), ("test_mid.py", 250), ("test_small.py", 50)]:
+        (project / "tests" / name).write_text("#" * size, encoding="utf-8")
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write(
+            '\n[tests]\nall = ["pytest", "doctest"]\n'
+            '\n[tests.pytest]\nshard_command = "pytest {files}"\nfiles = ["tests/test_*.py"]\ncoverage = true\n'
+            '\n[tests.doctest]\ncommand = "doctest"\n'
+        )
+
+
+def test_test_shards(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    coverage_files = []
+    fp.register(["poetry", "run", "pytest", fp.any()], callback=lambda process: coverage_files.append(process.kwargs["env"]["COVERAGE_FILE"]))
+    fp.register(["poetry", fp.any()])
+    write_sharded_tests(project)
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+    cache = BundleCache(config)
+    cache.update_tool_durations({"pytest": 100.0})
+
+    assert cmd_test(False, project, config, shard="1/2") == True
+    assert cmd_test(False, project, config, shard="2/2") == True
+
+    # Every test file runs in exactly one shard, balanced by size (as no timings are recorded yet)
+    pytest_calls = [call[3:] for call in fp.calls if call[:3] == ["poetry", "run", "pytest"]]
+    assert pytest_calls == [["tests/test_big.py"], ["tests/test_mid.py", "tests/test_small.py", "tests/test_things.py"]]
+    # Tests which can't be split only run in the first shard
+    assert fp.call_count(["poetry", "run", "doctest"]) == 1
+    # The coverage data of the shards is left to be combined by CI
+    assert coverage_files == [".coverage.shard-1-of-2", ".coverage.shard-2-of-2"]
+    assert fp.call_count(["poetry", "run", "coverage", fp.any()]) == 0
+    # A shard only runs part of the tests, so it doesn't record how long the whole tool takes
+    assert cache.get_tool_durations()["pytest"] == 100.0
+
+    with pytest.raises(click.ClickException, match="Invalid --shard"):
+        cmd_test(False, project, config, shard="3/2")
+
+
+def test_test_workers_combine_coverage(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    write_sharded_tests(project)
+
+    def run_worker(process):
+        coverage_file = process.kwargs["env"]["COVERAGE_FILE"]
+        (project / coverage_file).write_text("", encoding="utf-8")
+        if process.args[-1] == "tests/test_big.py":
+            process.returncode = 1
+
+    fp.register(["poetry", "run", "pytest", fp.any()], callback=run_worker)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    # A failing worker fails the tests
+    assert cmd_test(False, project, config, workers=2) == False
+
+    assert fp.call_count(["poetry", "run", "pytest", "tests/test_big.py"]) == 1
+    assert fp.call_count(["poetry", "run", "pytest", "tests/test_mid.py", "tests/test_small.py", "tests/test_things.py"]) == 1
+    assert fp.call_count(["poetry", "run", "coverage", "combine", ".coverage.switchblade-1", ".coverage.switchblade-2"]) == 1
+    assert fp.call_count(["poetry", "run", "coverage", "report"]) == 1
+
+    # How long each file took is recorded, to balance the next runs
+    file_durations = BundleCache(config).get_file_durations("pytest")
+    assert sorted(file_durations) == ["tests/test_big.py", "tests/test_mid.py", "tests/test_small.py", "tests/test_things.py"]
+
+
+def write_coverage_data(project, contexts):
+    """Write a .coverage data file (coverage.py's SQLite format) with the files measured in each context."""
+    (project / ".coverage").unlink(missing_ok=True)
+    connection = sqlite3.connect(project / ".coverage")
+    connection.executescript(
+        "CREATE TABLE file (id INTEGER PRIMARY KEY, path TEXT);"
+        "CREATE TABLE context (id INTEGER PRIMARY KEY, context TEXT);"
+        "CREATE TABLE line_bits (file_id INTEGER, context_id INTEGER, numbits BLOB);"
+        "CREATE TABLE arc (file_id INTEGER, context_id INTEGER, fromno INTEGER, tono INTEGER);"
+    )
+    files = sorted({file for context_files in contexts.values() for file in context_files})
+    connection.executemany("INSERT INTO file VALUES (?, ?)", [(file_id, str(project / file)) for file_id, file in enumerate(files)])
+    for context_id, (context, context_files) in enumerate(contexts.items()):
+        connection.execute("INSERT INTO context VALUES (?, ?)", (context_id, context))
+        connection.executemany("INSERT INTO line_bits VALUES (?, ?, ?)", [(files.index(file), context_id, b"") for file in context_files])
+    connection.commit()
+    connection.close()
+
+
+def test_test_affected(fp, project, patched_pygithub, capsys):
+    fp.keep_last_process(True)
+    fp.register(["poetry", "run", "pytest", fp.any()], callback=lambda process: write_coverage_data(project, {
+        "": ["src/some_thing.py"],
+        "tests/test_things.py::test_one|run": ["src/some_thing.py"],
+        "tests/test_other.py::test_two|run": ["src/other_thing.py"],
+    }))
+    fp.register(["poetry", fp.any()])
+
+    (project / "src" / "other_thing.py").write_text("", encoding="utf-8")
+    (project / "tests" / "test_other.py").write_text("", encoding="utf-8")
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write(
+            '\n[tests.pytest]\nshard_command = "pytest {files}"\nfiles = ["tests/test_*.py"]\n'
+            'inputs = ["src/*.py", "tests/*.py"]\nimpact = true\n'
+        )
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+
+    def pytest_calls():
+        return [call[3:] for call in fp.calls if call[:3] == ["poetry", "run", "pytest"]][-1]
+
+    # Without a map, all the tests run
+    assert cmd_test(False, project, config, use_cache=False, affected_files=["src/other_thing.py"]) == True
+    assert pytest_calls() == ["tests/test_other.py", "tests/test_things.py"]
+    assert "no up-to-date test impact map for pytest" in capsys.readouterr().out
+
+    # A full run records the map
+    assert cmd_test(False, project, config, use_cache=False) == True
+    pytest_duration = BundleCache(config).get_tool_durations()["pytest"]
+
+    # Only the tests which touched a changed file run
+    assert cmd_test(False, project, config, use_cache=False, affected_files=["src/other_thing.py"]) == True
+    assert pytest_calls() == ["tests/test_other.py"]
+    assert "selected 1 of 2 file(s) of pytest" in capsys.readouterr().out
+    # Which doesn't tell how long all the tests take
+    assert BundleCache(config).get_tool_durations()["pytest"] == pytest_duration
+
+    # No tests run if none are affected
+    pytest_call_count = fp.call_count(["poetry", "run", "pytest", fp.any()])
+    assert cmd_test(False, project, config, use_cache=False, affected_files=["README.md"]) == True
+    assert fp.call_count(["poetry", "run", "pytest", fp.any()]) == pytest_call_count
+
+    # New and changed test files always run
+    (project / "tests" / "test_new.py").write_text("", encoding="utf-8")
+    (project / "tests" / "test_things.py").write_text("# changed", encoding="utf-8")
+    assert cmd_test(False, project, config, use_cache=False, affected_files=[]) == True
+    assert pytest_calls() == ["tests/test_new.py", "tests/test_things.py"]
+
+    # Changed inputs which the map doesn't know about run all the tests
+    (project / "tests" / "conftest.py").write_text("", encoding="utf-8")
+    assert cmd_test(False, project, config, use_cache=False, affected_files=["tests/conftest.py"]) == True
+    assert pytest_calls() == ["tests/test_new.py", "tests/test_other.py", "tests/test_things.py"]
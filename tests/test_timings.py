@@ -0,0 +1,32 @@
+import threading
+
+from switchbladecli.timings import Timings
+
+
+def test_timings_record_nested_phases():
+    timings = Timings()
+    with timings.phase("fetch bundle"):
+        with timings.phase("check for updates"):
+            pass
+    # Phases in other threads (e.g. tools run in parallel) are top-level phases
+    tool_thread = threading.Thread(target=timings.phase("run pylint")(lambda: None))
+    tool_thread.start()
+    tool_thread.join()
+
+    phases = timings.get_phases()
+    assert [(phase["phase"], phase["parent"], phase["depth"]) for phase in phases] == [
+        ("fetch bundle", None, 0),
+        ("check for updates", "fetch bundle", 1),
+        ("run pylint", None, 0),
+    ]
+    assert all(phase["duration"] >= 0 for phase in phases)
+    breakdown = timings.format_breakdown()
+    assert "\n    check for updates " in breakdown
+    assert "\n  total " in breakdown
+
+    event_fields = timings.get_event_fields("lint")
+    assert event_fields["command"] == "lint"
+    assert [phase["phase"] for phase in event_fields["phases"]] == ["fetch bundle", "check for updates", "run pylint"]
+
+    timings.reset()
+    assert timings.get_phases() == []
@@ -0,0 +1,23 @@
+from switchbladecli import toml_files
+from switchbladecli.toml_files import read_toml, write_toml
+
+
+def test_read_toml_parses_each_file_once(tmp_path, monkeypatch):
+    config_file = tmp_path / "config.toml"
+    config_file.write_text('[switchblade]\nmode = "python-poetry"\n', encoding="utf-8")
+
+    parsed_files = []
+    load = toml_files.tomllib.load
+    monkeypatch.setattr(toml_files.tomllib, "load", lambda toml_file: parsed_files.append(toml_file.name) or load(toml_file))
+
+    config = read_toml(config_file)
+    assert config == {"switchblade": {"mode": "python-poetry"}}
+    # The result is a copy which can be modified safely
+    config["switchblade"]["mode"] = "changed"
+    assert read_toml(config_file) == {"switchblade": {"mode": "python-poetry"}}
+    assert len(parsed_files) == 1
+
+    # Changed files are parsed again
+    write_toml(config_file, {"switchblade": {"mode": "other"}})
+    assert read_toml(config_file) == {"switchblade": {"mode": "other"}}
+    assert len(parsed_files) == 2
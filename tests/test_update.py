@@ -1,6 +1,10 @@
+import os
+import shutil
+
 from switchbladecli.cli.config import find_config_file, get_switchblade_config
+from switchbladecli.cli.lint import cmd_lint
 from switchbladecli.cli.update import cmd_update
-from switchbladecli.cli.bundle_cache import BundleCache
+from switchbladecli.cli.bundle_cache import BUNDLES_LOCK, BundleCache
 
 TEST_PREVIOUS_BUNDLE_VERSION = "12340000"
 TEST_BUNDLE_VERSION = "12345678"
@@ -15,7 +19,7 @@ def test_update_fetches_bundle(project, patched_pygithub):
     cmd_update(False, project, config)
 
     assert patched_pygithub.return_value.get_repo.return_value.get_branch.call_count == 1
-    assert patched_pygithub.return_value.get_repo.return_value.get_contents.call_count == 1
+    assert patched_pygithub.return_value.get_repo.return_value.get_archive_link.call_count == 1
 
     assert cache.has_bundle(TEST_BUNDLE_VERSION) == True
 
@@ -42,9 +46,11 @@ def test_update_updates_stale_cached_bundle(project_with_cached_bundle, patched_
     cmd_update(False, project_with_cached_bundle, config)
 
     assert patched_pygithub.return_value.get_repo.return_value.get_branch.call_count == 1
-    assert patched_pygithub.return_value.get_repo.return_value.get_contents.call_count == 1
+    assert patched_pygithub.return_value.get_repo.return_value.get_archive_link.call_count == 1
 
     assert cache.has_bundle(TEST_BUNDLE_VERSION) == True
+    # The previous bundle is removed, since no run is using it
+    assert cache.has_bundle(TEST_PREVIOUS_BUNDLE_VERSION) == False
 
     bundle = cache.get_latest_bundle()
     assert bundle.version == TEST_BUNDLE_VERSION
@@ -60,6 +66,21 @@ def test_update_updates_stale_cached_bundle(project_with_cached_bundle, patched_
     assert "bundle.toml" not in bundle_files
 
 
+def test_update_keeps_bundles_in_use(project_with_cached_bundle, patched_pygithub):
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project_with_cached_bundle), config_file)
+    cache = BundleCache(config)
+
+    # A run in progress holds the bundles lock, so the previous bundle is kept until a later update
+    with cache.lock(BUNDLES_LOCK, shared=True):
+        cmd_update(False, project_with_cached_bundle, config)
+    assert cache.has_bundle(TEST_PREVIOUS_BUNDLE_VERSION) == True
+
+    cmd_update(False, project_with_cached_bundle, config)
+    assert cache.has_bundle(TEST_PREVIOUS_BUNDLE_VERSION) == False
+    assert cache.has_bundle(TEST_BUNDLE_VERSION) == True
+
+
 def test_update_reuses_bundle_if_cached(project, patched_pygithub):
     config_file = find_config_file(False, None)
     config = get_switchblade_config(False, str(project), config_file)
@@ -74,7 +95,7 @@ def test_update_reuses_bundle_if_cached(project, patched_pygithub):
     cmd_update(False, project, config)
 
     assert patched_pygithub.return_value.get_repo.return_value.get_branch.call_count == 1
-    assert patched_pygithub.return_value.get_repo.return_value.get_contents.call_count == 0
+    assert patched_pygithub.return_value.get_repo.return_value.get_archive_link.call_count == 0
 
 
 def test_update_uses_cached_bundle_if_remote_unavailable(project_with_cached_bundle, patched_pygithub_with_exception):
@@ -90,3 +111,172 @@ def test_update_uses_cached_bundle_if_remote_unavailable(project_with_cached_bun
     assert cache.has_bundle(TEST_BUNDLE_VERSION) == False
     assert len(cache.get_bundles()) == 1
     assert cache.get_latest_bundle().version == TEST_PREVIOUS_BUNDLE_VERSION
+
+
+def test_lint_skips_update_check_within_check_interval(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('check_interval = "15m"\n')
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+    requester = patched_pygithub.return_value.get_repo.return_value._requester
+
+    cmd_lint(False, project, config)
+    assert requester.requestJsonAndCheck.call_count == 1
+    assert BundleCache(config).get_latest_config()["etag"] == 'W/"etag-12345678"'
+
+    # The second run trusts the recent check and doesn't go to the network
+    cmd_lint(False, project, config)
+    assert requester.requestJsonAndCheck.call_count == 1
+
+    # An explicit update always checks
+    cmd_update(False, project, config)
+    assert patched_pygithub.return_value.get_repo.return_value.get_branch.call_count == 1
+
+
+def test_lint_uses_conditional_update_check(fp, project, patched_pygithub):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+    requester = patched_pygithub.return_value.get_repo.return_value._requester
+
+    cmd_lint(False, project, config)
+    assert requester.requestJsonAndCheck.call_args.kwargs["headers"] is None
+
+    # An unchanged branch answers with 304 Not Modified and no data
+    requester.requestJsonAndCheck.return_value = ({}, None)
+    cmd_lint(False, project, config)
+    assert requester.requestJsonAndCheck.call_count == 2
+    assert requester.requestJsonAndCheck.call_args.kwargs["headers"] == {"If-None-Match": 'W/"etag-12345678"'}
+    assert BundleCache(config).get_latest_version() == TEST_BUNDLE_VERSION
+    assert patched_pygithub.return_value.get_repo.return_value.get_archive_link.call_count == 1
+
+
+def test_update_extracts_nested_bundle_folders(project, patched_pygithub):
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+    cache = BundleCache(config)
+
+    cmd_update(False, project, config)
+
+    bundle_files = cache.get_bundle(TEST_BUNDLE_VERSION).get_files()
+    assert os.path.join("hooks", "check.sh") in bundle_files
+    # Only the bundle folder is extracted from the repo archive
+    assert "README.md" not in bundle_files
+    assert patched_pygithub.return_value.get_repo.return_value.get_contents.call_count == 0
+
+
+def test_update_falls_back_to_downloading_files(project, patched_pygithub):
+    patched_pygithub.return_value.get_repo.return_value.get_archive_link.side_effect = Exception("Test exception")
+
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+    cache = BundleCache(config)
+
+    cmd_update(False, project, config)
+
+    # One listing for the bundle folder, and one for the nested folder
+    assert patched_pygithub.return_value.get_repo.return_value.get_contents.call_count == 2
+    bundle_files = cache.get_bundle(TEST_BUNDLE_VERSION).get_files()
+    assert ".pylintrc" in bundle_files
+    assert os.path.join("hooks", "check.sh") in bundle_files
+
+
+def test_update_reuses_bundle_from_shared_store(project, patched_pygithub, tmp_path_factory, bundle_store):
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+    cmd_update(False, project, config)
+    assert patched_pygithub.return_value.get_repo.return_value.get_archive_link.call_count == 1
+
+    # A second project using the same bundle gets it from the store instead of downloading it
+    other_project = tmp_path_factory.mktemp("other-project")
+    shutil.copytree(project / "src", other_project / "src")
+    shutil.copyfile(project / ".switchblade", other_project / ".switchblade")
+    os.chdir(other_project)
+    other_config = get_switchblade_config(False, str(other_project), ".switchblade")
+    cmd_update(False, other_project, other_config)
+
+    assert patched_pygithub.return_value.get_repo.return_value.get_archive_link.call_count == 1
+    other_cache = BundleCache(other_config)
+    assert other_cache.get_latest_version() == TEST_BUNDLE_VERSION
+    assert ".pylintrc" in other_cache.get_latest_bundle().get_files()
+
+    # The bundle files of both projects are links to the same stored object
+    pylintrc = project / ".switchblade-cache" / TEST_BUNDLE_VERSION / ".pylintrc"
+    other_pylintrc = other_project / ".switchblade-cache" / TEST_BUNDLE_VERSION / ".pylintrc"
+    assert os.path.samefile(pylintrc, other_pylintrc)
+
+
+def test_update_repairs_damaged_bundle_store(project, patched_pygithub, tmp_path_factory, bundle_store):
+    config_file = find_config_file(False, None)
+    config = get_switchblade_config(False, str(project), config_file)
+    cmd_update(False, project, config)
+
+    # Stored objects (and so the bundle files linked to them) are read-only
+    pylintrc = project / ".switchblade-cache" / TEST_BUNDLE_VERSION / ".pylintrc"
+    assert not os.stat(pylintrc).st_mode & 0o222
+    contents = pylintrc.read_bytes()
+
+    # A damaged object is not restored into another project, the bundle is fetched again instead
+    os.chmod(pylintrc, 0o644)
+    pylintrc.write_text("[MAIN]\n", encoding="utf-8")
+    other_project = tmp_path_factory.mktemp("other-project")
+    shutil.copytree(project / "src", other_project / "src")
+    shutil.copyfile(project / ".switchblade", other_project / ".switchblade")
+    os.chdir(other_project)
+    other_config = get_switchblade_config(False, str(other_project), ".switchblade")
+    cmd_update(False, other_project, other_config)
+
+    assert patched_pygithub.return_value.get_repo.return_value.get_archive_link.call_count == 2
+    other_pylintrc = other_project / ".switchblade-cache" / TEST_BUNDLE_VERSION / ".pylintrc"
+    assert other_pylintrc.read_bytes() == contents
+    assert not os.path.samefile(pylintrc, other_pylintrc)
+
+
+def test_lint_trusts_recent_check_from_other_project(fp, project, patched_pygithub, tmp_path_factory):
+    fp.keep_last_process(True)
+    fp.register(["poetry", fp.any()])
+
+    with open(project / ".switchblade", "a") as switchblade_file:
+        switchblade_file.write('check_interval = "15m"\n')
+    config = get_switchblade_config(False, str(project), ".switchblade")
+    cmd_lint(False, project, config)
+
+    other_project = tmp_path_factory.mktemp("other-project")
+    shutil.copytree(project / "src", other_project / "src")
+    shutil.copyfile(project / "pyproject.toml", other_project / "pyproject.toml")
+    shutil.copyfile(project / ".switchblade", other_project / ".switchblade")
+    os.chdir(other_project)
+    other_config = get_switchblade_config(False, str(other_project), ".switchblade")
+    patched_pygithub.reset_mock()
+
+    # The first run in the other project doesn't need the network at all
+    assert cmd_lint(False, other_project, other_config) == True
+    assert patched_pygithub.return_value.get_repo.call_count == 0
+
+
+def test_update_fingerprints_local_bundle(project):
+    local_bundle = project / "local-bundle"
+    shutil.copytree(os.path.join(os.path.dirname(__file__), "files", "testbundle"), local_bundle)
+    with open(project / ".switchblade", "w") as switchblade_file:
+        switchblade_file.write('[switchblade]\nmode = "python-poetry"\nbundle = "local-bundle"\n')
+
+    config = get_switchblade_config(False, str(project), ".switchblade")
+    cache = BundleCache(config)
+    cmd_update(False, project, config)
+
+    version = cache.get_latest_version()
+    assert version.startswith("b2-")
+    assert ".pylintrc" in cache.get_fingerprint_index("local-bundle")
+
+    # An unchanged bundle keeps its version, a changed one gets a new version
+    cmd_update(False, project, config)
+    assert cache.get_latest_version() == version
+    (local_bundle / ".pylintrc").write_text("[MAIN]\n", encoding="utf-8")
+    cmd_update(False, project, config)
+    assert cache.get_latest_version() != version
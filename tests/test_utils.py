@@ -1,9 +1,60 @@
 import os
+import pytest
+import shutil
 
-from switchbladecli.utils import hash_dir
+from switchbladecli.utils import blake2_of_file, fingerprint_dir, hash_dir, parse_duration, parse_shard, split_into_chunks, split_into_shards
 
 def test_hash_a_folder_gives_correct_value():
     path_to_test_folder = os.path.join(os.path.dirname(__file__), "files", "hashing")
     expected_sha1 = "1c861420255f9e17c20eb6286eaa32832c14ea23"
     actual_sha1 = hash_dir(path_to_test_folder)
     assert actual_sha1 == expected_sha1
+
+def test_split_into_chunks_respects_max_length():
+    args = ["a" * 9, "b" * 9, "c" * 9, "d" * 30]
+    assert split_into_chunks(args, 20) == [["a" * 9, "b" * 9], ["c" * 9], ["d" * 30]]
+    assert split_into_chunks([], 20) == []
+
+def test_split_into_shards_balances_weights():
+    weights = {"a": 5, "b": 4, "c": 3, "d": 3, "e": 1}
+    assert split_into_shards(["e", "d", "c", "b", "a"], 2, weights) == [["a", "d"], ["b", "c", "e"]]
+    # Without weights, the items are dealt out evenly
+    assert split_into_shards(["a", "b", "c"], 2, {}) == [["a", "c"], ["b"]]
+    assert split_into_shards(["a"], 3, {}) == [["a"], [], []]
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    for shard in ["0/4", "5/4", "2", "a/b"]:
+        with pytest.raises(ValueError):
+            parse_shard(shard)
+
+def test_parse_duration():
+    assert parse_duration("30s") == 30
+    assert parse_duration("15m") == 15 * 60
+    assert parse_duration("2h") == 2 * 60 * 60
+    assert parse_duration("1d") == 24 * 60 * 60
+    assert parse_duration(90) == 90
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+
+def test_fingerprint_dir_only_rehashes_changed_files(tmp_path, monkeypatch):
+    shutil.copytree(os.path.join(os.path.dirname(__file__), "files", "hashing"), tmp_path / "hashing")
+    fingerprint, index = fingerprint_dir(tmp_path / "hashing")
+    assert fingerprint.startswith("b2-")
+    assert sorted(index) == ["gibberish.txt", "nyan-cat.webp", "subdir/more_gibberish.txt"]
+
+    hashed_files = []
+    def counting_blake2_of_file(filepath):
+        hashed_files.append(os.path.basename(filepath))
+        return blake2_of_file(filepath)
+    monkeypatch.setattr("switchbladecli.utils.blake2_of_file", counting_blake2_of_file)
+
+    # Nothing changed, so nothing is read again
+    assert fingerprint_dir(tmp_path / "hashing", index) == (fingerprint, index)
+    assert hashed_files == []
+
+    # Only the changed file is read again
+    (tmp_path / "hashing" / "gibberish.txt").write_text("changed", encoding="utf-8")
+    new_fingerprint, _ = fingerprint_dir(tmp_path / "hashing", index)
+    assert new_fingerprint != fingerprint
+    assert hashed_files == ["gibberish.txt"]
@@ -0,0 +1,22 @@
+from switchbladecli.watch import Watcher, matches_globs
+
+
+def test_watcher_finds_changed_files(project):
+    watcher = Watcher(project, poll_interval=0.01, debounce_interval=0.01)
+    assert watcher.poll() == set()
+
+    (project / "src" / "new_thing.py").write_text("", encoding="utf-8")
+    (project / "pyproject.toml").unlink()
+    (project / ".switchblade-cache").mkdir()
+    (project / ".switchblade-cache" / "latest.toml").write_text("", encoding="utf-8")
+
+    # Added and deleted files are changes, but caches are not watched
+    assert watcher.wait_for_changes(timeout=1) == {"src/new_thing.py", "pyproject.toml"}
+    assert watcher.wait_for_changes(timeout=0.05) == set()
+
+
+def test_matches_globs():
+    assert matches_globs("src/some_thing.py", ["src/**/*.py"])
+    assert matches_globs("src/nested/some_thing.py", ["src/**/*.py"])
+    assert not matches_globs("tests/test_things.py", ["src/**/*.py"])
+    assert matches_globs("pyproject.toml", ["src/**/*.py", "pyproject.toml"])